@@ -0,0 +1,251 @@
+import re
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Words that refer back to earlier turns; questions containing them depend on
+# the conversation and are never answered from the cache
+_BACK_REFERENCE_PATTERN = re.compile(
+    r"\b(it|its|that|this|these|those|they|them|their|same|above|previous|earlier|else|also)\b",
+    re.IGNORECASE
+)
+
+
+def is_self_contained(question):
+    """
+    Check whether a question can be answered without the conversation.
+
+    Args:
+        question (str): User question.
+
+    Returns:
+        bool: False if the question refers back to earlier turns.
+    """
+    return _BACK_REFERENCE_PATTERN.search(question) is None
+
+
+# Share of maxsize kept when the cache overflows, so least recently used
+# entries are evicted in batches rather than one per stored answer
+EVICT_RATIO = 0.9
+
+
+class SemanticAnswerCache:
+    """
+    Cache of full LLM answers looked up by question embedding similarity.
+
+    Entries live in a SQLite database so they survive restarts, and the
+    embeddings of each scope are kept in memory as a normalized matrix so a
+    lookup is one matrix-vector product. A scope should identify everything
+    an answer depends on besides the question, e.g. the knowledge base
+    version and the models. Entries expire after ttl seconds and the least
+    recently used ones are evicted, down to EVICT_RATIO of maxsize, once
+    there are more than maxsize entries.
+
+    At most max_scopes scopes are kept in memory; the least recently used
+    one, typically of a replaced knowledge base version, is dropped and
+    loaded again from SQLite if it is ever looked up.
+    """
+
+    def __init__(self, path, threshold=0.92, ttl=86400.0, maxsize=10000, max_scopes=32):
+        """
+        Args:
+            path (str): SQLite database file, or ":memory:".
+            threshold (float): Minimum cosine similarity of a cached
+                question to reuse its answer.
+            ttl (float): Lifetime of an entry in seconds.
+            maxsize (int): Maximum number of entries kept.
+            max_scopes (int): Maximum number of scopes loaded in memory.
+        """
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.max_scopes = max_scopes
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self._lock = threading.Lock()
+        # Loaded scopes, least recently used first
+        self._scopes = OrderedDict()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY, scope TEXT NOT NULL, question TEXT NOT NULL, "
+            "embedding BLOB NOT NULL, answer TEXT NOT NULL, latency REAL NOT NULL, "
+            "created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS answers_scope ON answers (scope)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS answers_created ON answers (created)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+        (self._count,) = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()
+
+    def _load_scope(self, scope):
+        """
+        Get the in-memory entries of a scope, loading them from SQLite on
+        first use and dropping the least recently used scope beyond
+        max_scopes. Must be called with the lock held.
+
+        The rows of entries["matrix"] beyond len(entries["ids"]) are spare
+        capacity for stored answers.
+        """
+        entries = self._scopes.get(scope)
+        if entries is not None:
+            self._scopes.move_to_end(scope)
+        else:
+            rows = self._db.execute(
+                "SELECT id, embedding, answer, latency, created FROM answers WHERE scope = ? AND created > ?",
+                (scope, time.time() - self.ttl)
+            ).fetchall()
+            vectors = [np.frombuffer(row[1], dtype=np.float32) for row in rows]
+            entries = {
+                "ids": [row[0] for row in rows],
+                "matrix": np.vstack(vectors) if vectors else None,
+                "answers": [row[2] for row in rows],
+                "latencies": [row[3] for row in rows],
+                "created": [row[4] for row in rows],
+            }
+            self._scopes[scope] = entries
+            while len(self._scopes) > self.max_scopes:
+                self._scopes.popitem(last=False)
+        return entries
+
+    def lookup(self, scope, embedding):
+        """
+        Find the answer of the most similar cached question.
+
+        Args:
+            scope (str): Cache scope of the question.
+            embedding (list): Embedding of the question.
+
+        Returns:
+            str: The cached answer, or None if no live entry is similar
+                enough.
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        now = time.time()
+        with self._lock:
+            entries = self._load_scope(scope)
+            if entries["ids"]:
+                similarities = entries["matrix"][:len(entries["ids"])] @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold and now - entries["created"][best] < self.ttl:
+                    self.hits += 1
+                    self.saved_seconds += entries["latencies"][best]
+                    self._db.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, entries["ids"][best]))
+                    return entries["answers"][best]
+            self.misses += 1
+            return None
+
+    def store(self, scope, question, embedding, answer, latency):
+        """
+        Add an answer to the cache.
+
+        Args:
+            scope (str): Cache scope of the question.
+            question (str): User question.
+            embedding (list): Embedding of the question.
+            answer (str): Generated answer.
+            latency (float): Seconds it took to generate the answer, counted
+                as saved on every hit.
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        now = time.time()
+        with self._lock:
+            row_id = self._db.execute(
+                "INSERT INTO answers (scope, question, embedding, answer, latency, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (scope, question, vector.tobytes(), answer, latency, now, now)
+            ).lastrowid
+            self._count += 1
+            entries = self._scopes.get(scope)
+            if entries is not None:
+                size = len(entries["ids"])
+                matrix = entries["matrix"]
+                if matrix is None or size == len(matrix):
+                    # Grow geometrically so storing stays amortized O(1)
+                    matrix = np.empty((max(16, 2 * size), len(vector)), dtype=np.float32)
+                    if size:
+                        matrix[:size] = entries["matrix"][:size]
+                    entries["matrix"] = matrix
+                matrix[size] = vector
+                entries["ids"].append(row_id)
+                entries["answers"].append(answer)
+                entries["latencies"].append(latency)
+                entries["created"].append(now)
+            self._evict(now)
+
+    def _evict(self, now):
+        """
+        Delete expired entries, and the least recently used ones down to
+        EVICT_RATIO of maxsize once there are more than maxsize. Must be
+        called with the lock held.
+        """
+        cutoff = now - self.ttl
+        deleted = self._db.execute("SELECT id, scope FROM answers WHERE created <= ?", (cutoff,)).fetchall()
+        count = self._count - len(deleted)
+        if count > self.maxsize:
+            deleted += self._db.execute(
+                "SELECT id, scope FROM answers WHERE created > ? ORDER BY last_used LIMIT ?",
+                (cutoff, count - int(self.maxsize * EVICT_RATIO))
+            ).fetchall()
+        if not deleted:
+            return
+        self._db.execute("BEGIN")
+        self._db.executemany("DELETE FROM answers WHERE id = ?", [(row_id,) for row_id, _ in deleted])
+        self._db.execute("COMMIT")
+        self._count -= len(deleted)
+        self._forget(deleted)
+
+    def _forget(self, deleted):
+        """
+        Drop deleted entries from the loaded scopes. Must be called with the
+        lock held.
+
+        Args:
+            deleted (list): (id, scope) rows deleted from SQLite.
+        """
+        deleted_ids = {}
+        for row_id, scope in deleted:
+            deleted_ids.setdefault(scope, set()).add(row_id)
+        for scope, ids in deleted_ids.items():
+            entries = self._scopes.get(scope)
+            if entries is None:
+                continue
+            keep = [i for i, row_id in enumerate(entries["ids"]) if row_id not in ids]
+            entries["matrix"] = entries["matrix"][keep] if keep else None
+            for key in ("ids", "answers", "latencies", "created"):
+                entries[key] = [entries[key][i] for i in keep]
+
+    def clear(self):
+        """
+        Remove all entries. The statistics are kept.
+        """
+        with self._lock:
+            self._db.execute("DELETE FROM answers")
+            self._count = 0
+            self._scopes.clear()
+
+    def stats(self):
+        """
+        Get the cache statistics.
+
+        Returns:
+            dict: Entry count, hits, misses, hit rate and the generation time
+                saved by hits, in seconds.
+        """
+        with self._lock:
+            (size,) = self._db.execute("SELECT COUNT(*) FROM answers").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "size": size,
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+            }
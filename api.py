@@ -0,0 +1,297 @@
+"""
+Asynchronous JSON API serving the chat engine without Streamlit.
+
+Endpoints:
+    GET  /health       -> {"status": "ok", "routes": {...}, "answer_cache": {...}, "llm_clients": {...},
+                           "tenants": {...}}
+    POST /chat         {"message": str, "session_id": str?, "tenant": str?}
+                       -> {"session_id": str, "response": str}
+    POST /chat/batch   {"messages": [{"message": str, "session_id": str?, "tenant": str?}, ...]}
+                       -> {"responses": [{"session_id": str, "response": str}, ...]}
+    GET  /metrics      -> per-stage latency histograms, Prometheus text format
+    POST /debug/profile {"count": int?, "min_seconds": float?}
+                       -> {"armed": int}; profiles the next slow requests
+    GET  /debug/profiles -> {"profiles": [{"timestamp", "seconds", "stats"}, ...]}
+
+Usage:
+    python api.py [--host 0.0.0.0] [--port 8000] [--metrics-log metrics.jsonl]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import uuid
+import chat_engine
+import metrics
+from chat_engine import (
+    InMemorySessionStore, get_answer_cache, get_response, get_routing_stats, get_tenant_knowledge_base,
+    get_tenant_registry, route_query
+)
+from knowledge_base import get_knowledge_base
+
+logger = logging.getLogger(__name__)
+
+# Requests with a larger body are rejected with 413
+MAX_BODY_BYTES = 1 << 20
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    """
+    Error turned into a JSON error response with the given status code.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+async def answer_message(item, store):
+    """
+    Answer one chat message.
+
+    The rule engine answers inline on the event loop; the LLM path blocks on
+    network I/O and runs in a worker thread. In "auto" mode the query is
+    routed first, so confident rule answers never leave the event loop.
+
+    Args:
+        item (dict): Request item with "message" and optional "session_id"
+            and "tenant".
+        store: Session store.
+
+    Returns:
+        dict: The session ID and the response.
+    """
+    if not isinstance(item, dict) or not isinstance(item.get("message"), str):
+        raise HTTPError(400, "'message' must be a string")
+    tenant = item.get("tenant")
+    if tenant is not None and not isinstance(tenant, str):
+        raise HTTPError(400, "'tenant' must be a string")
+    session_id = item.get("session_id") or uuid.uuid4().hex
+    memory = store.get(session_id)["memory"]
+
+    # Loading or rebuilding the knowledge base reads and parses documents,
+    # so it never runs on the event loop, for the default tenant either
+    try:
+        knowledge_base = await asyncio.to_thread(get_tenant_knowledge_base, tenant)
+    except KeyError:
+        raise HTTPError(404, f"Unknown tenant: {tenant}")
+
+    mode = chat_engine.ANSWER_MODE
+    if mode == "auto":
+        mode, match = route_query(item["message"], knowledge_base)
+        if mode == "rules":
+            memory.add_turn(item["message"], match.response)
+            return {"session_id": session_id, "response": match.response}
+    if mode == "llm":
+        response = await asyncio.to_thread(
+            metrics.profiled, get_response, item["message"], memory, knowledge_base, mode=mode, tenant=tenant
+        )
+    else:
+        response = metrics.profiled(get_response, item["message"], memory, knowledge_base, mode=mode, tenant=tenant)
+    return {"session_id": session_id, "response": response}
+
+
+async def dispatch(method, path, body, store):
+    """
+    Route a request to its endpoint.
+
+    Args:
+        method (str): HTTP method.
+        path (str): Request path.
+        body (bytes): Request body.
+        store: Session store.
+
+    Returns:
+        dict or str: JSON-serializable response payload, or a plain text
+            body.
+    """
+    routes = {
+        "/health": "GET",
+        "/chat": "POST",
+        "/chat/batch": "POST",
+        "/metrics": "GET",
+        "/debug/profile": "POST",
+        "/debug/profiles": "GET",
+    }
+    if path not in routes:
+        raise HTTPError(404, f"Unknown path: {path}")
+    if method != routes[path]:
+        raise HTTPError(405, f"{path} only accepts {routes[path]}")
+    if path == "/health":
+        registry = get_tenant_registry()
+        tenants = registry.stats() if registry is not None else None
+        if chat_engine.ANSWER_MODE == "rules":
+            return {
+                "status": "ok", "routes": get_routing_stats(), "answer_cache": None, "llm_clients": None,
+                "tenants": tenants,
+            }
+        from llm_handler import get_llm_client_stats
+
+        answer_cache = get_answer_cache()
+        return {
+            "status": "ok",
+            "routes": get_routing_stats(),
+            "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+            "llm_clients": get_llm_client_stats(),
+            "tenants": tenants,
+        }
+    if path == "/metrics":
+        return metrics.export_prometheus()
+    if path == "/debug/profiles":
+        return {"profiles": metrics.get_profiles()}
+
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        raise HTTPError(400, "Request body is not valid JSON")
+
+    if path == "/chat":
+        return await answer_message(payload, store)
+    if path == "/debug/profile":
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "Request body must be a JSON object")
+        try:
+            count = int(payload.get("count", 1))
+            min_seconds = float(payload.get("min_seconds", 0.0))
+        except (TypeError, ValueError):
+            raise HTTPError(400, "'count' and 'min_seconds' must be numbers")
+        metrics.request_profile(count, min_seconds)
+        return {"armed": count}
+
+    items = payload.get("messages") if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        raise HTTPError(400, "'messages' must be a list")
+    responses = await asyncio.gather(*(answer_message(item, store) for item in items))
+    return {"responses": list(responses)}
+
+
+async def handle_connection(reader, writer, store):
+    """
+    Serve HTTP/1.1 requests on a connection until the client closes it.
+
+    Args:
+        reader (asyncio.StreamReader): Connection reader.
+        writer (asyncio.StreamWriter): Connection writer.
+        store: Session store.
+    """
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, version = request_line.decode("latin-1").split()
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+            length = int(headers.get("content-length", 0))
+            try:
+                if length > MAX_BODY_BYTES:
+                    keep_alive = False
+                    raise HTTPError(413, "Request body too large")
+                body = await reader.readexactly(length)
+                status, payload = 200, await dispatch(method, path.split("?")[0], body, store)
+            except HTTPError as e:
+                status, payload = e.status, {"error": e.message}
+            except Exception:
+                logger.exception("Error handling %s %s", method, path)
+                status, payload = 500, {"error": "Internal server error"}
+
+            if isinstance(payload, str):
+                data, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+            else:
+                data, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+            writer.write(
+                f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+            )
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        # Malformed request line or headers, or the client went away
+        pass
+    finally:
+        writer.close()
+
+
+async def log_metrics(path, interval):
+    """
+    Append a metrics snapshot to a JSONL file at a fixed interval.
+
+    Args:
+        path (str): JSONL file to append to.
+        interval (float): Seconds between two snapshots.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(metrics.append_jsonl, path)
+        except OSError as e:
+            logger.error("Error writing metrics to %s: %s", path, e)
+
+
+async def serve(host="0.0.0.0", port=8000, store=None, metrics_log=None, metrics_interval=60.0):
+    """
+    Run the API server until cancelled.
+
+    Args:
+        host (str): Interface to bind.
+        port (int): Port to listen on.
+        store: Session store, an InMemorySessionStore by default.
+        metrics_log (str): JSONL file receiving periodic metrics snapshots,
+            if any.
+        metrics_interval (float): Seconds between two metrics snapshots.
+    """
+    if store is None:
+        store = InMemorySessionStore()
+    # Load the knowledge base before accepting connections
+    await asyncio.to_thread(get_knowledge_base, chat_engine.DATA_DIR)
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_connection(reader, writer, store), host, port
+    )
+    logger.info("Serving chat API on %s:%s", host, port)
+    metrics_task = asyncio.create_task(log_metrics(metrics_log, metrics_interval)) if metrics_log else None
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if metrics_task is not None:
+            metrics_task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Insurance chatbot JSON API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--metrics-log", help="append a metrics snapshot to this JSONL file periodically")
+    parser.add_argument("--metrics-interval", type=float, default=60.0, help="seconds between metrics snapshots")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(serve(args.host, args.port, metrics_log=args.metrics_log, metrics_interval=args.metrics_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 import streamlit as st
 import os
-import random
-from data_loader import load_documents_from_directory
-from utils import initialize_session_state, get_chat_history
+import logging
+from chat_engine import ANSWER_MODE, get_insurance_response, get_tenant_knowledge_base, stream_response, warm_up
+from chat_history import CHAT_PAGE_SIZE, get_session_history
+from metrics import trace, trace_iter
+from utils import initialize_session_state
+
+# Surface timing logs such as the LLM time to first token
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
 
 # Set page configuration
 st.set_page_config(
@@ -12,7 +17,9 @@ st.set_page_config(
 )
 
 # Initialize session state for chat history and more
-initialize_session_state()
+initialize_session_state(with_memory=ANSWER_MODE != "rules")
+# Recent messages of this session, older ones are paged in from disk
+history = get_session_history(st.session_state.session_id)
 
 # Page header
 st.title("Insurance Policy Information Chatbot")
@@ -36,132 +43,42 @@ with st.sidebar:
     
     # Clear conversation button
     if st.button("Clear Conversation"):
-        st.session_state.messages = []
-        st.session_state.chat_history = []
+        history.clear()
+        if "memory" in st.session_state:
+            st.session_state.memory.clear()
         st.rerun()
 
 # Main chat interface
 st.subheader("Chat")
 
+# Offer the messages that no longer fit in the rendered tail
+if history.has_earlier() and st.button("Load earlier messages"):
+    history.load_earlier(CHAT_PAGE_SIZE)
+    st.rerun()
+
 # Display chat messages
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.write(message["content"])
+for message in history.visible():
+    with st.chat_message(message.role):
+        st.write(message.content)
 
-# Load documents if not already done
-if "documents" not in st.session_state:
-    with st.spinner("Setting up the knowledge base... This might take a minute."):
-        documents = load_documents_from_directory("insurance_data")
-        st.session_state.documents = documents
-        
-        # Create a dictionary to store policy information by type
-        policy_info = {}
-        for doc in documents:
-            content = doc.page_content
-            if "Health Insurance" in content:
-                policy_type = "health"
-            elif "Life Insurance" in content:
-                policy_type = "life"
-            elif "Auto Insurance" in content:
-                policy_type = "auto"
-            elif "Home Insurance" in content:
-                policy_type = "home"
-            else:
-                policy_type = "general"
-                
-            if policy_type not in policy_info:
-                policy_info[policy_type] = []
-            policy_info[policy_type].append(content)
-        
-        st.session_state.policy_info = policy_info
+# Insurer whose policies are served, from the ?tenant= URL parameter when
+# TENANTS_PATH is set
+tenant = st.query_params.get("tenant") or None
 
-# Simple function to match keywords and provide responses
-def get_insurance_response(query):
-    query = query.lower()
-    policy_info = st.session_state.policy_info
-    
-    # Handle requests for human agent
-    if "human agent" in query or "speak to a person" in query or "talk to someone" in query:
-        return """
-        I understand you'd like to speak with a human agent. Please call our 
-        customer service at 1-800-INS-HELP or email support@insurancecompany.com. 
-        An agent will assist you with your specific concerns.
-        """
-    
-    # Match based on insurance type keywords
-    if any(keyword in query for keyword in ["health", "medical", "doctor", "hospital"]):
-        policy_type = "health"
-    elif any(keyword in query for keyword in ["life", "death", "beneficiary", "term"]):
-        policy_type = "life"
-    elif any(keyword in query for keyword in ["auto", "car", "vehicle", "accident", "collision"]):
-        policy_type = "auto"
-    elif any(keyword in query for keyword in ["home", "house", "property", "dwelling"]):
-        policy_type = "home"
-    else:
-        policy_type = "general"
-    
-    # Match based on specific topics
-    if "premium" in query or "cost" in query or "price" in query:
-        topic = "premium"
-    elif "coverage" in query or "cover" in query or "protect" in query:
-        topic = "coverage"
-    elif "claim" in query or "file" in query or "process" in query:
-        topic = "claim"
-    elif "deductible" in query:
-        topic = "deductible"
-    else:
-        topic = "general"
-    
-    # Generate a response based on the matched insurance type and topic
-    if policy_type != "general":
-        contents = policy_info.get(policy_type, [])
-        if contents:
-            relevant_info = ""
-            for content in contents:
-                if topic == "premium" and "Premium" in content:
-                    relevant_sections = [line for line in content.split('\n') if "Premium" in line or "cost" in line.lower()]
-                    if relevant_sections:
-                        relevant_info += "\n".join(relevant_sections) + "\n"
-                elif topic == "coverage" and "Coverage" in content:
-                    relevant_sections = [line for line in content.split('\n') if "Coverage" in line or "cover" in line.lower()]
-                    if relevant_sections:
-                        relevant_info += "\n".join(relevant_sections) + "\n"
-                elif topic == "claim" and "Claims Process" in content:
-                    start_idx = content.find("Claims Process")
-                    end_idx = content.find("##", start_idx + 1)
-                    if end_idx == -1:
-                        end_idx = len(content)
-                    relevant_info += content[start_idx:end_idx] + "\n"
-                elif topic == "deductible" and "Deductible" in content:
-                    relevant_sections = [line for line in content.split('\n') if "Deductible" in line]
-                    if relevant_sections:
-                        relevant_info += "\n".join(relevant_sections) + "\n"
-            
-            if relevant_info:
-                return f"Based on our information about {policy_type} insurance:\n\n{relevant_info}\n\nIs there anything specific about this you'd like to know more about?"
-    
-    # If no specific match was found, provide a general response
-    insurance_types = {
-        "health": "Health insurance covers medical expenses such as doctor visits, hospital stays, and prescription medications.",
-        "life": "Life insurance provides financial protection to your beneficiaries in the event of your death.",
-        "auto": "Auto insurance protects you against financial loss in the event of a vehicle accident or theft.",
-        "home": "Home insurance covers damage to your home and belongings, as well as liability for injuries that occur on your property."
-    }
-    
-    if policy_type in insurance_types:
-        return f"{insurance_types[policy_type]}\n\nWhat specific information would you like about {policy_type} insurance?"
-    else:
-        return """
-        We offer several types of insurance policies including health, life, auto, and home insurance.
-        Each policy has different coverage options, premiums, and claim processes.
-        
-        Could you please specify which type of insurance you're interested in learning more about?
-        """
+# Get the shared knowledge base (built once per process, reloaded on file changes)
+with st.spinner("Setting up the knowledge base... This might take a minute."):
+    try:
+        knowledge_base = get_tenant_knowledge_base(tenant)
+    except KeyError:
+        st.error(f"Unknown tenant: {tenant}")
+        st.stop()
+# Import the retrieval and LLM stack in the background while the user types
+warm_up()
 
 # Chat input
 if prompt := st.chat_input("Ask about our insurance policies..."):
     # Add user message to chat history
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    history.append("user", prompt)
     
     # Display user message
     with st.chat_message("user"):
@@ -169,20 +86,24 @@ if prompt := st.chat_input("Ask about our insurance policies..."):
     
     # Display assistant response
     with st.chat_message("assistant"):
-        message_placeholder = st.empty()
-        
-        with st.spinner("Thinking..."):
-            # Get response
-            response = get_insurance_response(prompt)
-        
-        # Display the response
-        message_placeholder.write(response)
+        if ANSWER_MODE != "rules":
+            # Render tokens as they are generated instead of after the full answer
+            response = st.write_stream(
+                trace_iter(stream_response(prompt, st.session_state.memory, knowledge_base, tenant=tenant), "response", "render")
+            )
+        else:
+            message_placeholder = st.empty()
+            
+            with st.spinner("Thinking..."):
+                # Get response
+                response = get_insurance_response(prompt, knowledge_base)
+            
+            # Display the response
+            with trace("render"):
+                message_placeholder.write(response)
     
     # Add assistant response to chat history
-    st.session_state.messages.append({"role": "assistant", "content": response})
-    
-    # Update chat history for context
-    st.session_state.chat_history.append((prompt, response))
+    history.append("assistant", response)
 
 # Add a footer
 st.markdown("""
@@ -0,0 +1,144 @@
+"""
+Recall versus latency of the approximate FAISS index types against the
+exact flat index.
+
+A synthetic corpus is made by recombining lines of the sample policies with
+varied amounts, embedded with the local hashing model. Each index type is
+built once and queried with a sweep of nprobe (IVF) or efSearch (HNSW)
+values. Recall@k is the share of the flat index's top k found by the
+approximate index. Use the report to pick FAISS_INDEX_TYPE, FAISS_NPROBE
+and FAISS_EF_SEARCH for a deployment size.
+
+Usage:
+    python benchmarks/ann_benchmark.py [--chunks 20000] [--queries 500] [--k 4]
+        [--types hnsw,hnsw_sq8,ivf_sq8,ivf_pq] [--output ann.json]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import faiss
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import build_index, configure_index, get_index_factory_string  # noqa: E402
+from embeddings import HashingEmbeddings  # noqa: E402
+
+SAMPLE_DIR = os.path.join(ROOT, "insurance_data")
+
+# Search-time settings swept for each index family
+NPROBE_VALUES = (1, 4, 16, 64)
+EF_SEARCH_VALUES = (16, 32, 64, 128, 256)
+
+
+def make_texts(count, seed=0):
+    """
+    Make synthetic policy chunks from random lines of the sample policies.
+    """
+    lines = []
+    for filename in sorted(os.listdir(SAMPLE_DIR)):
+        if filename.endswith(".pdf"):
+            with open(os.path.join(SAMPLE_DIR, filename)) as f:
+                lines.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        text = "\n".join(rng.sample(lines, rng.randint(3, 6)))
+        texts.append(text.replace("$", f"${rng.randint(1, 99)}"))
+    return texts
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def measure(index, queries, truth, k):
+    """
+    Query an index one vector at a time, as the chat path does.
+
+    Returns:
+        dict: Recall@k against the exact results and latency percentiles.
+    """
+    latencies = []
+    found = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        _, indices = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        found += len(set(indices[0].tolist()) & set(expected.tolist()))
+    return {
+        "recall": round(found / truth.size, 4),
+        "p50_us": round(percentile(latencies, 0.5) * 1e6, 1),
+        "p99_us": round(percentile(latencies, 0.99) * 1e6, 1),
+        "queries_per_second": round(len(queries) / sum(latencies), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=20000, help="vectors in the corpus")
+    parser.add_argument("--queries", type=int, default=500, help="queries to time")
+    parser.add_argument("--k", type=int, default=4, help="neighbors per query")
+    parser.add_argument("--types", default="hnsw,hnsw_sq8,ivf_sq8,ivf_pq", help="comma-separated index types")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args()
+
+    embeddings = HashingEmbeddings()
+    start = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(make_texts(args.chunks)), dtype=np.float32)
+    # Queries are the first lines of unseen chunks, shorter like questions
+    query_texts = ["\n".join(text.split("\n")[:2]) for text in make_texts(args.queries, seed=1)]
+    queries = np.asarray(embeddings.embed_documents(query_texts), dtype=np.float32)
+    embed_seconds = time.perf_counter() - start
+
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+    _, truth = flat.search(queries, args.k)
+    report = {
+        "chunks": args.chunks,
+        "dimension": vectors.shape[1],
+        "k": args.k,
+        "embed_seconds": round(embed_seconds, 3),
+        "indexes": {
+            "flat": {
+                "factory": "Flat",
+                "bytes_per_vector": round(len(faiss.serialize_index(flat)) / args.chunks, 1),
+                "search": {"exact": measure(flat, queries, truth, args.k)},
+            },
+        },
+    }
+
+    for index_type in args.types.split(","):
+        start = time.perf_counter()
+        index = build_index(vectors, index_type)
+        build_seconds = time.perf_counter() - start
+        if faiss.try_extract_index_ivf(index) is not None:
+            settings = {f"nprobe={nprobe}": {"nprobe": nprobe} for nprobe in NPROBE_VALUES}
+        else:
+            settings = {f"efSearch={ef}": {"ef_search": ef} for ef in EF_SEARCH_VALUES}
+        search = {}
+        for name, params in settings.items():
+            configure_index(index, **params)
+            search[name] = measure(index, queries, truth, args.k)
+        report["indexes"][index_type] = {
+            "factory": get_index_factory_string(index_type, vectors.shape[1], args.chunks),
+            "build_seconds": round(build_seconds, 3),
+            "bytes_per_vector": round(len(faiss.serialize_index(index)) / args.chunks, 1),
+            "search": search,
+        }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Load test of the JSON API compared with the Streamlit script path.
+
+The API server is started in a subprocess and driven by concurrent
+keep-alive clients. The Streamlit path is measured with Streamlit's
+AppTest, which reruns app.py for every chat message just like a browser
+session does.
+
+Usage:
+    python benchmarks/api_load_test.py [--requests 5000] [--concurrency 50]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUERIES = [
+    "What is the premium for health insurance?",
+    "How do I file an auto claim?",
+    "What is the deductible for my car?",
+    "Does home insurance cover water damage?",
+    "How much does term life cost?",
+    "I want to talk to someone",
+    "hello",
+]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def post(reader, writer, path, payload):
+    body = json.dumps(payload).encode("utf-8")
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    data = await reader.readexactly(length)
+    if b" 200 " not in status_line:
+        raise RuntimeError(f"{status_line!r} {data!r}")
+    return json.loads(data)
+
+
+async def client(port, count, latencies, batch_size):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    session_id = f"load-{random.getrandbits(32)}"
+    for _ in range(count):
+        start = time.perf_counter()
+        if batch_size > 1:
+            await post(reader, writer, "/chat/batch", {"messages": [
+                {"message": random.choice(QUERIES), "session_id": session_id} for _ in range(batch_size)
+            ]})
+        else:
+            await post(reader, writer, "/chat", {"message": random.choice(QUERIES), "session_id": session_id})
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+async def wait_for_server(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("API server did not start")
+
+
+async def run_api(requests, concurrency, batch_size):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "api.py"), "--host", "127.0.0.1", "--port", str(port)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        await wait_for_server(port)
+        latencies = []
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            # The first requests % concurrency clients send one more request
+            client(port, requests // concurrency + (i < requests % concurrency), latencies, batch_size)
+            for i in range(concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies.sort()
+    messages = len(latencies) * batch_size
+    return {
+        "path": "api" if batch_size == 1 else f"api_batch_{batch_size}",
+        "messages": messages,
+        "seconds": round(elapsed, 3),
+        "messages_per_second": round(messages / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 3),
+    }
+
+
+def run_streamlit(messages):
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(ROOT)
+    app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60).run()
+    start = time.perf_counter()
+    for _ in range(messages):
+        app.chat_input[0].set_value(random.choice(QUERIES)).run()
+    elapsed = time.perf_counter() - start
+    return {
+        "path": "streamlit",
+        "messages": messages,
+        "seconds": round(elapsed, 3),
+        "messages_per_second": round(messages / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--streamlit-messages", type=int, default=50)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run_api(args.requests, args.concurrency, 1))))
+    print(json.dumps(asyncio.run(run_api(args.requests // args.batch_size, args.concurrency, args.batch_size))))
+    print(json.dumps(run_streamlit(args.streamlit_messages)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Cold-start check of the rule-engine path: import time report and budget.
+
+Each run starts a fresh interpreter that imports the modules app.py needs,
+loads the knowledge base and answers one query with the rule engine. The
+slowest packages are reported from `python -X importtime`, and the script
+exits with status 1 when the fastest cold start exceeds the budget or when
+a module of the retrieval/LLM stack is imported on this path.
+
+Usage:
+    python benchmarks/cold_start.py [--budget 1.0] [--runs 5] [--top 15] [--output cold_start.json]
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What app.py does before the first response, minus Streamlit itself
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import chat_engine, utils
+from knowledge_base import get_knowledge_base
+knowledge_base = get_knowledge_base(chat_engine.DATA_DIR)
+chat_engine.get_insurance_response("What is the premium for auto insurance?", knowledge_base)
+print(time.perf_counter() - start)
+"""
+
+# Modules that only the LLM path needs and must stay out of the rule path
+DEFERRED_MODULES = ("faiss", "openai", "langchain_openai", "langchain.chains", "langchain_core.memory", "PyPDF2")
+
+_IMPORTTIME_PATTERN = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def run_startup(env, importtime=False):
+    """
+    Run the startup script in a fresh interpreter.
+
+    Returns:
+        tuple: (seconds until the first answer, stderr output)
+    """
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", STARTUP_SCRIPT]
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def parse_importtime(stderr):
+    """
+    Parse `-X importtime` output.
+
+    Returns:
+        list: (module, self_us, cumulative_us, depth) tuples in import order.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget", type=float, default=1.0, help="maximum seconds until the first answer")
+    parser.add_argument("--runs", type=int, default=5, help="cold starts to time, the fastest is kept")
+    parser.add_argument("--top", type=int, default=15, help="slowest packages to report")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args()
+
+    snapshot_dir = tempfile.mkdtemp(prefix="bench-snapshot-")
+    env = dict(os.environ, ANSWER_MODE="rules", KB_SNAPSHOT_DIR=snapshot_dir)
+    try:
+        # The first run writes the bytecode caches and the knowledge base snapshot
+        first_seconds, _ = run_startup(env)
+        seconds = min(run_startup(env)[0] for _ in range(args.runs))
+        _, stderr = run_startup(env, importtime=True)
+    finally:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+    imports = parse_importtime(stderr)
+
+    # Attribute import time to top-level packages, e.g. all of pydantic.*
+    packages = {}
+    for module, self_us, _, _ in imports:
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+    loaded = {module for module, _, _, _ in imports}
+    deferred = sorted(module for module in DEFERRED_MODULES if module in loaded)
+
+    report = {
+        "first_start_seconds": round(first_seconds, 4),
+        "cold_start_seconds": round(seconds, 4),
+        "budget_seconds": args.budget,
+        "import_seconds": round(sum(entry[1] for entry in imports) / 1e6, 4),
+        "slowest_packages_ms": {package: round(self_us / 1e3, 2) for package, self_us in slowest},
+        "deferred_modules_imported": deferred,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+    if seconds > args.budget:
+        print(f"Cold start took {seconds:.3f}s, over the {args.budget:.3f}s budget", file=sys.stderr)
+        sys.exit(1)
+    if deferred:
+        print(f"Rule path imported deferred modules: {', '.join(deferred)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
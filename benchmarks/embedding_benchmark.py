@@ -0,0 +1,170 @@
+"""
+Compare indexing throughput and recall@4 of the embedding backends.
+
+The OpenAI model cannot be called from an offline environment, so it is
+replaced by RemoteEmbeddingStub: deterministic pseudo-random vectors plus a
+simulated round trip per request batch. Its recall is therefore a random
+floor, reported as random_recall_at_4, and says nothing about the remote
+model; its throughput reflects the cost of the network round trips.
+
+Usage:
+    python benchmarks/embedding_benchmark.py [--copies 50] [--latency 0.25] [--output embeddings.json]
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_loader import split_text  # noqa: E402
+from embeddings import HashingEmbeddings  # noqa: E402
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "insurance_data")
+
+# (query, expected policy type, expected section)
+QUERIES = [
+    ("How much is the monthly premium for basic health insurance?", "health", "Basic Health Insurance"),
+    ("What does the family health plan cover?", "health", "Family Health Plan"),
+    ("Does premium health insurance include dental and vision?", "health", "Premium Health Insurance"),
+    ("How do I submit a health insurance claim?", "health", "Claims Process"),
+    ("How do I find out if my doctor is in-network?", "health", "Frequently Asked Questions"),
+    ("How much does term life insurance cost?", "life", "Term Life Insurance"),
+    ("Does whole life insurance build cash value?", "life", "Whole Life Insurance"),
+    ("Can I adjust the death benefit of universal life insurance?", "life", "Universal Life Insurance"),
+    ("Can I change my beneficiary?", "life", "Frequently Asked Questions"),
+    ("What are the bodily injury liability limits for auto?", "auto", "Liability Coverage"),
+    ("What is the collision coverage deductible?", "auto", "Collision Coverage"),
+    ("Does comprehensive coverage cover theft and vandalism?", "auto", "Comprehensive Coverage"),
+    ("How much uninsured/underinsured motorist coverage can I get?", "auto", "Additional Coverage Options"),
+    ("How do I report a car accident claim?", "auto", "Claims Process"),
+    ("Does home insurance cover the physical structure of my home?", "home", "Dwelling Coverage"),
+    ("Are my jewelry and electronics covered under personal property?", "home", "Personal Property Coverage"),
+    ("Does home insurance cover water damage?", "home", "Frequently Asked Questions"),
+    ("What are the medical payments limits on home insurance?", "home", "Additional Coverages"),
+]
+
+
+class RemoteEmbeddingStub(Embeddings):
+    """
+    Deterministic offline stand-in for a remote embedding API.
+    """
+
+    def __init__(self, size=1536, batch_size=1000, latency=0.25):
+        """
+        Args:
+            size (int): Dimension of the embeddings.
+            batch_size (int): Texts per simulated request.
+            latency (float): Simulated round trip per request, in seconds.
+        """
+        self.size = size
+        self.batch_size = batch_size
+        self.latency = latency
+        self.model = f"remote-stub-{size}"
+
+    def _embed(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.size).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            time.sleep(self.latency)
+            vectors.extend(self._embed(text) for text in texts[start:start + self.batch_size])
+        return vectors
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        return self._embed(text)
+
+
+def load_corpus(copies):
+    """
+    Load the sample policies, replicated to simulate a larger catalog.
+
+    Args:
+        copies (int): Number of copies of every policy file.
+
+    Returns:
+        tuple: (base documents, replicated documents)
+    """
+    base = []
+    for filename in sorted(os.listdir(DATA_DIR)):
+        if filename.endswith(".pdf"):
+            with open(os.path.join(DATA_DIR, filename)) as f:
+                base.extend(split_text(f.read()))
+
+    corpus = []
+    for copy in range(copies):
+        for doc in base:
+            corpus.append(doc.model_copy(update={
+                "page_content": f"{doc.page_content}\nCarrier: {copy}"
+            }))
+    return base, corpus
+
+
+def recall_at_k(vectorstore, k=4):
+    """
+    Fraction of QUERIES whose expected section is among the top k results.
+    """
+    hits = 0
+    for query, policy_type, section in QUERIES:
+        results = vectorstore.similarity_search(query, k=k)
+        expected = (policy_type, section)
+        hits += any((doc.metadata["policy_type"], doc.metadata["section"]) == expected for doc in results)
+    return hits / len(QUERIES)
+
+
+def run(embeddings, base, corpus, recall_key="recall_at_4"):
+    """
+    Index the corpus and measure throughput and recall@4.
+
+    Args:
+        recall_key (str): Name of the recall in the results.
+
+    Returns:
+        dict: Benchmark results for one backend.
+    """
+    start = time.perf_counter()
+    FAISS.from_documents(corpus, embeddings)
+    elapsed = time.perf_counter() - start
+
+    vectorstore = FAISS.from_documents(base, embeddings)
+    return {
+        "model": embeddings.model,
+        "chunks": len(corpus),
+        "index_seconds": round(elapsed, 4),
+        "chunks_per_second": round(len(corpus) / elapsed, 1),
+        recall_key: round(recall_at_k(vectorstore), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--copies", type=int, default=50, help="copies of each policy file to index")
+    parser.add_argument("--latency", type=float, default=0.25, help="simulated remote round trip in seconds")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    base, corpus = load_corpus(args.copies)
+    results = [
+        # Pseudo-random vectors: only the throughput is meaningful
+        run(RemoteEmbeddingStub(latency=args.latency), base, corpus, recall_key="random_recall_at_4"),
+        run(HashingEmbeddings(), base, corpus),
+    ]
+    output = json.dumps({"copies": args.copies, "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
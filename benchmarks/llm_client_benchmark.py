@@ -0,0 +1,134 @@
+"""
+Benchmark of the pooled LLM client against a rate-limited mock upstream.
+
+A burst of concurrent sessions, many asking the same questions, is answered
+once with a new ChatOpenAI per request (the previous behavior) and once
+through PooledLLMClient. Both run against benchmarks/mock_llm_server.py,
+which rejects requests beyond its concurrency limit with 429.
+
+Usage:
+    python benchmarks/llm_client_benchmark.py [--sessions 64] [--questions 8]
+        [--max-concurrent 8] [--latency 0.3] [--output llm_client.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_core.messages import HumanMessage, SystemMessage  # noqa: E402
+from langchain_openai import ChatOpenAI  # noqa: E402
+from llm_client import PooledLLMClient  # noqa: E402
+from llm_handler import get_openai_llm  # noqa: E402
+from mock_llm_server import MockLLMServer  # noqa: E402
+
+
+def start_server(server):
+    """
+    Run a mock server on a free port in a background thread.
+
+    Returns:
+        str: Base URL of the server.
+    """
+    started = threading.Event()
+    ports = []
+
+    def on_start(port):
+        ports.append(port)
+        started.set()
+
+    threading.Thread(target=asyncio.run, args=(server.serve("127.0.0.1", 0, on_start),), daemon=True).start()
+    started.wait()
+    return f"http://127.0.0.1:{ports[0]}/v1"
+
+
+def run_burst(answer, prompts):
+    """
+    Answer all prompts at once, one thread per session.
+
+    Returns:
+        dict: Wall time, latency percentiles and failures.
+    """
+    barrier = threading.Barrier(len(prompts))
+
+    def session(messages):
+        barrier.wait()
+        start = time.perf_counter()
+        try:
+            text = answer(messages)
+        except Exception as e:
+            return time.perf_counter() - start, type(e).__name__
+        return time.perf_counter() - start, None if text else "empty"
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(len(prompts)) as executor:
+        results = list(executor.map(session, prompts))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(seconds for seconds, error in results if error is None)
+    errors = [error for _, error in results if error is not None]
+    return {
+        "wall_seconds": round(wall, 3),
+        "p50_seconds": round(statistics.median(latencies), 3) if latencies else None,
+        "p99_seconds": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 3) if latencies else None,
+        "failures": len(errors),
+        "failure_types": sorted(set(errors)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=64, help="concurrent sessions in the burst")
+    parser.add_argument("--questions", type=int, default=8, help="distinct questions asked by the sessions")
+    parser.add_argument("--max-concurrent", type=int, default=8, help="requests the mock serves at once")
+    parser.add_argument("--latency", type=float, default=0.3, help="mock seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="mock seconds between tokens")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "mock")
+    context = "Context:\nDeductible Options: $250, $500, $1,000"
+    prompts = [
+        [SystemMessage(content=context), HumanMessage(content=f"Question {i % args.questions} about my policy?")]
+        for i in range(args.sessions)
+    ]
+    results = {}
+
+    # Previous behavior: a new model, and connection pool, per request, with
+    # the OpenAI SDK's own two retries
+    server = MockLLMServer(args.latency, args.token_delay, args.max_concurrent)
+    base_url = start_server(server)
+
+    def answer_direct(messages):
+        llm = ChatOpenAI(model="gpt-4o", temperature=0, base_url=base_url)
+        return "".join(chunk.content for chunk in llm.stream(messages))
+
+    results["direct"] = dict(run_burst(answer_direct, prompts), upstream=server.stats())
+
+    server = MockLLMServer(args.latency, args.token_delay, args.max_concurrent)
+    base_url = start_server(server)
+    client = PooledLLMClient(get_openai_llm(base_url=base_url), max_concurrency=args.max_concurrent)
+
+    def answer_pooled(messages):
+        return "".join(chunk.content for chunk in client.stream(messages))
+
+    results["pooled"] = dict(run_burst(answer_pooled, prompts), upstream=server.stats(), client=client.stats())
+    client.close()
+
+    output = json.dumps({"sessions": args.sessions, "questions": args.questions, "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Local mock of the OpenAI chat completions API for LLM client benchmarks.
+
+Answers POST /v1/chat/completions, streamed or not, with a canned answer
+echoing the last message. Time to first token, delay between tokens, a
+concurrency limit answered with 429 and a share of 500 errors simulate a
+loaded upstream, as does rejecting a number of first requests with 429.
+GET /stats returns the request counters.
+
+Usage:
+    python benchmarks/mock_llm_server.py [--port 8100] [--latency 0.5] [--token-delay 0.01]
+        [--max-concurrent 4] [--error-rate 0.0] [--rate-limit-first 0]
+
+    LLM_BASE_URL=http://127.0.0.1:8100/v1 OPENAI_API_KEY=mock ANSWER_MODE=llm streamlit run app.py
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+_REASONS = {200: "OK", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+class MockLLMServer:
+    """
+    OpenAI-compatible chat completions server with simulated load.
+    """
+
+    def __init__(self, latency=0.5, token_delay=0.01, max_concurrent=None, error_rate=0.0, retry_after=0.2,
+                 rate_limit_first=0):
+        """
+        Args:
+            latency (float): Seconds before the first token.
+            token_delay (float): Seconds between two tokens.
+            max_concurrent (int): Requests answered at once; more are
+                rejected with 429. None for no limit.
+            error_rate (float): Share of requests failing with 500.
+            retry_after (float): Retry-After seconds sent with 429.
+            rate_limit_first (int): First requests rejected with 429
+                regardless of the load.
+        """
+        self.latency = latency
+        self.token_delay = token_delay
+        self.max_concurrent = max_concurrent
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.rate_limit_first = rate_limit_first
+        self.active = 0
+        self.connections = 0
+        self.counts = {"requests": 0, "completed": 0, "rate_limited": 0, "errors": 0}
+        self.peak_concurrent = 0
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serve HTTP/1.1 requests on a connection until the client closes it.
+        """
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                if method == "GET" and path == "/stats":
+                    self.write_json(writer, 200, self.stats())
+                elif method == "POST" and path.split("?")[0].endswith("/chat/completions"):
+                    await self.complete(json.loads(body or b"{}"), writer)
+                else:
+                    self.write_json(writer, 404, {"error": {"message": f"Unknown path: {path}"}})
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def write_json(self, writer, status, payload, extra_headers=""):
+        data = json.dumps(payload).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+            f"Content-Type: application/json\r\n{extra_headers}"
+            f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1") + data
+        )
+
+    async def complete(self, request, writer):
+        """
+        Answer one chat completion request.
+        """
+        self.counts["requests"] += 1
+        if self.counts["requests"] <= self.rate_limit_first or (
+            self.max_concurrent is not None and self.active >= self.max_concurrent
+        ):
+            self.counts["rate_limited"] += 1
+            self.write_json(
+                writer, 429,
+                {"error": {"message": "Rate limit reached", "type": "rate_limit_error", "code": "rate_limit_exceeded"}},
+                f"Retry-After: {self.retry_after}\r\n"
+            )
+            return
+        if random.random() < self.error_rate:
+            self.counts["errors"] += 1
+            self.write_json(writer, 500, {"error": {"message": "Simulated server error", "type": "server_error"}})
+            return
+
+        self.active += 1
+        self.peak_concurrent = max(self.peak_concurrent, self.active)
+        try:
+            question = request.get("messages", [{}])[-1].get("content", "")
+            tokens = [f"{word} " for word in f"Mock answer to: {question}".split()]
+            model = request.get("model", "mock")
+            await asyncio.sleep(self.latency)
+            if not request.get("stream"):
+                await asyncio.sleep(self.token_delay * len(tokens))
+                self.write_json(writer, 200, {
+                    "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+                })
+            else:
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n"
+                )
+                for i, token in enumerate(tokens + [None]):
+                    chunk = {
+                        "id": "mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"role": "assistant", "content": token} if token else {},
+                            "finish_reason": None if token else "stop",
+                        }],
+                    }
+                    self.write_chunk(writer, f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    await writer.drain()
+                    if token:
+                        await asyncio.sleep(self.token_delay)
+                self.write_chunk(writer, b"data: [DONE]\n\n")
+                writer.write(b"0\r\n\r\n")
+            self.counts["completed"] += 1
+        finally:
+            self.active -= 1
+
+    @staticmethod
+    def write_chunk(writer, data):
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+
+    def stats(self):
+        return dict(self.counts, connections=self.connections, peak_concurrent=self.peak_concurrent)
+
+    async def serve(self, host="127.0.0.1", port=8100, started=None):
+        """
+        Run the server until cancelled.
+
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to listen on, 0 for any free port.
+            started (callable): Called with the bound port once listening.
+        """
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        if started is not None:
+            started(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between tokens")
+    parser.add_argument("--max-concurrent", type=int, help="requests served at once, more get 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with 500")
+    parser.add_argument("--rate-limit-first", type=int, default=0, help="first requests rejected with 429")
+    args = parser.parse_args()
+
+    server = MockLLMServer(
+        args.latency, args.token_delay, args.max_concurrent, args.error_rate, rate_limit_first=args.rate_limit_first
+    )
+    try:
+        asyncio.run(server.serve(args.host, args.port, lambda port: print(f"Mock LLM API on http://{args.host}:{port}/v1")))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+Reproducible benchmarks of the loader, rule engine, retrieval and prompt
+building hot paths.
+
+Results are printed as JSON (or written with --output) so runs can be
+compared; --compare flags metrics that regressed against a previous run.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--sizes 4,100,1000,10000] [--queries 20000]
+        [--output results.json] [--compare baseline.json] [--tolerance 0.2] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chat_engine import get_insurance_response  # noqa: E402
+from chunk_store import ChunkStore  # noqa: E402
+from data_loader import load_documents_from_directory, split_text  # noqa: E402
+from database import get_embedding_model, get_relevant_documents, get_vectorstore  # noqa: E402
+from knowledge_base import build_knowledge_base  # noqa: E402
+from lexical_index import BM25Index  # noqa: E402
+from rule_engine import ESCALATION_KEYWORDS, POLICY_TYPE_KEYWORDS, TOPIC_KEYWORDS, classify_query  # noqa: E402
+from utils import pack_context  # noqa: E402
+
+SAMPLE_DIR = os.path.join(ROOT, "insurance_data")
+
+# Metrics where a higher value is better; all other metrics are timings
+HIGHER_IS_BETTER = ("mb_per_second", "files_per_second", "queries_per_second")
+
+
+def read_samples():
+    samples = []
+    for filename in sorted(os.listdir(SAMPLE_DIR)):
+        if filename.endswith(".pdf"):
+            with open(os.path.join(SAMPLE_DIR, filename)) as f:
+                samples.append((filename, f.read()))
+    return samples
+
+
+def make_corpus(directory, count, samples):
+    """
+    Write count synthetic policy files derived from the sample policies.
+    """
+    rng = random.Random(count)
+    for i in range(count):
+        filename, text = samples[i % len(samples)]
+        # Vary the amounts so files are not byte-identical
+        text = text.replace("$", f"${rng.randint(1, 9)}")
+        with open(os.path.join(directory, f"carrier{i:05d}_{filename}"), "w") as f:
+            f.write(text)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def best_of(repeat, function, *args):
+    """
+    Run a function repeat times and keep the fastest run, to reduce noise.
+    """
+    runs = [timed(function, *args) for _ in range(repeat)]
+    return min(runs, key=lambda run: run[0])
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))] * 1e6
+    return {
+        "p50_us": round(pick(0.50), 3),
+        "p90_us": round(pick(0.90), 3),
+        "p99_us": round(pick(0.99), 3),
+        "max_us": round(samples[-1] * 1e6, 3),
+        "mean_us": round(statistics.fmean(samples) * 1e6, 3),
+    }
+
+
+def bench_loader(sizes, samples, repeat):
+    results = {}
+    for size in sizes:
+        directory = tempfile.mkdtemp(prefix="bench-corpus-")
+        try:
+            make_corpus(directory, size, samples)
+            # The first read of a freshly written corpus is the cold load
+            cold_seconds, documents = timed(load_documents_from_directory, directory)
+            warm_seconds, _ = best_of(repeat, load_documents_from_directory, directory)
+            kb_seconds, knowledge_base = best_of(repeat, build_knowledge_base, directory)
+            kb_warm_seconds, _ = best_of(repeat, build_knowledge_base, directory, knowledge_base)
+        finally:
+            shutil.rmtree(directory)
+        results[str(size)] = {
+            "chunks": len(documents),
+            "load_cold_seconds": round(cold_seconds, 4),
+            "load_warm_seconds": round(warm_seconds, 4),
+            "files_per_second": round(size / warm_seconds, 1),
+            "knowledge_base_build_seconds": round(kb_seconds, 4),
+            "knowledge_base_refresh_seconds": round(kb_warm_seconds, 4),
+        }
+    return results
+
+
+def bench_split_text(samples, repeat, passes=200):
+    text = "\n".join(text for _, text in samples)
+    megabytes = len(text.encode("utf-8")) * passes / 1e6
+    elapsed, _ = best_of(repeat, lambda: [split_text(text) for _ in range(passes)])
+    return {"megabytes": round(megabytes, 3), "seconds": round(elapsed, 4), "mb_per_second": round(megabytes / elapsed, 2)}
+
+
+def generate_queries(count, seed=0):
+    """
+    Generate a query mix of policy types x topics x escalation phrases.
+    """
+    rng = random.Random(seed)
+    policy_keywords = [keyword for _, keywords in POLICY_TYPE_KEYWORDS for keyword in keywords] + [""]
+    topic_keywords = [keyword for _, keywords in TOPIC_KEYWORDS for keyword in keywords] + [""]
+    escalations = ESCALATION_KEYWORDS + [""] * (len(ESCALATION_KEYWORDS) * 4)
+    templates = [
+        "What is the {topic} for {policy} insurance? {escalation}",
+        "{escalation} how does {policy} {topic} work",
+        "Can you tell me about the {topic} of my {policy} plan",
+        "I need help with {policy}",
+    ]
+    return [
+        rng.choice(templates).format(
+            policy=rng.choice(policy_keywords),
+            topic=rng.choice(topic_keywords),
+            escalation=rng.choice(escalations),
+        )
+        for _ in range(count)
+    ]
+
+
+def bench_rule_engine(queries):
+    knowledge_base = build_knowledge_base(SAMPLE_DIR)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        get_insurance_response(query, knowledge_base)
+        latencies.append(time.perf_counter() - start)
+    result = percentiles(latencies)
+    result["queries"] = len(queries)
+    result["queries_per_second"] = round(len(queries) / sum(latencies), 1)
+    return result
+
+
+def bench_retrieval(samples, copies=50, queries=500):
+    documents = [doc for _ in range(copies) for _, text in samples for doc in split_text(text)]
+    embeddings = get_embedding_model("local")
+    index_dir = tempfile.mkdtemp(prefix="bench-index-")
+    try:
+        build_seconds, vectorstore = timed(get_vectorstore, documents, index_dir, embeddings)
+        load_seconds, _ = timed(get_vectorstore, documents, index_dir, embeddings)
+    finally:
+        shutil.rmtree(index_dir)
+
+    query_mix = [f"{query} #{i}" for i, query in enumerate(generate_queries(queries, seed=1))]
+    uncached = []
+    for query in query_mix:
+        uncached.append(timed(get_relevant_documents, vectorstore, query)[0])
+    cached = []
+    for query in query_mix:
+        cached.append(timed(get_relevant_documents, vectorstore, query)[0])
+
+    lexical_build_seconds, lexical_index = best_of(3, BM25Index, documents)
+    lexical = [timed(lexical_index.search, query)[0] for query in query_mix]
+    hybrid = [timed(get_relevant_documents, vectorstore, query, 4, lexical_index)[0] for query in query_mix]
+    partitioned_query_mix = [f"{query} @" for query in query_mix]
+    partitioned = [
+        timed(get_relevant_documents, vectorstore, query, 4, lexical_index, classify_query(query)[1])[0]
+        for query in partitioned_query_mix
+    ]
+
+    return {
+        "chunks": len(documents),
+        "build_seconds": round(build_seconds, 4),
+        "load_seconds": round(load_seconds, 4),
+        "query_uncached": percentiles(uncached),
+        "query_cached": percentiles(cached),
+        "lexical_build_seconds": round(lexical_build_seconds, 4),
+        "lexical_query": percentiles(lexical),
+        "hybrid_query_uncached": percentiles(hybrid),
+        "partitioned_query_uncached": percentiles(partitioned),
+    }
+
+
+def allocated(function, *args):
+    """
+    Measure the memory still held by the result of a call.
+
+    Returns:
+        tuple: (bytes allocated and not freed, result)
+    """
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return size, result
+
+
+def bench_chunk_store(samples, copies=200):
+    texts = [text for _ in range(copies) for _, text in samples]
+    documents_bytes, documents = allocated(lambda: [doc for text in texts for doc in split_text(text)])
+    store_bytes, store = allocated(ChunkStore.from_documents, documents)
+    text_bytes = sum(len(doc.page_content.encode("utf-8")) for doc in documents)
+    rows = random.Random(0).choices(range(len(store)), k=10000)
+    return {
+        "chunks": len(store),
+        "text_bytes": text_bytes,
+        "documents_bytes": documents_bytes,
+        "chunk_store_bytes": store_bytes,
+        "documents_bytes_per_chunk": round(documents_bytes / len(store), 1),
+        "chunk_store_bytes_per_chunk": round(store_bytes / len(store), 1),
+        "build_seconds": round(best_of(3, ChunkStore.from_documents, documents)[0], 4),
+        "text_access": percentiles([timed(store.text, row)[0] for row in rows]),
+        "document_access": percentiles([timed(store.document, row)[0] for row in rows]),
+    }
+
+
+def bench_context_packing(samples, queries=500, k=8, chunk_size=300, chunk_overlap=100):
+    # Small chunks so that sections are split with overlaps, as long
+    # unstructured documents are
+    documents = []
+    for filename, text in samples:
+        for doc in split_text(text, chunk_size, chunk_overlap):
+            doc.metadata["source"] = filename
+            documents.append(doc)
+    lexical_index = BM25Index(documents)
+    results = [[hit.document for hit in lexical_index.search(query, k)] for query in generate_queries(queries, seed=2)]
+    results = [docs for docs in results if docs]
+    packed = [pack_context(docs, 0) for docs in results]
+    raw_tokens = sum(context.raw_tokens for context in packed)
+    tokens = sum(context.tokens for context in packed)
+    return {
+        "queries": len(results),
+        "raw_tokens_per_query": round(raw_tokens / len(results), 1),
+        "tokens_per_query": round(tokens / len(results), 1),
+        "saved_share": round(1 - tokens / raw_tokens, 4),
+        "merged": sum(context.merged for context in packed),
+        "duplicates": sum(context.duplicates for context in packed),
+        "pack": percentiles([timed(pack_context, docs, 0)[0] for docs in results]),
+    }
+
+
+def flatten(results, prefix=""):
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(current, baseline, tolerance):
+    """
+    List the timing and throughput metrics that regressed beyond tolerance.
+    """
+    regressions = []
+    current_flat = flatten(current["results"])
+    for name, old in flatten(baseline["results"]).items():
+        new = current_flat.get(name)
+        # Single worst samples are dominated by scheduler noise
+        if new is None or old == 0 or name.endswith("max_us"):
+            continue
+        if name.endswith(HIGHER_IS_BETTER):
+            regressed = new < old * (1 - tolerance)
+        elif name.endswith(("_seconds", "_us", "_bytes")):
+            regressed = new > old * (1 + tolerance)
+        else:
+            continue
+        if regressed:
+            regressions.append({"metric": name, "baseline": old, "current": new})
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="4,100,1000", help="comma-separated corpus sizes in files (up to 10000)")
+    parser.add_argument("--queries", type=int, default=20000, help="rule-engine queries to time")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="previous results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per timing, the fastest is kept")
+    args = parser.parse_args()
+
+    random.seed(0)
+    samples = read_samples()
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": {
+            "load_documents": bench_loader([int(size) for size in args.sizes.split(",")], samples, args.repeat),
+            "split_text": bench_split_text(samples, args.repeat),
+            "get_insurance_response": bench_rule_engine(generate_queries(args.queries)),
+            "retrieval": bench_retrieval(samples),
+            "chunk_store": bench_chunk_store(samples),
+            "context_packing": bench_context_packing(samples),
+        },
+    }
+
+    if args.compare:
+        with open(args.compare) as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
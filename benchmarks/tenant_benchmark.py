@@ -0,0 +1,115 @@
+"""
+Benchmark of many tenants served by one process under a memory budget.
+
+Tenant directories are made from the sample policies with varied amounts.
+Requests then pick tenants with a skewed (Zipf-like) popularity, as a few
+large insurers and a long tail of small ones would. The report gives the
+latency of first requests (knowledge base built), of requests to evicted
+tenants (reloaded from their snapshot) and of requests to loaded tenants,
+along with the loads and evictions of the TenantRegistry.
+
+Usage:
+    python benchmarks/tenant_benchmark.py [--tenants 200] [--requests 5000]
+        [--budget-kb 512] [--output tenants.json]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import knowledge_base  # noqa: E402
+from chat_engine import get_insurance_response  # noqa: E402
+from tenants import TenantRegistry  # noqa: E402
+
+SAMPLE_DIR = os.path.join(ROOT, "insurance_data")
+
+
+def make_tenants(root, count):
+    """
+    Write count tenant directories derived from the sample policies.
+
+    Returns:
+        dict: Mapping of tenant name to document directory.
+    """
+    samples = []
+    for filename in sorted(os.listdir(SAMPLE_DIR)):
+        if filename.endswith(".pdf"):
+            with open(os.path.join(SAMPLE_DIR, filename)) as f:
+                samples.append((filename, f.read()))
+    directories = {}
+    for i in range(count):
+        directory = os.path.join(root, f"tenant{i:04d}")
+        os.makedirs(directory)
+        for filename, text in samples:
+            with open(os.path.join(directory, filename), "w") as f:
+                f.write(text.replace("$", f"${i % 97 + 1}"))
+        directories[f"tenant{i:04d}"] = directory
+    return directories
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 0.5) * 1e3, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1e3, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tenants", type=int, default=200, help="tenant directories")
+    parser.add_argument("--requests", type=int, default=5000, help="requests to time")
+    parser.add_argument("--budget-kb", type=int, default=512, help="memory budget of the registry")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="bench-tenants-")
+    knowledge_base.SNAPSHOT_DIR = os.path.join(root, ".kb_snapshot")
+    try:
+        registry = TenantRegistry(make_tenants(root, args.tenants), memory_budget=args.budget_kb * 1024)
+        tenants = sorted(registry.directories)
+        weights = [1 / (rank + 1) for rank in range(len(tenants))]
+        rng = random.Random(0)
+        seen = set()
+        timings = {"first": [], "reload": [], "loaded": []}
+        for tenant in rng.choices(tenants, weights, k=args.requests):
+            loaded = tenant in registry._loaded
+            start = time.perf_counter()
+            get_insurance_response("what is the premium for health insurance", registry.get_knowledge_base(tenant))
+            elapsed = time.perf_counter() - start
+            kind = "loaded" if loaded else "reload" if tenant in seen else "first"
+            timings[kind].append(elapsed)
+            seen.add(tenant)
+        report = {
+            "tenants": args.tenants,
+            "requests": args.requests,
+            "tenants_requested": len(seen),
+            "registry": registry.stats(),
+            "latency": {kind: percentiles(samples) for kind, samples in timings.items()},
+        }
+    finally:
+        shutil.rmtree(root)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
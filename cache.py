@@ -0,0 +1,109 @@
+import threading
+from collections import OrderedDict
+
+
+def normalize_query(query):
+    """
+    Normalize a query for use as a cache key.
+
+    Args:
+        query (str): Query string.
+
+    Returns:
+        str: Lowercased query with collapsed whitespace.
+    """
+    return " ".join(query.lower().split())
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded mapping with least-recently-used eviction and
+    hit/miss counters.
+    """
+
+    def __init__(self, maxsize=1024):
+        """
+        Args:
+            maxsize (int): Maximum number of entries kept.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Look up a key and mark it as recently used.
+
+        Args:
+            key: Cache key.
+            default: Value returned on a miss.
+
+        Returns:
+            The cached value, or default.
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Store a value, evicting the least recently used entries if needed.
+
+        Args:
+            key: Cache key.
+            value: Value to store.
+        """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """
+        Remove a key without counting a hit or a miss.
+
+        Args:
+            key: Cache key.
+            default: Value returned if the key is absent.
+
+        Returns:
+            The removed value, or default.
+        """
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        """
+        Remove all entries. The hit/miss counters are kept.
+        """
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """
+        Get the cache statistics.
+
+        Returns:
+            dict: Size, capacity, hits, misses and hit rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,328 @@
+import os
+import logging
+import threading
+import time
+from collections import Counter
+from cache import LRUCache
+from knowledge_base import get_knowledge_base
+from metrics import observe
+from rule_engine import classify_query, get_rule_response, match_rules
+
+logger = logging.getLogger(__name__)
+
+# Directory holding the policy documents
+DATA_DIR = os.environ.get("INSURANCE_DATA_DIR", "insurance_data")
+
+# Answer with the rule engine ("rules"), stream LLM answers over the
+# retrieved policy sections ("llm"), or use the rule engine when it is
+# confident enough and the LLM otherwise ("auto")
+ANSWER_MODE = os.environ.get("ANSWER_MODE", "rules")
+
+# Minimum rule-engine confidence (0 to 1) for "auto" mode to skip the LLM
+ROUTE_CONFIDENCE_THRESHOLD = float(os.environ.get("ROUTE_CONFIDENCE_THRESHOLD", "0.5"))
+
+# SQLite file of the semantic answer cache for LLM answers; empty disables it
+ANSWER_CACHE_PATH = os.environ.get("ANSWER_CACHE_PATH", ".answer_cache.sqlite3")
+# Minimum cosine similarity of two questions to share an answer
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_SIZE = int(os.environ.get("ANSWER_CACHE_SIZE", "10000"))
+
+# JSON file mapping tenant names to their document directories, or a
+# directory holding one document directory per tenant; empty to serve
+# DATA_DIR only
+TENANTS_PATH = os.environ.get("TENANTS_PATH", "")
+
+_route_lock = threading.Lock()
+_route_counts = Counter()
+
+_answer_cache_lock = threading.Lock()
+_answer_cache = None
+
+_warm_up_lock = threading.Lock()
+_warm_up_thread = None
+
+_tenant_registry_lock = threading.Lock()
+_tenant_registry = None
+
+
+class InMemorySessionStore:
+    """
+    Process-local session store with LRU eviction.
+
+    Any object with the same get/delete interface (e.g. one backed by Redis)
+    can be passed to the API server instead.
+    """
+
+    def __init__(self, max_sessions=10000):
+        """
+        Args:
+            max_sessions (int): Maximum number of sessions kept in memory.
+        """
+        self._sessions = LRUCache(max_sessions)
+
+    def get(self, session_id):
+        """
+        Get the state of a session, creating it on first use.
+
+        Args:
+            session_id (str): Session identifier.
+
+        Returns:
+            dict: Session state, see new_session_state.
+        """
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = new_session_state()
+            self._sessions.put(session_id, state)
+        return state
+
+    def delete(self, session_id):
+        """
+        Forget a session.
+
+        Args:
+            session_id (str): Session identifier.
+        """
+        self._sessions.pop(session_id)
+
+
+def new_session_state():
+    """
+    Create the state of a new chat session.
+
+    Returns:
+        dict: State with the conversation "memory".
+    """
+    from memory import BoundedSummaryMemory
+
+    return {"memory": BoundedSummaryMemory()}
+
+
+def get_answer_cache():
+    """
+    Get the process-wide semantic answer cache.
+
+    Returns:
+        SemanticAnswerCache: The cache, or None if ANSWER_CACHE_PATH is empty.
+    """
+    global _answer_cache
+    if _answer_cache is None and ANSWER_CACHE_PATH:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                from answer_cache import SemanticAnswerCache
+
+                _answer_cache = SemanticAnswerCache(
+                    ANSWER_CACHE_PATH, ANSWER_CACHE_THRESHOLD, ANSWER_CACHE_TTL, ANSWER_CACHE_SIZE
+                )
+    return _answer_cache
+
+
+def get_tenant_registry():
+    """
+    Get the process-wide registry of tenant knowledge bases.
+
+    Returns:
+        TenantRegistry: The registry, or None if TENANTS_PATH is empty.
+    """
+    global _tenant_registry
+    if _tenant_registry is None and TENANTS_PATH:
+        with _tenant_registry_lock:
+            if _tenant_registry is None:
+                from tenants import TenantRegistry
+
+                _tenant_registry = TenantRegistry.from_path(TENANTS_PATH)
+    return _tenant_registry
+
+
+def get_tenant_knowledge_base(tenant=None):
+    """
+    Get the knowledge base to answer a tenant's queries from.
+
+    Args:
+        tenant (str): Tenant name, None for the knowledge base of DATA_DIR.
+
+    Returns:
+        KnowledgeBase: The current knowledge base.
+
+    Raises:
+        KeyError: If the tenant is unknown.
+    """
+    if tenant is None:
+        return get_knowledge_base(DATA_DIR)
+    registry = get_tenant_registry()
+    if registry is None:
+        raise KeyError(tenant)
+    return registry.get_knowledge_base(tenant)
+
+
+def warm_up(mode=None):
+    """
+    Import the retrieval and LLM modules in a background thread.
+
+    The rule engine answers without them, so they are left out of startup
+    and loaded here while the first page is already served. Calling this
+    again is a no-op.
+
+    Args:
+        mode (str): Answer mode, defaults to ANSWER_MODE. Nothing is loaded
+            in "rules" mode.
+
+    Returns:
+        threading.Thread: The warm-up thread, or None in "rules" mode.
+    """
+    global _warm_up_thread
+    if (mode or ANSWER_MODE) == "rules":
+        return None
+    with _warm_up_lock:
+        if _warm_up_thread is None:
+            _warm_up_thread = threading.Thread(target=_import_llm_stack, name="warm-up", daemon=True)
+            _warm_up_thread.start()
+    return _warm_up_thread
+
+
+def _import_llm_stack():
+    start = time.perf_counter()
+    import database  # noqa: F401
+    import llm_handler  # noqa: F401
+    import memory  # noqa: F401
+    logger.info("Retrieval and LLM modules imported in %.3fs", time.perf_counter() - start)
+
+
+def get_insurance_response(query, knowledge_base=None):
+    """
+    Answer a query with the rule engine.
+
+    Args:
+        query (str): User query.
+        knowledge_base (KnowledgeBase): Knowledge base to answer from,
+            defaults to the shared knowledge base of DATA_DIR.
+
+    Returns:
+        str: Response text.
+    """
+    knowledge_base = knowledge_base or get_knowledge_base(DATA_DIR)
+    start = time.perf_counter()
+    response = get_rule_response(query, knowledge_base.responses)
+    observe("classification", time.perf_counter() - start)
+    return response
+
+
+def route_query(query, knowledge_base=None, threshold=None):
+    """
+    Decide whether the rule engine or the LLM answers a query.
+
+    The decision is logged and counted, see get_routing_stats.
+
+    Args:
+        query (str): User query.
+        knowledge_base (KnowledgeBase): Knowledge base to answer from,
+            defaults to the shared knowledge base of DATA_DIR.
+        threshold (float): Minimum rule confidence to answer with the rule
+            engine, defaults to ROUTE_CONFIDENCE_THRESHOLD.
+
+    Returns:
+        tuple: ("rules" or "llm", RuleMatch of the query).
+    """
+    knowledge_base = knowledge_base or get_knowledge_base(DATA_DIR)
+    threshold = ROUTE_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    start = time.perf_counter()
+    match = match_rules(query, knowledge_base.responses)
+    observe("classification", time.perf_counter() - start)
+    route = "rules" if match.confidence >= threshold else "llm"
+    with _route_lock:
+        _route_counts[route] += 1
+    logger.debug(
+        "Routed to %s: confidence %.2f (policy type %s, topic %s)",
+        route, match.confidence, match.policy_type, match.topic
+    )
+    return route, match
+
+
+def get_routing_stats():
+    """
+    Get the number of queries routed to each answer path in "auto" mode.
+
+    Returns:
+        dict: Query counts for "rules" and "llm", and the share of queries
+            answered by the rule engine.
+    """
+    with _route_lock:
+        rules, llm = _route_counts["rules"], _route_counts["llm"]
+    return {"rules": rules, "llm": llm, "rule_share": rules / (rules + llm) if rules + llm else 0.0}
+
+
+def stream_response(query, memory=None, knowledge_base=None, mode=None, tenant=None):
+    """
+    Answer a query, yielding the response as it is produced.
+
+    A tenant whose vector index is still warming up is answered by the rule
+    engine, see TenantRegistry.
+
+    Args:
+        query (str): User query.
+        memory (BoundedSummaryMemory): Conversation memory of the session.
+        knowledge_base (KnowledgeBase): Knowledge base to answer from,
+            defaults to the knowledge base of the tenant.
+        mode (str): "rules", "llm" or "auto", defaults to ANSWER_MODE.
+        tenant (str): Tenant name, None for the shared knowledge base of
+            DATA_DIR.
+
+    Yields:
+        str: Response chunks. The rule engine yields the whole response
+            at once.
+    """
+    knowledge_base = knowledge_base or get_tenant_knowledge_base(tenant)
+    mode = mode or ANSWER_MODE
+    if mode == "auto":
+        mode, match = route_query(query, knowledge_base)
+        if mode == "rules":
+            # Keep the turn so that a later LLM answer has the context
+            if memory is not None:
+                memory.add_turn(query, match.response)
+            yield match.response
+            return
+    if mode == "llm":
+        # The retrieval and LLM stack is slow to import and unused by the
+        # rule engine, see warm_up
+        from database import get_shared_vectorstore
+        from llm_handler import get_llm_client, stream_answer
+
+        if tenant is not None:
+            ready, vectorstore = get_tenant_registry().get_vectorstore(tenant, knowledge_base)
+            if not ready:
+                logger.info("Index of tenant %s is warming up, answering with the rule engine", tenant)
+                response = get_insurance_response(query, knowledge_base)
+                if memory is not None:
+                    memory.add_turn(query, response)
+                yield response
+                return
+        else:
+            vectorstore = get_shared_vectorstore(knowledge_base)
+        _, policy_type, _ = classify_query(query)
+        yield from stream_answer(
+            get_llm_client(), vectorstore, query, memory, knowledge_base.lexical_index, policy_type,
+            answer_cache=get_answer_cache(), cache_scope=knowledge_base.version
+        )
+    else:
+        yield get_insurance_response(query, knowledge_base)
+
+
+def get_response(query, memory=None, knowledge_base=None, mode=None, tenant=None):
+    """
+    Answer a query.
+
+    Args:
+        query (str): User query.
+        memory (BoundedSummaryMemory): Conversation memory of the session.
+        knowledge_base (KnowledgeBase): Knowledge base to answer from.
+        mode (str): "rules", "llm" or "auto", defaults to ANSWER_MODE.
+        tenant (str): Tenant name, None for the knowledge base of DATA_DIR.
+
+    Returns:
+        str: Response text.
+    """
+    start = time.perf_counter()
+    response = "".join(stream_response(query, memory, knowledge_base, mode, tenant))
+    observe("response", time.perf_counter() - start)
+    return response
@@ -0,0 +1,292 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import deque
+from typing import NamedTuple
+
+# SQLite file receiving the messages that no longer fit in memory
+CHAT_HISTORY_PATH = os.environ.get("CHAT_HISTORY_PATH", ".chat_history.sqlite3")
+
+# Recent messages kept in memory and rendered per session
+CHAT_RING_SIZE = int(os.environ.get("CHAT_RING_SIZE", "50"))
+
+# Earlier messages loaded per "load earlier" click
+CHAT_PAGE_SIZE = int(os.environ.get("CHAT_PAGE_SIZE", "20"))
+
+# Seconds of inactivity after which a session and its stored messages are
+# dropped
+CHAT_SESSION_TTL = float(os.environ.get("CHAT_SESSION_TTL", "3600"))
+
+# Minimum number of seconds between two sweeps for idle sessions
+SWEEP_INTERVAL = 60.0
+
+GREETING = "Hello! I'm your insurance policy assistant. How can I help you today?"
+
+
+class Message(NamedTuple):
+    """
+    A chat message and its position in the session.
+    """
+    seq: int
+    role: str
+    content: str
+
+
+class HistoryStore:
+    """
+    SQLite store of the chat messages spilled out of the in-memory rings of
+    all sessions.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): SQLite database file, or ":memory:".
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, "
+            "PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, last_spill REAL NOT NULL)"
+        )
+
+    def spill(self, session_id, messages):
+        """
+        Store messages of a session.
+
+        Args:
+            session_id (str): Session identifier.
+            messages (list): Message entries.
+        """
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                [(session_id, *message) for message in messages]
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, last_spill) VALUES (?, ?)", (session_id, time.time())
+            )
+            self._db.execute("COMMIT")
+
+    def page(self, session_id, before, limit):
+        """
+        Get the stored messages of a session preceding a position.
+
+        Args:
+            session_id (str): Session identifier.
+            before (int): Position of the earliest message already shown.
+            limit (int): Maximum number of messages.
+
+        Returns:
+            list: The up to limit messages right before the position, oldest
+                first.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT seq, role, content FROM messages WHERE session_id = ? AND seq < ? "
+                "ORDER BY seq DESC LIMIT ?",
+                (session_id, before, limit)
+            ).fetchall()
+        return [Message(*row) for row in reversed(rows)]
+
+    def delete(self, session_ids):
+        """
+        Delete the stored messages of sessions.
+
+        Args:
+            session_ids (list): Session identifiers.
+        """
+        parameters = [(session_id,) for session_id in session_ids]
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("DELETE FROM messages WHERE session_id = ?", parameters)
+            self._db.executemany("DELETE FROM sessions WHERE session_id = ?", parameters)
+            self._db.execute("COMMIT")
+
+    def evict(self, cutoff, keep=()):
+        """
+        Delete the messages of sessions that spilled nothing since a time,
+        e.g. sessions of an earlier process.
+
+        Args:
+            cutoff (float): Unix time.
+            keep (iterable): Identifiers of sessions still in use.
+
+        Returns:
+            int: Number of sessions deleted.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT session_id FROM sessions WHERE last_spill < ?", (cutoff,)).fetchall()
+        keep = set(keep)
+        idle = [session_id for (session_id,) in rows if session_id not in keep]
+        if idle:
+            self.delete(idle)
+        return len(idle)
+
+
+class ChatHistory:
+    """
+    Chat history of one session with constant memory and render cost.
+
+    The most recent messages live in a ring of ring_size entries; older ones
+    are spilled to a HistoryStore and only read back, a page at a time, when
+    the user asks for them. Loaded pages are dropped again with the next
+    message.
+    """
+
+    def __init__(self, session_id, store, ring_size=50, greeting=GREETING):
+        """
+        Args:
+            session_id (str): Session identifier.
+            store (HistoryStore): Store receiving the spilled messages.
+            ring_size (int): Number of recent messages kept in memory.
+            greeting (str): First assistant message of a conversation, if
+                any.
+        """
+        self.session_id = session_id
+        self.store = store
+        self.greeting = greeting
+        self.last_active = time.monotonic()
+        self._ring = deque(maxlen=ring_size)
+        self._earlier = []
+        self._next_seq = 0
+        if greeting:
+            self.append("assistant", greeting)
+
+    def append(self, role, content):
+        """
+        Add a message, spilling the oldest message of a full ring.
+
+        Args:
+            role (str): "user" or "assistant".
+            content (str): Message text.
+        """
+        if len(self._ring) == self._ring.maxlen:
+            self.store.spill(self.session_id, [self._ring[0]])
+        self._ring.append(Message(self._next_seq, role, content))
+        self._next_seq += 1
+        self._earlier = []
+        self.last_active = time.monotonic()
+
+    def visible(self):
+        """
+        Get the messages to render.
+
+        Returns:
+            list: The loaded earlier messages followed by the ring, oldest
+                first.
+        """
+        return self._earlier + list(self._ring)
+
+    def has_earlier(self):
+        """
+        Check whether older messages than the visible ones are stored.
+
+        Returns:
+            bool: True if load_earlier would return messages.
+        """
+        visible = self._earlier or self._ring
+        return bool(visible) and visible[0].seq > 0
+
+    def load_earlier(self, count=20):
+        """
+        Make the next page of older messages visible.
+
+        Args:
+            count (int): Number of messages to load.
+
+        Returns:
+            int: Number of messages loaded.
+        """
+        visible = self._earlier or self._ring
+        if not visible:
+            return 0
+        page = self.store.page(self.session_id, visible[0].seq, count)
+        self._earlier = page + self._earlier
+        self.last_active = time.monotonic()
+        return len(page)
+
+    def clear(self):
+        """
+        Forget every message of the session, stored ones included.
+        """
+        self.store.delete([self.session_id])
+        self._ring.clear()
+        self._earlier = []
+        self._next_seq = 0
+        if self.greeting:
+            self.append("assistant", self.greeting)
+
+
+_lock = threading.Lock()
+_store = None
+_sessions = {}
+_last_sweep = time.monotonic()
+
+
+def get_history_store():
+    """
+    Get the process-wide store of spilled messages.
+
+    Returns:
+        HistoryStore: The store, in memory if CHAT_HISTORY_PATH is empty.
+    """
+    global _store
+    if _store is None:
+        with _lock:
+            if _store is None:
+                _store = HistoryStore(CHAT_HISTORY_PATH or ":memory:")
+    return _store
+
+
+def get_session_history(session_id):
+    """
+    Get the chat history of a session, creating it on first use.
+
+    The histories are kept per process rather than in each Streamlit session
+    state so that idle ones can be evicted: sessions inactive for longer than
+    CHAT_SESSION_TTL are dropped with their stored messages, and so are
+    the stored messages left by earlier processes.
+
+    Args:
+        session_id (str): Session identifier.
+
+    Returns:
+        ChatHistory: The history.
+    """
+    global _last_sweep
+    store = get_history_store()
+    now = time.monotonic()
+    sweep = False
+    with _lock:
+        if now - _last_sweep >= SWEEP_INTERVAL:
+            _last_sweep = now
+            sweep = True
+            for key in [key for key, history in _sessions.items() if now - history.last_active > CHAT_SESSION_TTL]:
+                del _sessions[key]
+        history = _sessions.get(session_id)
+        if history is None:
+            history = _sessions[session_id] = ChatHistory(session_id, store, CHAT_RING_SIZE)
+        history.last_active = now
+        active = set(_sessions) if sweep else None
+    if sweep:
+        store.evict(time.time() - CHAT_SESSION_TTL, active)
+    return history
+
+
+def get_session_count():
+    """
+    Get the number of chat histories held in memory.
+
+    Returns:
+        int: Number of sessions.
+    """
+    return len(_sessions)
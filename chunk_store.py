@@ -0,0 +1,296 @@
+import numpy as np
+from langchain_core.documents import Document
+
+# Metadata fields stored as integer codes; any other metadata is kept per row
+FIELDS = ("policy_type", "section", "source")
+
+
+def get_code_dtype(label_count):
+    """
+    Get the narrowest code type for a label table.
+
+    Args:
+        label_count (int): Number of labels, None included.
+
+    Returns:
+        numpy.dtype: uint16, or uint32 beyond 65,536 labels.
+    """
+    return np.dtype(np.uint16) if label_count <= 1 << 16 else np.dtype(np.uint32)
+
+
+class ChunkStore:
+    """
+    Immutable, columnar store of text chunks and their metadata.
+
+    The texts of all chunks are concatenated in a single UTF-8 buffer and
+    located by an array of byte offsets. Policy type, section and source are
+    stored as uint16 codes (uint32 for label tables beyond 65,536 entries)
+    into label tables, with code 0 meaning the field is absent. A chunk
+    therefore costs its UTF-8 bytes plus 14 bytes,
+    instead of a Document object with its own string and metadata dict.
+
+    Documents are only materialized on access. Slices share the buffer and
+    the arrays of the store they were taken from.
+    """
+
+    def __init__(self, buffer, offsets, codes, labels, extra=None):
+        """
+        Args:
+            buffer (bytes): UTF-8 text of the chunks, back to back.
+            offsets (numpy.ndarray): int64 byte offsets, one more than the
+                number of chunks; chunk i is buffer[offsets[i]:offsets[i + 1]].
+            codes (dict): Mapping of field to a uint16 or uint32 array of
+                label codes.
+            labels (dict): Mapping of field to its label tuple, labels[0]
+                being None.
+            extra (dict): Mapping of row to the metadata outside FIELDS, for
+                the rare rows that have any.
+        """
+        self.buffer = buffer
+        self.offsets = offsets
+        self.codes = codes
+        self.labels = labels
+        self.extra = extra or {}
+        self._view = memoryview(buffer)
+
+    @classmethod
+    def from_documents(cls, documents):
+        """
+        Build a store from Document objects.
+
+        Args:
+            documents (iterable): Documents to store.
+
+        Returns:
+            ChunkStore: The store.
+        """
+        encoded = []
+        label_index = {field: {None: 0} for field in FIELDS}
+        codes = {field: [] for field in FIELDS}
+        extra = {}
+        for row, doc in enumerate(documents):
+            encoded.append(doc.page_content.encode("utf-8"))
+            others = {}
+            for key, value in doc.metadata.items():
+                if key in label_index and isinstance(value, str):
+                    continue
+                others[key] = value
+            for field in FIELDS:
+                value = doc.metadata.get(field)
+                if not isinstance(value, str):
+                    value = None
+                codes[field].append(label_index[field].setdefault(value, len(label_index[field])))
+            if others:
+                extra[row] = others
+
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(data) for data in encoded], out=offsets[1:])
+        return cls(
+            b"".join(encoded),
+            offsets,
+            {
+                field: np.asarray(values, dtype=get_code_dtype(len(label_index[field])))
+                for field, values in codes.items()
+            },
+            {field: tuple(index) for field, index in label_index.items()},
+            extra
+        )
+
+    @classmethod
+    def concat(cls, stores):
+        """
+        Concatenate stores into a new, contiguous store.
+
+        Args:
+            stores (list): ChunkStore objects, in order.
+
+        Returns:
+            ChunkStore: Store holding the chunks of all stores.
+        """
+        label_index = {field: {None: 0} for field in FIELDS}
+        buffers = []
+        offsets = [np.zeros(1, dtype=np.int64)]
+        codes = {field: [] for field in FIELDS}
+        extra = {}
+        size = 0
+        rows = 0
+        for store in stores:
+            start, stop = store.offsets[0], store.offsets[-1]
+            buffers.append(store._view[start:stop])
+            offsets.append(store.offsets[1:] - start + size)
+            size += stop - start
+            for field in FIELDS:
+                # Translate the codes of this store to the merged label table
+                mapping = np.array(
+                    [label_index[field].setdefault(label, len(label_index[field])) for label in store.labels[field]],
+                    dtype=np.uint32
+                )
+                codes[field].append(mapping[store.codes[field]])
+            extra.update({rows + row: metadata for row, metadata in store.extra.items()})
+            rows += len(store)
+
+        return cls(
+            b"".join(buffers),
+            np.concatenate(offsets),
+            {
+                # Codes are translated as uint32, narrowed to fit the merged table
+                field: np.concatenate(arrays).astype(get_code_dtype(len(label_index[field])), copy=False)
+                if arrays else np.zeros(0, dtype=np.uint16)
+                for field, arrays in codes.items()
+            },
+            {field: tuple(index) for field, index in label_index.items()},
+            extra
+        )
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.document(row)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_view"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._view = memoryview(self.buffer)
+
+    @property
+    def nbytes(self):
+        """
+        int: Memory held by the store, text included.
+        """
+        return (
+            self.offsets[-1] - self.offsets[0]
+            + self.offsets.nbytes
+            + sum(codes.nbytes for codes in self.codes.values())
+        )
+
+    def view(self, row):
+        """
+        Get the UTF-8 bytes of a chunk without copying them.
+
+        Args:
+            row (int): Chunk number.
+
+        Returns:
+            memoryview: The bytes of the chunk.
+        """
+        return self._view[self.offsets[row]:self.offsets[row + 1]]
+
+    def text(self, row):
+        """
+        Get the text of a chunk.
+
+        Args:
+            row (int): Chunk number.
+
+        Returns:
+            str: The text, decoded straight from the buffer.
+        """
+        return str(self._view[self.offsets[row]:self.offsets[row + 1]], "utf-8")
+
+    def get(self, row, field):
+        """
+        Get a metadata field of a chunk.
+
+        Args:
+            row (int): Chunk number.
+            field (str): One of FIELDS.
+
+        Returns:
+            str: The value, or None if the chunk has none.
+        """
+        return self.labels[field][self.codes[field][row]]
+
+    def metadata(self, row):
+        """
+        Get the metadata of a chunk.
+
+        Args:
+            row (int): Chunk number.
+
+        Returns:
+            dict: A new metadata dict, equal to the one of the original
+                Document.
+        """
+        metadata = {}
+        for field in FIELDS:
+            value = self.labels[field][self.codes[field][row]]
+            if value is not None:
+                metadata[field] = value
+        if row in self.extra:
+            metadata.update(self.extra[row])
+        return metadata
+
+    def document(self, row):
+        """
+        Materialize a chunk as a Document.
+
+        Args:
+            row (int): Chunk number.
+
+        Returns:
+            Document: A new Document with the text and metadata of the chunk.
+        """
+        return Document(page_content=self.text(row), metadata=self.metadata(row))
+
+    def rows(self, field, value):
+        """
+        Find the chunks whose metadata field has a value.
+
+        Args:
+            field (str): One of FIELDS.
+            value (str): Value of the field.
+
+        Returns:
+            numpy.ndarray: Matching chunk numbers, in order.
+        """
+        labels = self.labels[field]
+        if value not in labels:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self.codes[field] == labels.index(value))
+
+    def slice(self, start, stop):
+        """
+        Get a consecutive range of chunks without copying them.
+
+        Args:
+            start (int): First chunk number.
+            stop (int): Chunk number after the last chunk.
+
+        Returns:
+            ChunkStore: Store sharing this store's buffer.
+        """
+        return ChunkStore(
+            self.buffer,
+            self.offsets[start:stop + 1],
+            {field: codes[start:stop] for field, codes in self.codes.items()},
+            self.labels,
+            {row - start: metadata for row, metadata in self.extra.items() if start <= row < stop}
+        )
+
+    def take(self, rows):
+        """
+        Copy a selection of chunks into a new, contiguous store.
+
+        Args:
+            rows (iterable): Chunk numbers, in the order to keep.
+
+        Returns:
+            ChunkStore: Store holding only the selected chunks.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        lengths = self.offsets[rows + 1] - self.offsets[rows]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return ChunkStore(
+            b"".join(self._view[self.offsets[row]:self.offsets[row + 1]] for row in rows),
+            offsets,
+            {field: codes[rows] for field, codes in self.codes.items()},
+            self.labels,
+            {i: self.extra[row] for i, row in enumerate(rows.tolist()) if row in self.extra}
+        )
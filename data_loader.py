@@ -1,11 +1,144 @@
 import os
 import io
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
+import mmap
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from itertools import groupby, islice
+from typing import NamedTuple
+from langchain_core.documents import Document
+
+# Threads used to read and split policy files
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", min(32, (os.cpu_count() or 1) + 4)))
+
+# PDFs with at least this many pages are parsed on a process pool
+PDF_PARALLEL_PAGES = 32
+
+_pdf_executor = None
+_pdf_executor_lock = threading.Lock()
+
+def is_pdf(file_path):
+    """
+    Check whether a file is a real PDF rather than text stored as .pdf.
+    
+    Args:
+        file_path (str): Path to the file.
+    
+    Returns:
+        bool: True if the file starts with the PDF signature.
+    """
+    with open(file_path, 'rb') as file:
+        return file.read(5) == b"%PDF-"
+
+def _extract_pdf_pages(file_path, start, stop, reader=None):
+    """
+    Extract the text of a range of PDF pages.
+    
+    Runs in a worker process, where it opens its own reader, or in-process
+    with the reader already opened by the caller.
+    
+    Args:
+        file_path (str): Path to the PDF file.
+        start (int): First page index.
+        stop (int): Page index after the last page.
+        reader (PdfReader): Open reader of the file, if any.
+    
+    Returns:
+        list: Text of each page.
+    """
+    if reader is None:
+        from PyPDF2 import PdfReader
+
+        reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+def _get_pdf_executor():
+    """
+    Get the process pool used to parse large PDFs, creating it on first use.
+    
+    Returns:
+        ProcessPoolExecutor: The shared process pool.
+    """
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is None:
+            # spawn, as forking a process with running threads is unsafe
+            _pdf_executor = ProcessPoolExecutor(mp_context=multiprocessing.get_context("spawn"))
+        return _pdf_executor
+
+def _reset_pdf_executor(executor):
+    """
+    Discard a broken process pool so the next large PDF starts a new one.
+    
+    Args:
+        executor (ProcessPoolExecutor): The pool that failed.
+    """
+    global _pdf_executor
+    with _pdf_executor_lock:
+        if _pdf_executor is executor:
+            _pdf_executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def extract_pdf_text(file_path):
+    """
+    Extract the text of a PDF with PyPDF2.
+    
+    PDFs with at least PDF_PARALLEL_PAGES pages are split into page ranges
+    that are parsed in parallel on a process pool.
+    
+    Args:
+        file_path (str): Path to the PDF file.
+    
+    Returns:
+        str: Text of all pages, separated by blank lines.
+    """
+    # Imported on first use, plain-text policy files never need PyPDF2
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(file_path)
+    page_count = len(reader.pages)
+    if page_count < PDF_PARALLEL_PAGES:
+        pages = _extract_pdf_pages(file_path, 0, page_count, reader)
+    else:
+        executor = _get_pdf_executor()
+        step = max(PDF_PARALLEL_PAGES // 2, -(-page_count // (os.cpu_count() or 1)))
+        try:
+            futures = [
+                executor.submit(_extract_pdf_pages, file_path, start, min(start + step, page_count))
+                for start in range(0, page_count, step)
+            ]
+            pages = [page for future in futures for page in future.result()]
+        except BrokenProcessPool as e:
+            print(f"PDF worker pool failed, parsing {file_path} in-process: {e}")
+            _reset_pdf_executor(executor)
+            pages = _extract_pdf_pages(file_path, 0, page_count, reader)
+    return "\n\n".join(pages)
+
+def _iter_mmap_lines(file_path):
+    """
+    Iterate over the lines of a text file through a memory map.
+    
+    Args:
+        file_path (str): Path to the file.
+    
+    Yields:
+        str: Decoded lines.
+    """
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for line in iter(mapped.readline, b""):
+                yield line.decode("utf-8", errors="replace")
 
 def load_pdf(file_path):
     """
-    Load a text file (stored with .pdf extension) and extract its content.
+    Load a policy file and extract its content.
+    
+    Real PDFs are parsed with PyPDF2; text files stored with a .pdf
+    extension are read as they are.
     
     Args:
         file_path (str): Path to the file.
@@ -14,6 +147,8 @@ def load_pdf(file_path):
         str: Extracted text from the file.
     """
     try:
+        if is_pdf(file_path):
+            return extract_pdf_text(file_path)
         with open(file_path, 'r') as file:
             text = file.read()
         return text
@@ -21,30 +156,149 @@ def load_pdf(file_path):
         print(f"Error reading file {file_path}: {e}")
         return ""
 
+class PolicyRecord(NamedTuple):
+    """
+    A single line of a policy document together with its position in the
+    document structure.
+    
+    Attributes:
+        policy_type (str): Policy type from the "# ..." title, e.g. "health".
+        title (str): Document title without the leading "#".
+        section (str): Enclosing "## ..." heading, i.e. the plan name or a
+            shared section such as "Claims Process".
+        field (str): Key of a "- Key: value" line, empty for other lines.
+        text (str): The stripped line itself.
+    """
+    policy_type: str
+    title: str
+    section: str
+    field: str
+    text: str
+
+
+# Title keywords used to derive the policy type of a document
+POLICY_TITLES = [
+    ("Health Insurance", "health"),
+    ("Life Insurance", "life"),
+    ("Auto Insurance", "auto"),
+    ("Home Insurance", "home"),
+]
+
+
+def classify_policy_type(title):
+    """
+    Determine the policy type from a document title.
+    
+    Args:
+        title (str): Document title.
+    
+    Returns:
+        str: One of "health", "life", "auto", "home" or "general".
+    """
+    for keyword, policy_type in POLICY_TITLES:
+        if keyword in title:
+            return policy_type
+    return "general"
+
+
+def parse_policy_text(lines):
+    """
+    Parse the "#" / "##" / "- Key: value" layout of a policy document.
+    
+    The lines are consumed in a single pass, so a file object can be passed
+    directly to stream a document without reading it into memory.
+    
+    Args:
+        lines (iterable): Lines of the document.
+    
+    Yields:
+        PolicyRecord: One record per non-empty, non-heading line.
+    """
+    title = ""
+    policy_type = "general"
+    section = ""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("## "):
+            section = line[3:].strip()
+        elif line.startswith("# "):
+            title = line[2:].strip()
+            policy_type = classify_policy_type(title)
+            section = ""
+        else:
+            field = ""
+            if line.startswith("- ") and ":" in line:
+                field = line[2:line.index(":")].strip()
+            yield PolicyRecord(policy_type, title, section, field, line)
+
+
 def split_text(text, chunk_size=1000, chunk_overlap=200):
     """
-    Split the text into chunks for processing.
+    Split the text into one chunk per "##" section.
+    
+    Each chunk starts with its document title and section heading and carries
+    the policy type and section in its metadata. Sections longer than
+    chunk_size (e.g. unstructured text) are further split by characters.
     
     Args:
         text (str): Text to split.
-        chunk_size (int): Size of each chunk.
-        chunk_overlap (int): Overlap between chunks.
+        chunk_size (int): Maximum size of each chunk.
+        chunk_overlap (int): Overlap between chunks of an oversized section.
     
     Returns:
         list: List of Document objects.
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-        length_function=len
-    )
-    chunks = text_splitter.split_text(text)
-    return [Document(page_content=chunk) for chunk in chunks]
+    return list(split_lines(text.splitlines(), chunk_size, chunk_overlap))
+
+def split_lines(lines, chunk_size=1000, chunk_overlap=200):
+    """
+    Split a stream of lines into one chunk per "##" section.
+    
+    Same as split_text, but consumes the lines lazily and yields each
+    chunk as soon as its section is complete.
+    
+    Args:
+        lines (iterable): Lines of the document.
+        chunk_size (int): Maximum size of each chunk.
+        chunk_overlap (int): Overlap between chunks of an oversized section.
+    
+    Yields:
+        Document: Section chunks.
+    """
+    for (policy_type, title, section), records in groupby(
+        parse_policy_text(lines),
+        key=lambda record: (record.policy_type, record.title, record.section)
+    ):
+        headings = [f"# {title}"] if title else []
+        if section:
+            headings.append(f"## {section}")
+        content = "\n".join(headings + [record.text for record in records])
+        metadata = {"policy_type": policy_type, "section": section}
+
+        if len(content) <= chunk_size:
+            yield Document(page_content=content, metadata=metadata)
+            continue
+
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len
+        )
+        for chunk in text_splitter.split_text(content):
+            yield Document(page_content=chunk, metadata=dict(metadata))
 
 def process_pdf(file_path):
     """
     Process a PDF file by loading it and splitting it into chunks.
     
+    Each chunk is tagged with its policy type, section and source file name.
+    Text files are streamed through a memory map instead of being read
+    into a single string.
+    
     Args:
         file_path (str): Path to the PDF file.
     
@@ -52,12 +306,79 @@ def process_pdf(file_path):
         list: List of Document objects.
     """
     try:
-        text = load_pdf(file_path)
-        return split_text(text)
+        if is_pdf(file_path):
+            documents = split_text(extract_pdf_text(file_path))
+        else:
+            documents = list(split_lines(_iter_mmap_lines(file_path)))
     except Exception as e:
         print(f"Error processing {file_path}: {e}")
         return []
 
+    source = os.path.basename(file_path)
+    for doc in documents:
+        doc.metadata["source"] = source
+    return documents
+
+def process_files(file_paths, executor=None, max_workers=None):
+    """
+    Process files concurrently, yielding each result as soon as it is ready.
+    
+    At most twice the number of workers files are in flight at a time, so
+    large directories are never held in memory at once.
+    
+    Args:
+        file_paths (iterable): Paths of the files to process.
+        executor (Executor): Pool to run process_pdf on, e.g. a
+            ProcessPoolExecutor for CPU-bound parsing. A thread pool with
+            max_workers threads is used by default.
+        max_workers (int): Number of workers of the pool, INGEST_WORKERS by
+            default.
+    
+    Yields:
+        tuple: (file_path, list of Document objects), in completion order.
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max_workers or INGEST_WORKERS)
+    max_in_flight = 2 * (max_workers or INGEST_WORKERS)
+
+    try:
+        file_paths = iter(file_paths)
+        pending = {}
+        for file_path in islice(file_paths, max_in_flight):
+            pending[executor.submit(process_pdf, file_path)] = file_path
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path = pending.pop(future)
+                for next_path in islice(file_paths, 1):
+                    pending[executor.submit(process_pdf, next_path)] = next_path
+                yield file_path, future.result()
+    finally:
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+def iter_documents_from_directory(directory_path, executor=None, max_workers=None):
+    """
+    Load the PDF documents of a directory as a stream.
+    
+    Args:
+        directory_path (str): Path to the directory containing PDF files.
+        executor (Executor): Pool to process the files on, see process_files.
+        max_workers (int): Number of threads of the default pool.
+    
+    Yields:
+        Document: Chunks of all files, as each file finishes processing.
+    """
+    ensure_document_directory(directory_path)
+    
+    file_paths = (
+        entry.path for entry in os.scandir(directory_path)
+        if entry.name.endswith('.pdf')
+    )
+    for _, documents in process_files(file_paths, executor, max_workers):
+        yield from documents
+
 def load_documents_from_directory(directory_path):
     """
     Load all PDF documents from a directory.
@@ -68,19 +389,35 @@ def load_documents_from_directory(directory_path):
     Returns:
         list: List of Document objects from all PDFs.
     """
-    documents = []
+    return list(iter_documents_from_directory(directory_path))
+
+def ensure_document_directory(directory_path):
+    """
+    Make sure the document directory exists.
     
+    Args:
+        directory_path (str): Path to the directory containing PDF files.
+    """
     # Check if directory exists, if not, create sample PDFs with insurance information
     if not os.path.exists(directory_path):
         os.makedirs(directory_path)
         create_sample_insurance_pdfs(directory_path)
+
+def hash_file(file_path):
+    """
+    Compute the SHA-256 digest of a file's content.
     
-    for filename in os.listdir(directory_path):
-        if filename.endswith('.pdf'):
-            file_path = os.path.join(directory_path, filename)
-            documents.extend(process_pdf(file_path))
+    Args:
+        file_path (str): Path to the file.
     
-    return documents
+    Returns:
+        str: Hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
 def create_sample_insurance_pdfs(directory_path):
     """
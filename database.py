@@ -1,43 +1,1026 @@
 import os
+import json
+from typing import Any
+import pickle
+import shutil
+import heapq
+import hashlib
+import tempfile
+import weakref
+import itertools
+import threading
+import time
+import uuid
+import faiss
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
 from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
 from langchain_openai import OpenAIEmbeddings
+from cache import LRUCache, normalize_query
+from chunk_store import ChunkStore
+from embeddings import CachedEmbeddings, HashingEmbeddings
+from metrics import observe
 
-def get_embedding_model():
+# Embedding backend used when none is passed explicitly ("openai" or "local")
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "openai")
+
+# Directory holding the persisted FAISS indexes, one subdirectory per index key
+INDEX_DIR = os.environ.get("FAISS_INDEX_DIR", ".faiss_index")
+
+# Flat indexes are memory-mapped with IO_FLAG_MMAP_IFC on recent FAISS versions
+_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+# Number of query embeddings and of top-k results kept in memory
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "1024"))
+
+# Rank offset of reciprocal rank fusion; larger values flatten the rank weights
+RRF_K = 60
+
+# FAISS index built for new vector stores: "flat" (exact), "hnsw",
+# "hnsw_sq8" (HNSW over int8 vectors), "ivf_sq8" or "ivf_pq" (compressed)
+INDEX_TYPE = os.environ.get("FAISS_INDEX_TYPE", "flat")
+
+# Inverted lists visited per IVF query and candidate list size of HNSW
+# queries; higher values trade latency for recall
+NPROBE = int(os.environ.get("FAISS_NPROBE", "16"))
+EF_SEARCH = int(os.environ.get("FAISS_EF_SEARCH", "64"))
+
+# Maximum number of vectors the IVF and PQ quantizers are trained on
+TRAIN_SAMPLE_SIZE = int(os.environ.get("FAISS_TRAIN_SAMPLE", "50000"))
+
+# Smaller corpora get an exact flat index whatever INDEX_TYPE says: they are
+# searched fast enough as is, and the PQ codebooks need about 10000 vectors
+# to train
+APPROXIMATE_MIN_VECTORS = 10000
+
+# Neighbors per HNSW node
+HNSW_M = 32
+
+_shared_lock = threading.Lock()
+_shared_vectorstores = {}
+
+_query_embedding_cache = LRUCache(QUERY_CACHE_SIZE)
+_result_cache = LRUCache(QUERY_CACHE_SIZE)
+# Vector stores are identified in result cache keys by a generation number
+# rather than id(), which may be reused once a replaced store is collected
+_generations = weakref.WeakKeyDictionary()
+_generation_counter = itertools.count()
+
+# Per-policy-type filtered views of each vector store, built on first use
+_partitions = weakref.WeakKeyDictionary()
+_partitions_lock = threading.Lock()
+
+class ChunkDocstore(Docstore, AddableMixin):
+    """
+    FAISS docstore keeping its documents in ChunkStores.
+    
+    Added documents are appended as a new ChunkStore segment, and deleted
+    ones are only forgotten until copy() compacts the segments. Documents
+    are materialized on search, so the store holds no Document objects.
+    """
+    
+    def __init__(self, chunks=None, ids=()):
+        """
+        Args:
+            chunks (ChunkStore): Initial chunks, if any.
+            ids (list): Docstore ID of each initial chunk.
+        """
+        self._segments = []
+        self._locations = {}
+        if chunks is not None and len(chunks):
+            self._segments.append(chunks)
+            self._locations = {doc_id: (0, row) for row, doc_id in enumerate(ids)}
+    
+    @classmethod
+    def from_docstore(cls, docstore):
+        """
+        Convert another docstore, e.g. the InMemoryDocstore of an index
+        persisted before ChunkDocstore existed.
+        
+        Args:
+            docstore (InMemoryDocstore): Docstore to convert.
+        
+        Returns:
+            ChunkDocstore: Docstore holding the same documents.
+        """
+        if isinstance(docstore, cls):
+            return docstore
+        ids = list(docstore._dict)
+        return cls(ChunkStore.from_documents(docstore._dict.values()), ids)
+    
+    def __len__(self):
+        return len(self._locations)
+    
+    @property
+    def nbytes(self):
+        """
+        int: Memory held by the segments, deleted documents included.
+        """
+        return sum(chunks.nbytes for chunks in self._segments)
+    
+    def add(self, texts):
+        """
+        Add documents.
+        
+        Args:
+            texts (dict): Mapping of docstore ID to Document.
+        """
+        overlapping = set(texts).intersection(self._locations)
+        if overlapping:
+            raise ValueError(f"Tried to add ids that already exist: {overlapping}")
+        if not texts:
+            return
+        segment = len(self._segments)
+        self._segments.append(ChunkStore.from_documents(texts.values()))
+        for row, doc_id in enumerate(texts):
+            self._locations[doc_id] = (segment, row)
+    
+    def delete(self, ids):
+        """
+        Delete documents.
+        
+        Args:
+            ids (list): Docstore IDs to delete.
+        """
+        missing = set(ids).difference(self._locations)
+        if missing:
+            raise ValueError(f"Tried to delete ids that does not exist: {missing}")
+        for doc_id in ids:
+            del self._locations[doc_id]
+    
+    def search(self, search):
+        """
+        Look up a document by docstore ID.
+        
+        Args:
+            search (str): Docstore ID.
+        
+        Returns:
+            Document: The document, or an error message string if the ID is
+                unknown, like InMemoryDocstore.
+        """
+        location = self._locations.get(search)
+        if location is None:
+            return f"ID {search} not found."
+        chunks = self._segments[location[0]]
+        row = location[1]
+        return Document(id=search, page_content=chunks.text(row), metadata=chunks.metadata(row))
+    
+    def get(self, search, field):
+        """
+        Look up a metadata field of a document without materializing it.
+        
+        Args:
+            search (str): Docstore ID.
+            field (str): One of chunk_store.FIELDS.
+        
+        Returns:
+            str: The value, or None if the document has none or the ID is
+                unknown.
+        """
+        location = self._locations.get(search)
+        if location is None:
+            return None
+        return self._segments[location[0]].get(location[1], field)
+    
+    def copy(self):
+        """
+        Copy the docstore into a single compact segment.
+        
+        Returns:
+            ChunkDocstore: Docstore holding the live documents only.
+        """
+        ids = sorted(self._locations, key=self._locations.get)
+        rows = {}
+        for doc_id in ids:
+            segment, row = self._locations[doc_id]
+            rows.setdefault(segment, []).append(row)
+        chunks = ChunkStore.concat([self._segments[segment].take(rows[segment]) for segment in sorted(rows)])
+        return ChunkDocstore(chunks, ids)
+
+def get_embedding_model(backend=None):
     """
     Get the embedding model for creating vector embeddings.
     
+    Args:
+        backend (str): "openai" for the OpenAI API or "local" for the offline
+            hashed n-gram model. Defaults to the EMBEDDING_BACKEND environment
+            variable, or "openai" when it is not set.
+    
     Returns:
-        OpenAIEmbeddings: The embedding model.
+        Embeddings: The embedding model, with query embeddings cached.
     """
-    api_key = os.environ.get("OPENAI_API_KEY")
-    return OpenAIEmbeddings(openai_api_key=api_key)
+    backend = backend or EMBEDDING_BACKEND
+    if backend == "local":
+        embeddings = HashingEmbeddings()
+    elif backend == "openai":
+        api_key = os.environ.get("OPENAI_API_KEY")
+        embeddings = OpenAIEmbeddings(openai_api_key=api_key)
+    else:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    return CachedEmbeddings(embeddings, _query_embedding_cache)
 
-def get_vectorstore(documents):
+def get_embedding_model_id(embeddings):
     """
-    Create a vector store from documents using embeddings.
+    Get a stable identifier for an embedding model.
+    
+    Args:
+        embeddings: Embedding model.
+    
+    Returns:
+        str: Identifier made of the class name and the model name, if any.
+    """
+    if isinstance(embeddings, CachedEmbeddings):
+        embeddings = embeddings.embeddings
+    model = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None)
+    return f"{type(embeddings).__name__}:{model}"
+
+def _get_index_id(embeddings):
+    """
+    Identify the embedding model and, unless flat, the index type, so that
+    indexes of either are never mixed up.
+    """
+    model_id = get_embedding_model_id(embeddings)
+    return model_id if INDEX_TYPE == "flat" else f"{model_id}|{INDEX_TYPE}"
+
+def get_index_key(documents, embeddings):
+    """
+    Compute the cache key of the index for a set of documents.
+    
+    Args:
+        documents: ChunkStore, or list of Document objects.
+        embeddings: Embedding model used to build the index.
+    
+    Returns:
+        str: Hex digest of the embedding model, the index type and the chunk
+            texts and metadata.
+    """
+    digest = hashlib.sha256(_get_index_id(embeddings).encode("utf-8"))
+    if isinstance(documents, ChunkStore):
+        # Hash the UTF-8 buffer in place rather than decoding every chunk
+        for row in range(len(documents)):
+            digest.update(b"\0")
+            digest.update(documents.view(row))
+            digest.update(json.dumps(documents.metadata(row), sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+    for doc in documents:
+        digest.update(b"\0")
+        digest.update(doc.page_content.encode("utf-8"))
+        digest.update(json.dumps(doc.metadata, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+def get_index_factory_string(index_type, dimension, count, nlist=None, pq_m=None, hnsw_m=HNSW_M):
+    """
+    Get the faiss.index_factory description of an index type.
+    
+    Args:
+        index_type (str): "flat", "hnsw", "hnsw_sq8", "ivf_sq8" or "ivf_pq".
+        dimension (int): Dimension of the vectors.
+        count (int): Number of vectors to index.
+        nlist (int): Number of IVF inverted lists, about 4 * sqrt(count) by
+            default.
+        pq_m (int): Number of PQ sub-quantizers, each encoding a vector into
+            one byte; the largest divisor of the dimension up to a 1/8 of it
+            by default.
+        hnsw_m (int): Neighbors per HNSW node.
+    
+    Returns:
+        str: Index factory description, "Flat" for corpora smaller than
+            APPROXIMATE_MIN_VECTORS.
+    """
+    if index_type not in ("flat", "hnsw", "hnsw_sq8", "ivf_sq8", "ivf_pq"):
+        raise ValueError(f"Unknown index type: {index_type}")
+    if index_type == "flat" or count < APPROXIMATE_MIN_VECTORS:
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m}"
+    if index_type == "hnsw_sq8":
+        return f"HNSW{hnsw_m},SQ8"
+    # At least 39 training vectors per list, as k-means needs
+    nlist = nlist or max(1, min(int(4 * count ** 0.5), count // 39))
+    if index_type == "ivf_sq8":
+        return f"IVF{nlist},SQ8"
+    pq_m = pq_m or next(m for m in range(max(1, dimension // 8), 0, -1) if dimension % m == 0)
+    return f"IVF{nlist},PQ{pq_m}"
+
+def configure_index(index, nprobe=None, ef_search=None):
+    """
+    Set the search-time parameters of an approximate index.
+    
+    Args:
+        index (faiss.Index): Index to configure, left as is if it is exact.
+        nprobe (int): Inverted lists visited per IVF query, defaults to
+            NPROBE.
+        ef_search (int): Candidate list size of HNSW queries, defaults to
+            EF_SEARCH.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe or NPROBE, ivf.nlist)
+    hnsw = faiss.downcast_index(index)
+    if isinstance(hnsw, faiss.IndexHNSW):
+        hnsw.hnsw.efSearch = ef_search or EF_SEARCH
+
+def build_index(vectors, index_type=None, metric=faiss.METRIC_L2, **kwargs):
+    """
+    Build a FAISS index over vectors.
+    
+    Quantizers are trained on a random sample of at most TRAIN_SAMPLE_SIZE
+    vectors.
+    
+    Args:
+        vectors (numpy.ndarray): float32 vectors, one per row.
+        index_type (str): Index type, defaults to INDEX_TYPE.
+        metric (int): FAISS metric type.
+        **kwargs: nlist, pq_m or hnsw_m, see get_index_factory_string.
+    
+    Returns:
+        faiss.Index: The index, holding the vectors in row order.
+    """
+    count, dimension = vectors.shape
+    description = get_index_factory_string(index_type or INDEX_TYPE, dimension, count, **kwargs)
+    index = faiss.index_factory(dimension, description, metric)
+    if not index.is_trained:
+        sample = vectors
+        if count > TRAIN_SAMPLE_SIZE:
+            rows = np.random.default_rng(0).choice(count, TRAIN_SAMPLE_SIZE, replace=False)
+            sample = vectors[np.sort(rows)]
+        index.train(sample)
+    index.add(vectors)
+    configure_index(index)
+    return index
+
+def create_vectorstore(documents, embeddings, ids=None, index_type=None):
+    """
+    Embed documents into a new vector store with an index of the given type.
     
     Args:
         documents (list): List of Document objects.
+        embeddings: Embedding model.
+        ids (list): Docstore ID of each document, random by default.
+        index_type (str): Index type, defaults to INDEX_TYPE.
     
     Returns:
-        FAISS: Vector store with embedded documents.
+        FAISS: The vector store.
+    """
+    documents = list(documents)
+    index_type = index_type or INDEX_TYPE
+    if index_type == "flat" or len(documents) < APPROXIMATE_MIN_VECTORS:
+        return FAISS.from_documents(documents, embeddings, ids=ids, docstore=ChunkDocstore())
+    vectors = np.asarray(embeddings.embed_documents([doc.page_content for doc in documents]), dtype=np.float32)
+    ids = ids or [str(uuid.uuid4()) for _ in documents]
+    return FAISS(
+        embeddings,
+        build_index(vectors, index_type),
+        ChunkDocstore(ChunkStore.from_documents(documents), ids),
+        dict(enumerate(ids))
+    )
+
+def get_reconstructible_index(index):
+    """
+    Get an index whose vectors can be read back with reconstruct_batch.
+    
+    Compressed indexes reconstruct their decoded, approximate vectors.
+    
+    Args:
+        index (faiss.Index): Index holding the vectors.
+    
+    Returns:
+        faiss.Index: The index itself, or for IVF indexes without a direct
+            map a copy with one, rather than changing a shared index.
     """
-    embeddings = get_embedding_model()
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+        index = faiss.clone_index(index)
+        faiss.extract_index_ivf(index).make_direct_map()
+    return index
+
+def save_vectorstore(vectorstore, index_dir, key, manifest=None):
+    """
+    Persist a vector store under its index key.
+    
+    The files are written to a temporary directory first and then renamed,
+    so concurrent processes never observe a partially written index.
+    
+    Args:
+        vectorstore (FAISS): Vector store to persist.
+        index_dir (str): Root directory of the persisted indexes.
+        key (str): Index key from get_index_key.
+        manifest (dict): Optional manifest stored next to the index.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    target = os.path.join(index_dir, key)
+    if os.path.exists(target):
+        return
+    tmp_dir = tempfile.mkdtemp(prefix=f".{key}-", dir=index_dir)
+    try:
+        vectorstore.save_local(tmp_dir)
+        if manifest is not None:
+            with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+                json.dump(manifest, f)
+        os.replace(tmp_dir, target)
+    except OSError as e:
+        # Another process may have stored the same key in the meantime
+        print(f"Error saving index {target}: {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def load_vectorstore(index_dir, key, embeddings, mmap=True):
+    """
+    Load a persisted vector store if one exists for the index key.
     
+    Args:
+        index_dir (str): Root directory of the persisted indexes.
+        key (str): Index key from get_index_key.
+        embeddings: Embedding model used for queries.
+        mmap (bool): Memory-map the index file instead of reading it into
+            memory. Memory-mapped indexes are read-only.
+    
+    Returns:
+        FAISS: The vector store, or None if no valid index was found.
+    """
+    path = os.path.join(index_dir, key)
+    index_path = os.path.join(path, "index.faiss")
+    docstore_path = os.path.join(path, "index.pkl")
+    if not (os.path.exists(index_path) and os.path.exists(docstore_path)):
+        return None
+
+    try:
+        index = faiss.read_index(index_path, _MMAP_FLAGS if mmap else 0)
+        # The pickle is written by save_vectorstore in this process tree only
+        with open(docstore_path, "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+    except Exception as e:
+        print(f"Error loading index {path}: {e}")
+        return None
+
+    configure_index(index)
+    return FAISS(embeddings, index, ChunkDocstore.from_docstore(docstore), index_to_docstore_id)
+
+def get_vectorstore(documents, index_dir=INDEX_DIR, embeddings=None):
+    """
+    Create a vector store from documents using embeddings.
+    
+    The index is loaded from disk when one was already built for the same
+    documents and embedding model, and built and persisted otherwise.
+    
+    Args:
+        documents: ChunkStore, or list of Document objects.
+        index_dir (str): Root directory of the persisted indexes.
+        embeddings: Embedding model, defaults to get_embedding_model().
+    
+    Returns:
+        FAISS: Vector store with embedded documents.
+    """
+    embeddings = embeddings or get_embedding_model()
+    key = get_index_key(documents, embeddings)
+
+    vectorstore = load_vectorstore(index_dir, key, embeddings)
+    if vectorstore is not None:
+        return vectorstore
+
     # Create vectorstore with embedded documents
-    vectorstore = FAISS.from_documents(documents, embeddings)
+    vectorstore = create_vectorstore(documents, embeddings)
+    save_vectorstore(vectorstore, index_dir, key)
     return vectorstore
 
-def get_relevant_documents(vectorstore, query, k=4):
+def _copy_vectorstore(vectorstore):
+    """
+    Make a private, writable copy of a vector store.
+    
+    Updates are applied to a copy so that readers holding the current store
+    (possibly memory-mapped and read-only) are never affected.
+    
+    Args:
+        vectorstore (FAISS): Vector store to copy.
+    
+    Returns:
+        FAISS: The copy.
+    """
+    return FAISS(
+        vectorstore.embedding_function,
+        faiss.clone_index(vectorstore.index),
+        ChunkDocstore.from_docstore(vectorstore.docstore).copy(),
+        dict(vectorstore.index_to_docstore_id)
+    )
+
+def _rebuild_vectorstore(vectorstore, stale_ids):
+    """
+    Make a copy of a vector store without some documents, for indexes that
+    cannot remove vectors (HNSW). The kept vectors are reconstructed from
+    the index rather than embedded again.
+    
+    Args:
+        vectorstore (FAISS): Vector store to copy.
+        stale_ids (list): Docstore IDs of the documents to leave out.
+    
+    Returns:
+        FAISS: The copy.
+    """
+    stale = set(stale_ids)
+    kept = [(position, doc_id) for position, doc_id in sorted(vectorstore.index_to_docstore_id.items()) if doc_id not in stale]
+    positions = np.array([position for position, _ in kept], dtype=np.int64)
+    docstore = ChunkDocstore.from_docstore(vectorstore.docstore).copy()
+    docstore.delete(stale_ids)
+    return FAISS(
+        vectorstore.embedding_function,
+        build_index(
+            get_reconstructible_index(vectorstore.index).reconstruct_batch(positions),
+            metric=vectorstore.index.metric_type
+        ),
+        docstore.copy(),
+        {i: doc_id for i, (_, doc_id) in enumerate(kept)},
+        normalize_L2=vectorstore._normalize_L2,
+        distance_strategy=vectorstore.distance_strategy
+    )
+
+def _get_manifest_pointer(index_dir, embeddings, directory_path=None):
+    """
+    Get the path of the file naming the current manifest-tracked index.
+    
+    Args:
+        index_dir (str): Root directory of the persisted indexes.
+        embeddings: Embedding model used to build the index.
+        directory_path (str): Document directory the index was built from,
+            so that knowledge bases sharing index_dir keep their own index.
+    
+    Returns:
+        str: Path of the pointer file for this embedding model, index type
+            and document directory.
+    """
+    pointer_id = _get_index_id(embeddings)
+    if directory_path is not None:
+        pointer_id += f"|{os.path.abspath(directory_path)}"
+    pointer_hash = hashlib.sha256(pointer_id.encode("utf-8")).hexdigest()
+    return os.path.join(index_dir, f"CURRENT-{pointer_hash[:16]}")
+
+def _is_index_referenced(index_dir, key):
+    """
+    Check whether any manifest pointer in a directory names an index.
+    
+    Args:
+        index_dir (str): Root directory of the persisted indexes.
+        key (str): Index key.
+    
+    Returns:
+        bool: True if the index is current for some knowledge base.
+    """
+    try:
+        with os.scandir(index_dir) as it:
+            pointers = [entry.path for entry in it if entry.name.startswith("CURRENT-") and entry.is_file()]
+    except OSError:
+        return False
+    for pointer in pointers:
+        try:
+            with open(pointer) as f:
+                if f.read().strip() == key:
+                    return True
+        except OSError:
+            continue
+    return False
+
+def load_manifest_vectorstore(index_dir, embeddings, directory_path=None):
+    """
+    Load the current manifest-tracked vector store and its manifest.
+    
+    Args:
+        index_dir (str): Root directory of the persisted indexes.
+        embeddings: Embedding model used for queries.
+        directory_path (str): Document directory the index was built from.
+    
+    Returns:
+        tuple: (vectorstore, manifest), or (None, {}) if none was persisted.
+    """
+    try:
+        with open(_get_manifest_pointer(index_dir, embeddings, directory_path)) as f:
+            key = f.read().strip()
+        with open(os.path.join(index_dir, key, "manifest.json")) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None, {}
+
+    vectorstore = load_vectorstore(index_dir, key, embeddings)
+    if vectorstore is None:
+        return None, {}
+    return vectorstore, manifest
+
+def sync_vectorstore(files, vectorstore=None, manifest=None, index_dir=INDEX_DIR, embeddings=None,
+                     directory_path=None):
+    """
+    Bring a vector store in line with the current policy files.
+    
+    The manifest records each file's modification time, content hash, chunk
+    hash and chunk IDs. Only files whose chunks changed are re-embedded: their
+    stale vectors are deleted and the new ones added. The updated index and
+    manifest are persisted and become the starting point of the next process.
+    
+    Args:
+        files (dict): Mapping of file name to a PolicyFile with its chunks.
+        vectorstore (FAISS): Current vector store, or None to load the
+            persisted one.
+        manifest (dict): Manifest of the current vector store.
+        index_dir (str): Root directory of the persisted indexes.
+        embeddings: Embedding model, defaults to the embedding model of the
+            vector store or get_embedding_model().
+        directory_path (str): Document directory of the files. Each
+            directory has its own manifest pointer in index_dir.
+    
+    Returns:
+        tuple: (vectorstore, manifest). The vector store is None when there
+            are no documents at all.
+    """
+    if embeddings is None and vectorstore is not None:
+        embeddings = vectorstore.embedding_function
+    embeddings = embeddings or get_embedding_model()
+    if vectorstore is None:
+        vectorstore, manifest = load_manifest_vectorstore(index_dir, embeddings, directory_path)
+    manifest = manifest or {}
+
+    entries = {}
+    for filename, policy_file in files.items():
+        entries[filename] = {
+            "mtime_ns": policy_file.mtime_ns,
+            "sha256": policy_file.sha256,
+            "chunks": get_index_key(policy_file.chunks, embeddings),
+        }
+
+    stale_ids = []
+    for filename, entry in manifest.items():
+        if entries.get(filename, {}).get("chunks") != entry["chunks"]:
+            stale_ids.extend(entry["ids"])
+
+    new_documents = []
+    new_ids = []
+    for filename, entry in entries.items():
+        previous = manifest.get(filename)
+        if previous is not None and previous["chunks"] == entry["chunks"]:
+            entry["ids"] = previous["ids"]
+            continue
+        entry["ids"] = [f"{filename}:{entry['chunks'][:12]}:{i}" for i in range(len(files[filename].chunks))]
+        new_documents.extend(files[filename].chunks)
+        new_ids.extend(entry["ids"])
+
+    if vectorstore is not None and not stale_ids and not new_ids:
+        return vectorstore, entries
+
+    if vectorstore is not None:
+        clear_result_cache()
+        if stale_ids and isinstance(faiss.downcast_index(vectorstore.index), faiss.IndexHNSW):
+            vectorstore = _rebuild_vectorstore(vectorstore, stale_ids)
+        else:
+            vectorstore = _copy_vectorstore(vectorstore)
+            if stale_ids:
+                vectorstore.delete(stale_ids)
+        if new_ids:
+            vectorstore.add_documents(new_documents, ids=new_ids)
+    elif new_ids:
+        vectorstore = create_vectorstore(new_documents, embeddings, ids=new_ids)
+
+    if vectorstore is None or not vectorstore.index_to_docstore_id:
+        return None, entries
+
+    key = hashlib.sha256(
+        json.dumps({name: entry["chunks"] for name, entry in entries.items()}, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    save_vectorstore(vectorstore, index_dir, key, manifest=entries)
+    pointer = _get_manifest_pointer(index_dir, embeddings, directory_path)
+    try:
+        with open(pointer) as f:
+            previous_key = f.read().strip()
+    except OSError:
+        previous_key = None
+    with open(pointer + ".tmp", "w") as f:
+        f.write(key)
+    os.replace(pointer + ".tmp", pointer)
+    # Identical documents in another directory share the index
+    if previous_key and previous_key != key and not _is_index_referenced(index_dir, previous_key):
+        shutil.rmtree(os.path.join(index_dir, previous_key), ignore_errors=True)
+    return vectorstore, entries
+
+def get_shared_vectorstore(knowledge_base, index_dir=INDEX_DIR, embeddings=None):
+    """
+    Get the process-wide vector store for a knowledge base.
+    
+    The vector store follows the knowledge base: when a newer knowledge base
+    is passed in, the changed files are re-indexed incrementally and the new
+    store replaces the old one for subsequent callers.
+    
+    Args:
+        knowledge_base (KnowledgeBase): Current knowledge base.
+        index_dir (str): Root directory of the persisted indexes.
+        embeddings: Embedding model, defaults to get_embedding_model().
+    
+    Returns:
+        FAISS: Vector store for the knowledge base, or None if it is empty.
+    """
+    key = os.path.abspath(knowledge_base.directory_path)
+    entry = _shared_vectorstores.get(key)
+    if entry is not None and entry[0] is knowledge_base:
+        return entry[1]
+
+    with _shared_lock:
+        entry = _shared_vectorstores.get(key)
+        if entry is not None and entry[0] is knowledge_base:
+            return entry[1]
+        vectorstore, manifest = entry[1:] if entry is not None else (None, None)
+        vectorstore, manifest = sync_vectorstore(
+            knowledge_base.files, vectorstore, manifest, index_dir, embeddings, knowledge_base.directory_path
+        )
+        _shared_vectorstores[key] = (knowledge_base, vectorstore, manifest)
+        return vectorstore
+
+def release_shared_vectorstore(directory_path):
+    """
+    Drop the process-wide vector store of a document directory.
+    
+    The next get_shared_vectorstore call loads it again from its persisted
+    index.
+    
+    Args:
+        directory_path (str): Directory of the knowledge base.
+    """
+    with _shared_lock:
+        _shared_vectorstores.pop(os.path.abspath(directory_path), None)
+
+def get_vectorstore_nbytes(vectorstore):
+    """
+    Estimate the memory held by a vector store.
+    
+    Args:
+        vectorstore (FAISS): Vector store.
+    
+    Returns:
+        int: Bytes of the vector codes, the HNSW graph if any, the docstore
+            chunks and the policy type views built so far.
+    """
+    index = faiss.downcast_index(vectorstore.index)
+    try:
+        code_size = index.sa_code_size()
+    except RuntimeError:
+        # Graph indexes have no standalone codec, count full vectors
+        code_size = index.d * 4
+    nbytes = index.ntotal * code_size
+    hnsw = getattr(index, "hnsw", None)
+    if hnsw is not None:
+        nbytes += hnsw.neighbors.size() * 4
+    nbytes += sum(partition.nbytes for partition in _partitions.get(vectorstore, {}).values())
+    return int(nbytes + getattr(vectorstore.docstore, "nbytes", 0))
+
+class FilteredVectorStore:
+    """
+    Read-only view of a vector store restricted to some of its documents.
+    
+    Searches run on the index of the vector store with a FAISS ID selector,
+    so the view copies no vector and trains no index. Approximate indexes
+    keep their nprobe or efSearch setting.
+    """
+    
+    def __init__(self, vectorstore, positions):
+        """
+        Args:
+            vectorstore (FAISS): Vector store to search.
+            positions (numpy.ndarray): Index positions of the documents in
+                the view.
+        """
+        self.vectorstore = vectorstore
+        self.ntotal = len(positions)
+        mask = np.zeros(vectorstore.index.ntotal, dtype=bool)
+        mask[positions] = True
+        # The selector reads the bitmap in place, so it is kept with it
+        self._bitmap = np.packbits(mask, bitorder="little")
+        self._selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(self._bitmap))
+    
+    @property
+    def nbytes(self):
+        """
+        int: Memory held by the view, one bit per vector of the index.
+        """
+        return self._bitmap.nbytes
+    
+    def _get_search_parameters(self, index):
+        if isinstance(index, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(sel=self._selector, nprobe=index.nprobe)
+        if isinstance(index, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=self._selector, efSearch=index.hnsw.efSearch)
+        return faiss.SearchParameters(sel=self._selector)
+    
+    def _search_exhaustive(self, index, vector, k):
+        if isinstance(index, faiss.IndexIVF):
+            params = faiss.SearchParametersIVF(sel=self._selector, nprobe=index.nlist)
+            _, positions = index.search(vector, k, params=params)
+            return positions[0][positions[0] != -1]
+        members = np.flatnonzero(np.unpackbits(self._bitmap, count=index.ntotal, bitorder="little"))
+        _, rows = faiss.knn(vector, index.reconstruct_batch(members), k, metric=index.metric_type)
+        return members[rows[0][rows[0] != -1]]
+    
+    def similarity_search(self, query, k=4):
+        """
+        Find the documents of the view most similar to a query.
+        
+        Approximate indexes can miss the documents of a view spread thin
+        over the index; when they return fewer than k documents, the view is
+        searched exhaustively.
+        
+        Args:
+            query (str): Query string.
+            k (int): Number of documents to retrieve.
+        
+        Returns:
+            list: Document objects, most similar first.
+        """
+        vectorstore = self.vectorstore
+        vector = np.array([vectorstore._embed_query(query)], dtype=np.float32)
+        if vectorstore._normalize_L2:
+            faiss.normalize_L2(vector)
+        k = min(k, self.ntotal)
+        index = faiss.downcast_index(vectorstore.index)
+        _, positions = index.search(vector, k, params=self._get_search_parameters(index))
+        positions = positions[0][positions[0] != -1]
+        if len(positions) < k:
+            positions = self._search_exhaustive(index, vector, k)
+        return [
+            vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+            for position in positions.tolist()
+        ]
+
+def build_partitions(vectorstore, field="policy_type"):
+    """
+    Split a vector store into one filtered view per metadata value.
+    
+    Only the metadata of the documents is read; the views search the index
+    of the vector store, see FilteredVectorStore.
+    
+    Args:
+        vectorstore (FAISS): Vector store to split.
+        field (str): Metadata field to partition on.
+    
+    Returns:
+        dict: Mapping of field value to a FilteredVectorStore holding only
+            the documents with that value.
+    """
+    docstore = vectorstore.docstore
+    groups = {}
+    for position, doc_id in vectorstore.index_to_docstore_id.items():
+        if isinstance(docstore, ChunkDocstore):
+            value = docstore.get(doc_id, field)
+        else:
+            value = docstore.search(doc_id).metadata.get(field)
+        groups.setdefault(value, []).append(position)
+    return {
+        value: FilteredVectorStore(vectorstore, np.array(positions, dtype=np.int64))
+        for value, positions in groups.items()
+    }
+
+def get_partition(vectorstore, policy_type):
+    """
+    Get the view of a vector store holding one policy type.
+    
+    Args:
+        vectorstore (FAISS): Vector store to search.
+        policy_type (str): Policy type of the documents.
+    
+    Returns:
+        FilteredVectorStore: View of the partition, or None if no document
+            has the policy type.
+    """
+    partitions = _partitions.get(vectorstore)
+    if partitions is None:
+        with _partitions_lock:
+            partitions = _partitions.get(vectorstore)
+            if partitions is None:
+                partitions = build_partitions(vectorstore)
+                _partitions[vectorstore] = partitions
+    return partitions.get(policy_type)
+
+def clear_result_cache():
+    """
+    Drop all cached retrieval results, e.g. after the index changed.
+    """
+    _result_cache.clear()
+
+def get_cache_stats():
+    """
+    Get the statistics of the query embedding and retrieval result caches.
+    
+    Returns:
+        dict: Statistics of each cache, see LRUCache.stats.
+    """
+    return {
+        "query_embeddings": _query_embedding_cache.stats(),
+        "results": _result_cache.stats(),
+    }
+
+def _document_key(doc):
+    """
+    Identify a chunk across the lexical index and the vector store, which
+    hold separate copies of each Document.
+    """
+    return doc.page_content, json.dumps(doc.metadata, sort_keys=True, default=str)
+
+def hybrid_search(vectorstore, lexical_index, query, k=4):
+    """
+    Retrieve documents with BM25 and vector search fused by reciprocal rank.
+    
+    When the best lexical hit contains every query term and there are at
+    least k lexical hits, the lexical ranking is returned as is and the query
+    is never embedded.
+    
+    Args:
+        vectorstore: Vector store containing document embeddings, or None.
+        lexical_index (BM25Index): Lexical index over the same documents, or
+            None.
+        query (str): Query string.
+        k (int): Number of documents to retrieve.
+    
+    Returns:
+        list: List of relevant Document objects.
+    """
+    hits = lexical_index.search(query, k) if lexical_index is not None else []
+    if vectorstore is None or (len(hits) >= k and lexical_index.covers(query, hits[0])):
+        return [hit.document for hit in hits]
+
+    dense = vectorstore.similarity_search(query, k=k)
+    scores = {}
+    documents = {}
+    for ranking in ([hit.document for hit in hits], dense):
+        for rank, doc in enumerate(ranking):
+            key = _document_key(doc)
+            documents.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+    best = heapq.nlargest(k, scores, key=scores.get)
+    return [documents[key] for key in best]
+
+def _get_generation(obj):
+    generation = _generations.get(obj)
+    if generation is None:
+        generation = _generations.setdefault(obj, next(_generation_counter))
+    return generation
+
+def get_relevant_documents(vectorstore, query, k=4, lexical_index=None, policy_type=None):
     """
     Retrieve the most relevant documents for a query.
     
+    Results are cached per vector store, lexical index, normalized query and
+    k, so repeated questions skip both the query embedding and the search.
+    
     Args:
         vectorstore: Vector store containing document embeddings.
         query (str): Query string.
         k (int): Number of documents to retrieve.
+        lexical_index (BM25Index): Lexical index over the same documents. When
+            given, BM25 and vector results are fused, see hybrid_search.
+        policy_type (str): Policy type the query was classified as. Only the
+            documents of that type are searched, unless there are none or it
+            is None or "general".
     
     Returns:
         list: List of relevant Document objects.
     """
-    return vectorstore.similarity_search(query, k=k)
+    start = time.perf_counter()
+    if policy_type not in (None, "general"):
+        partition = get_partition(vectorstore, policy_type) if vectorstore is not None else None
+        lexical_partition = lexical_index.partition("policy_type", policy_type) if lexical_index is not None else None
+        if partition is not None or lexical_partition is not None:
+            vectorstore, lexical_index = partition, lexical_partition
+
+    key = (
+        _get_generation(vectorstore) if vectorstore is not None else None,
+        _get_generation(lexical_index) if lexical_index is not None else None,
+        normalize_query(query),
+        k,
+    )
+    documents = _result_cache.get(key)
+    if documents is None:
+        if lexical_index is not None:
+            documents = tuple(hybrid_search(vectorstore, lexical_index, query, k))
+        else:
+            documents = tuple(vectorstore.similarity_search(query, k=k))
+        _result_cache.put(key, documents)
+    observe("retrieval", time.perf_counter() - start)
+    return list(documents)
+
+class CachedRetriever(BaseRetriever):
+    """
+    Retriever that serves results through get_relevant_documents and its cache.
+    """
+    vectorstore: Any
+    k: int = 4
+    lexical_index: Any = None
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return get_relevant_documents(self.vectorstore, query, k=self.k, lexical_index=self.lexical_index)
+
+def get_retriever(vectorstore, k=4, lexical_index=None):
+    """
+    Get a cached retriever for a vector store.
+    
+    Args:
+        vectorstore: Vector store containing document embeddings.
+        k (int): Number of documents to retrieve.
+        lexical_index (BM25Index): Optional lexical index for hybrid search.
+    
+    Returns:
+        CachedRetriever: The retriever.
+    """
+    return CachedRetriever(vectorstore=vectorstore, k=k, lexical_index=lexical_index)
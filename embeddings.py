@@ -0,0 +1,169 @@
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from cache import normalize_query
+
+# Multipliers of the polynomial rolling hash and of the sign hash
+_HASH_BASE = np.uint64(1099511628211)
+_SIGN_BASE = np.uint64(2654435761)
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Local embedding model based on hashed character n-grams.
+
+    Every lowercased character n-gram of a text is hashed into one of
+    n_features buckets with a random sign, counts are dampened with log1p
+    and the vectors are L2-normalized, so inner products approximate the
+    cosine similarity of the n-gram profiles. Batches are encoded in a
+    handful of NumPy operations per slice of batch_size texts, so memory
+    stays bounded for whole corpora, and no network access is required.
+    """
+
+    def __init__(self, n_features=1024, ngram_range=(3, 5), batch_size=512):
+        """
+        Args:
+            n_features (int): Dimension of the embeddings.
+            ngram_range (tuple): Minimum and maximum n-gram length in bytes.
+            batch_size (int): Texts hashed at once; the intermediate arrays
+                take about 60 bytes per character of a slice.
+        """
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.batch_size = batch_size
+        self.model = f"hashing-char-{ngram_range[0]}-{ngram_range[1]}-{n_features}"
+
+    def embed_batch(self, texts):
+        """
+        Embed a batch of texts.
+
+        Args:
+            texts (list): Texts to embed.
+
+        Returns:
+            numpy.ndarray: float32 matrix of shape (len(texts), n_features).
+        """
+        vectors = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            self._embed_slice(texts[start:start + self.batch_size], vectors[start:start + self.batch_size])
+        return vectors
+
+    def _embed_slice(self, texts, vectors):
+        """
+        Embed texts into rows of a preallocated matrix.
+        """
+        encoded = [f" {text.lower()} ".encode("utf-8") for text in texts]
+        lengths = np.fromiter((len(data) for data in encoded), dtype=np.int64, count=len(encoded))
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+        owner = np.repeat(np.arange(len(texts)), lengths)
+
+        min_n, max_n = self.ngram_range
+        rows = []
+        buckets = []
+        signs = []
+        hashes = np.zeros(len(data), dtype=np.uint64)
+        for n in range(1, max_n + 1):
+            # hashes[i] covers data[i:i + n]; the tail shrinks by one each round
+            count = len(data) - n + 1
+            if count <= 0:
+                break
+            hashes = hashes[:count] * _HASH_BASE + data[n - 1:]
+            if n < min_n:
+                continue
+            # Drop n-grams spanning two texts
+            valid = owner[:count] == owner[n - 1:]
+            hashed = hashes[valid] ^ np.uint64(n)
+            rows.append(owner[:count][valid])
+            buckets.append(hashed % np.uint64(self.n_features))
+            signs.append(((hashed * _SIGN_BASE) >> np.uint64(63)).astype(np.int8))
+
+        if not rows:
+            # Texts too short for any n-gram, e.g. empty ones, embed to zero
+            vectors[:] = 0
+            return
+        rows = np.concatenate(rows)
+        buckets = np.concatenate(buckets).astype(np.int64)
+        weights = 1.0 - 2.0 * np.concatenate(signs)
+        flat = np.bincount(
+            rows * self.n_features + buckets,
+            weights=weights,
+            minlength=len(texts) * self.n_features
+        )
+        vectors[:] = flat.reshape(len(texts), self.n_features)
+
+        np.copysign(np.log1p(np.abs(vectors)), vectors, out=vectors)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+
+    def embed_documents(self, texts):
+        """
+        Embed a list of documents.
+
+        Args:
+            texts (list): Texts to embed.
+
+        Returns:
+            list: One embedding (list of floats) per text.
+        """
+        return self.embed_batch(list(texts)).tolist()
+
+    def embed_query(self, text):
+        """
+        Embed a query.
+
+        Args:
+            text (str): Query text.
+
+        Returns:
+            list: Embedding of the query.
+        """
+        return self.embed_batch([text])[0].tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wrapper that caches query embeddings of another embedding model.
+
+    Queries are cached under their normalized form, so repeated questions
+    skip the (possibly remote) embedding call. Document embeddings are
+    passed through unchanged.
+    """
+
+    def __init__(self, embeddings, cache):
+        """
+        Args:
+            embeddings (Embeddings): Embedding model to wrap.
+            cache (LRUCache): Cache shared by all wrappers of the process.
+        """
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None)
+        self._key_prefix = f"{type(embeddings).__name__}:{self.model}"
+
+    def embed_documents(self, texts):
+        """
+        Embed a list of documents with the wrapped model.
+
+        Args:
+            texts (list): Texts to embed.
+
+        Returns:
+            list: One embedding per text.
+        """
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        """
+        Embed a query, using the cache when possible.
+
+        Args:
+            text (str): Query text.
+
+        Returns:
+            list: Embedding of the query.
+        """
+        key = (self._key_prefix, normalize_query(text))
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(key, vector)
+        return vector
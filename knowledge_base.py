@@ -0,0 +1,307 @@
+import os
+import pickle
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from chunk_store import ChunkStore
+from data_loader import ensure_document_directory, hash_file, process_files
+from lexical_index import BM25Index
+from metrics import observe
+from rule_engine import build_response_index
+
+# Minimum number of seconds between two scans of the document directory.
+# Keeps the per-request cost of change detection to a dict lookup when
+# many sessions ask for the knowledge base at the same time.
+CHECK_INTERVAL = 2.0
+
+# Directory of the knowledge base snapshots loaded on startup instead of
+# parsing every document again; empty disables snapshots
+SNAPSHOT_DIR = os.environ.get("KB_SNAPSHOT_DIR", ".kb_snapshot")
+
+# Bumped whenever the pickled KnowledgeBase layout, or how its derived
+# indexes such as the rule responses are built, changes
+SNAPSHOT_FORMAT = 3
+
+_lock = threading.Lock()
+_cache = {}
+
+
+@dataclass(frozen=True)
+class PolicyFile:
+    """
+    A loaded policy file.
+
+    Attributes:
+        size (int): File size in bytes at load time.
+        mtime_ns (int): File modification time at load time.
+        sha256 (str): Hex digest of the file content.
+        chunks (ChunkStore): Section chunks parsed from the file, a slice of
+            the knowledge base ChunkStore.
+    """
+    size: int
+    mtime_ns: int
+    sha256: str
+    chunks: ChunkStore
+
+
+@dataclass(frozen=True)
+class KnowledgeBase:
+    """
+    Immutable snapshot of the insurance documents, shared by all sessions.
+
+    Attributes:
+        directory_path (str): Directory the snapshot was loaded from.
+        fingerprint (tuple): Directory fingerprint at load time.
+        version (str): Hex digest of the file names and contents, equal for
+            snapshots of identical documents.
+        files (MappingProxyType): Read-only mapping of file name to
+            PolicyFile.
+        chunks (ChunkStore): Section chunks loaded from the directory, in
+            file name order.
+        policy_info (MappingProxyType): Read-only mapping of policy type to
+            the row numbers of its chunks.
+        responses (MappingProxyType): Read-only mapping of
+            (policy_type, topic) to the precomputed rule-engine response.
+        lexical_index (BM25Index): BM25 inverted index over the chunks.
+    """
+    directory_path: str
+    fingerprint: tuple
+    version: str
+    files: MappingProxyType
+    chunks: ChunkStore
+    policy_info: MappingProxyType
+    responses: MappingProxyType
+    lexical_index: BM25Index
+
+
+def get_directory_fingerprint(directory_path):
+    """
+    Compute a cheap fingerprint of the policy files in a directory.
+
+    Args:
+        directory_path (str): Path to the directory containing PDF files.
+
+    Returns:
+        tuple: Sorted (filename, size, mtime_ns) entries of the PDF files.
+    """
+    if not os.path.isdir(directory_path):
+        return ()
+    entries = []
+    with os.scandir(directory_path) as it:
+        for entry in it:
+            if entry.name.endswith('.pdf') and entry.is_file():
+                stat = entry.stat()
+                entries.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    return tuple(sorted(entries))
+
+
+def build_knowledge_base(directory_path, previous=None):
+    """
+    Load the documents in a directory into a new knowledge base.
+
+    Files whose size, modification time or content hash are unchanged since
+    the previous knowledge base are reused instead of being parsed again.
+
+    Args:
+        directory_path (str): Path to the directory containing PDF files.
+        previous (KnowledgeBase): Knowledge base to reuse files from.
+
+    Returns:
+        KnowledgeBase: The loaded knowledge base.
+    """
+    start = time.perf_counter()
+    ensure_document_directory(directory_path)
+    fingerprint = get_directory_fingerprint(directory_path)
+    previous_files = previous.files if previous is not None else {}
+
+    files = {}
+    changed = {}
+    for filename, size, mtime_ns in fingerprint:
+        old = previous_files.get(filename)
+        if old is not None and (old.size, old.mtime_ns) == (size, mtime_ns):
+            files[filename] = old
+            continue
+
+        file_path = os.path.join(directory_path, filename)
+        sha256 = hash_file(file_path)
+        if old is not None and old.sha256 == sha256:
+            files[filename] = PolicyFile(size, mtime_ns, sha256, old.chunks)
+        else:
+            changed[file_path] = (filename, size, mtime_ns, sha256)
+
+    # Parse the new and edited files concurrently
+    for file_path, documents in process_files(changed):
+        filename, size, mtime_ns, sha256 = changed[file_path]
+        files[filename] = PolicyFile(size, mtime_ns, sha256, ChunkStore.from_documents(documents))
+
+    # Copy the chunks of all files into one buffer and point the files at
+    # their slice of it, so the previous buffer can be freed
+    filenames = sorted(files)
+    chunks = ChunkStore.concat([files[filename].chunks for filename in filenames])
+    row = 0
+    for filename in filenames:
+        old = files[filename]
+        stop = row + len(old.chunks)
+        files[filename] = PolicyFile(old.size, old.mtime_ns, old.sha256, chunks.slice(row, stop))
+        row = stop
+    version = hashlib.sha256(
+        "\n".join(f"{filename}:{files[filename].sha256}" for filename in filenames).encode("utf-8")
+    ).hexdigest()
+
+    policy_info = {}
+    for row in range(len(chunks)):
+        policy_type = chunks.get(row, "policy_type") or "general"
+        policy_info.setdefault(policy_type, []).append(row)
+
+    knowledge_base = KnowledgeBase(
+        directory_path=directory_path,
+        fingerprint=fingerprint,
+        version=version,
+        files=MappingProxyType(files),
+        chunks=chunks,
+        policy_info=MappingProxyType(
+            {policy_type: tuple(rows) for policy_type, rows in policy_info.items()}
+        ),
+        responses=MappingProxyType(build_response_index(chunks)),
+        lexical_index=BM25Index(chunks),
+    )
+    observe("document_load", time.perf_counter() - start)
+    return knowledge_base
+
+
+def get_snapshot_path(directory_path, snapshot_dir=None):
+    """
+    Get the snapshot file of a document directory.
+
+    Args:
+        directory_path (str): Path to the directory containing PDF files.
+        snapshot_dir (str): Snapshot directory, defaults to SNAPSHOT_DIR.
+
+    Returns:
+        str: Path of the snapshot file.
+    """
+    key = hashlib.sha256(os.path.abspath(directory_path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(snapshot_dir or SNAPSHOT_DIR, f"{key}.pickle")
+
+
+def save_snapshot(knowledge_base, path):
+    """
+    Persist a knowledge base, including its derived indexes.
+
+    The file is written next to its target and renamed, so readers never
+    see a partial snapshot.
+
+    Args:
+        knowledge_base (KnowledgeBase): Knowledge base to persist.
+        path (str): Snapshot file.
+    """
+    state = {
+        "format": SNAPSHOT_FORMAT,
+        "directory_path": knowledge_base.directory_path,
+        "fingerprint": knowledge_base.fingerprint,
+        "version": knowledge_base.version,
+        "files": dict(knowledge_base.files),
+        "chunks": knowledge_base.chunks,
+        "policy_info": dict(knowledge_base.policy_info),
+        "responses": dict(knowledge_base.responses),
+        "lexical_index": knowledge_base.lexical_index,
+    }
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        print(f"Error saving knowledge base snapshot {path}: {e}")
+
+
+def load_snapshot(path):
+    """
+    Load a knowledge base persisted by save_snapshot.
+
+    Args:
+        path (str): Snapshot file.
+
+    Returns:
+        KnowledgeBase: The knowledge base, or None if the file is missing or
+            unreadable.
+    """
+    try:
+        # The pickle is written by save_snapshot in this process tree only
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Error loading knowledge base snapshot {path}: {e}")
+        return None
+    if not isinstance(state, dict) or state.pop("format", None) != SNAPSHOT_FORMAT:
+        return None
+
+    return KnowledgeBase(
+        directory_path=state["directory_path"],
+        fingerprint=state["fingerprint"],
+        version=state["version"],
+        files=MappingProxyType(state["files"]),
+        chunks=state["chunks"],
+        policy_info=MappingProxyType(state["policy_info"]),
+        responses=MappingProxyType(state["responses"]),
+        lexical_index=state["lexical_index"],
+    )
+
+
+def get_knowledge_base(directory_path):
+    """
+    Get the process-wide knowledge base for a directory.
+
+    The knowledge base is built once per process and shared read-only by
+    every caller. It is rebuilt only when the files in the directory change,
+    re-parsing just the files that were added or edited.
+
+    On a cold start the knowledge base is loaded from its snapshot in
+    SNAPSHOT_DIR, and only the files changed since the snapshot are parsed.
+    The snapshot is updated after every rebuild.
+
+    Args:
+        directory_path (str): Path to the directory containing PDF files.
+
+    Returns:
+        KnowledgeBase: The current knowledge base.
+    """
+    key = os.path.abspath(directory_path)
+    now = time.monotonic()
+    entry = _cache.get(key)
+    if entry is not None and now - entry[1] < CHECK_INTERVAL:
+        return entry[0]
+
+    with _lock:
+        entry = _cache.get(key)
+        previous = entry[0] if entry is not None else None
+        snapshot_path = get_snapshot_path(directory_path) if SNAPSHOT_DIR else None
+        if previous is None and snapshot_path is not None:
+            previous = load_snapshot(snapshot_path)
+        if previous is not None and previous.fingerprint == get_directory_fingerprint(directory_path):
+            _cache[key] = (previous, now)
+            return previous
+
+        knowledge_base = build_knowledge_base(directory_path, previous)
+        _cache[key] = (knowledge_base, now)
+        if snapshot_path is not None:
+            save_snapshot(knowledge_base, snapshot_path)
+        return knowledge_base
+
+
+def release_knowledge_base(directory_path):
+    """
+    Drop the process-wide knowledge base of a directory.
+
+    The next get_knowledge_base call loads it again, from its snapshot if
+    there is one.
+
+    Args:
+        directory_path (str): Path to the directory containing PDF files.
+    """
+    with _lock:
+        _cache.pop(os.path.abspath(directory_path), None)
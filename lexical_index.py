@@ -0,0 +1,201 @@
+import re
+from typing import NamedTuple
+import numpy as np
+from chunk_store import ChunkStore
+
+# Words, and numbers with their thousands separators ("$1,000" -> "1000")
+_TOKEN_PATTERN = re.compile(r"\d+(?:[.,]\d+)*|[a-z]+")
+
+# Words too common to tell policy sections apart
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it my of on or "
+    "the to what when which will with you your".split()
+)
+
+
+def _normalize_token(token):
+    """
+    Normalize a token so that simple plurals match their singular form.
+
+    Args:
+        token (str): Lowercased token.
+
+    Returns:
+        str: Normalized token.
+    """
+    if token[0].isdigit():
+        return token.replace(",", "")
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """
+    Split a text into normalized index terms.
+
+    Args:
+        text (str): Text to tokenize.
+
+    Returns:
+        list: Terms, stopwords excluded, in text order.
+    """
+    return [
+        _normalize_token(token)
+        for token in _TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+class LexicalHit(NamedTuple):
+    """
+    A document matched by a lexical search.
+    """
+    document: object
+    score: float
+    matched_terms: int
+    """Number of distinct query terms found in the document."""
+
+
+class BM25Index:
+    """
+    Immutable inverted index over a ChunkStore with BM25 scoring.
+
+    Postings are stored in compressed sparse row form: the postings of term t
+    are the slice offsets[t]:offsets[t + 1] of two flat arrays holding the
+    int32 document numbers and the precomputed float32 BM25 term weights.
+    A query only touches the postings of its own terms, and the top k
+    documents are selected with a partial sort of the matching documents.
+    Only the hits are materialized as Document objects.
+    """
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        """
+        Args:
+            chunks (ChunkStore): Chunks to index. A list of Document objects
+                is converted to a ChunkStore.
+            k1 (float): BM25 term frequency saturation.
+            b (float): BM25 document length normalization.
+        """
+        self.chunks = chunks if isinstance(chunks, ChunkStore) else ChunkStore.from_documents(chunks)
+        self.vocabulary = {}
+        self.k1 = k1
+        self.b = b
+        self._partitions = {}
+
+        term_ids = []
+        doc_ids = []
+        counts = []
+        lengths = np.zeros(len(self.chunks), dtype=np.float32)
+        for doc_id in range(len(self.chunks)):
+            terms = tokenize(self.chunks.text(doc_id))
+            lengths[doc_id] = len(terms)
+            frequencies = {}
+            for term in terms:
+                frequencies[term] = frequencies.get(term, 0) + 1
+            for term, count in frequencies.items():
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                doc_ids.append(doc_id)
+                counts.append(count)
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        order = np.argsort(term_ids, kind="stable")
+        self.doc_ids = np.asarray(doc_ids, dtype=np.int32)[order]
+        self.offsets = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(self.vocabulary)), out=self.offsets[1:])
+
+        counts = np.asarray(counts, dtype=np.float32)[order]
+        document_frequency = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log1p(
+            (len(self.chunks) - document_frequency + 0.5) / (document_frequency + 0.5)
+        ).astype(np.float32)
+        average_length = lengths.mean() if len(self.chunks) else 0.0
+        norms = k1 * (1 - b + b * lengths[self.doc_ids] / max(average_length, 1.0))
+        self.weights = (counts * (k1 + 1) / (counts + norms)).astype(np.float32)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    @property
+    def nbytes(self):
+        """
+        int: Memory held by the postings, the chunks and vocabulary excluded.
+        """
+        return self.doc_ids.nbytes + self.offsets.nbytes + self.idf.nbytes + self.weights.nbytes
+
+    def __getstate__(self):
+        # Partitions are rebuilt on demand rather than pickled
+        state = dict(self.__dict__)
+        state["_partitions"] = {}
+        return state
+
+    def partition(self, field, value):
+        """
+        Get the index of the documents whose metadata field has a value.
+
+        Partitions are built on first use and kept for the lifetime of the
+        index, so a filtered search costs no more than a search of an index
+        holding only the partition.
+
+        Args:
+            field (str): Metadata field of the ChunkStore, e.g. "policy_type".
+            value (str): Value of the field.
+
+        Returns:
+            BM25Index: Index of the partition, or None if no document matches.
+        """
+        key = (field, value)
+        if key not in self._partitions:
+            rows = self.chunks.rows(field, value)
+            self._partitions[key] = BM25Index(self.chunks.take(rows), self.k1, self.b) if len(rows) else None
+        return self._partitions[key]
+
+    def search(self, query, k=4):
+        """
+        Find the documents with the highest BM25 score for a query.
+
+        Args:
+            query (str): Query string.
+            k (int): Maximum number of documents to return.
+
+        Returns:
+            list: LexicalHit entries, best first. Documents sharing no term
+                with the query are never returned.
+        """
+        term_ids = {self.vocabulary.get(term) for term in tokenize(query)}
+        term_ids.discard(None)
+        if not term_ids or k <= 0:
+            return []
+
+        scores = np.zeros(len(self.chunks), dtype=np.float32)
+        matched = np.zeros(len(self.chunks), dtype=np.int16)
+        for term_id in term_ids:
+            start, stop = self.offsets[term_id], self.offsets[term_id + 1]
+            postings = self.doc_ids[start:stop]
+            # Each document appears at most once in the postings of a term
+            scores[postings] += self.idf[term_id] * self.weights[start:stop]
+            matched[postings] += 1
+
+        candidates = np.flatnonzero(matched)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [
+            LexicalHit(self.chunks.document(doc_id), float(scores[doc_id]), int(matched[doc_id]))
+            for doc_id in candidates
+        ]
+
+    def covers(self, query, hit):
+        """
+        Check whether a hit contains every term of a query.
+
+        Args:
+            query (str): Query string.
+            hit (LexicalHit): Hit returned by search for the query.
+
+        Returns:
+            bool: True if every distinct query term occurs in the hit.
+        """
+        return hit.matched_terms == len(set(tokenize(query)))
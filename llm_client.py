@@ -0,0 +1,314 @@
+import json
+import time
+import queue
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+import openai
+from metrics import observe
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth another attempt: timeouts, conflicts, rate limits and
+# transient server errors
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+def is_retryable(error):
+    """
+    Check whether a failed LLM request may succeed when sent again.
+
+    Args:
+        error (Exception): Error raised by the language model.
+
+    Returns:
+        bool: True for rate limits, transient server errors, timeouts and
+            connection errors.
+    """
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES
+    return isinstance(error, (openai.APIConnectionError, ConnectionError, TimeoutError))
+
+
+def get_retry_after(error):
+    """
+    Get the delay requested by a rate-limited server.
+
+    Args:
+        error (Exception): Error raised by the language model.
+
+    Returns:
+        float: Seconds from the Retry-After header, or None if there is none.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def get_prompt_key(messages):
+    """
+    Identify a prompt for request coalescing.
+
+    Args:
+        messages (list): Chat messages, context and question included.
+
+    Returns:
+        str: Hex digest of the message types and contents.
+    """
+    payload = json.dumps([(message.type, message.content) for message in messages])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    """
+    One upstream generation and the chunks it produced so far, shared by
+    every caller asking for the same prompt.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        # Set and replaced whenever a chunk arrives or the flight ends
+        self.changed = asyncio.Event()
+
+    def notify(self):
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+class PooledLLMClient:
+    """
+    Process-wide asynchronous client in front of a chat model.
+
+    Requests run on one background event loop shared by all threads, so the
+    model's HTTP connection pool is reused across sessions. At most
+    max_concurrency requests are sent upstream at a time, and rate-limited
+    or failed requests are retried with exponential backoff and full jitter,
+    as long as nothing was streamed yet.
+
+    Identical prompts asked while one is being generated share its upstream
+    call: later callers first receive the chunks streamed so far, then the
+    rest as they arrive.
+
+    The client is single-use: close() also closes the HTTP client of the
+    model, so a closed client and its model are replaced rather than reused.
+    """
+
+    def __init__(self, llm, max_concurrency=8, max_retries=4, backoff=0.5, max_backoff=20.0):
+        """
+        Args:
+            llm: Chat model supporting .astream().
+            max_concurrency (int): Maximum number of upstream requests in
+                flight at once.
+            max_retries (int): Attempts after the first one for retryable
+                errors.
+            backoff (float): Backoff ceiling of the first retry in seconds,
+                doubled on every retry.
+            max_backoff (float): Maximum backoff ceiling in seconds.
+        """
+        self.llm = llm
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.requests = 0
+        self.upstream_calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failures = 0
+        self._flights = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        self._closed = False
+
+    def _get_loop(self):
+        """
+        Get the event loop of the client, starting its thread on first use.
+        """
+        if self._loop is None:
+            with self._loop_lock:
+                if self._closed:
+                    raise RuntimeError("PooledLLMClient is closed")
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="llm-client", daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    def get_backoff(self, attempt, error=None):
+        """
+        Get the delay before a retry.
+
+        Args:
+            attempt (int): Number of the failed attempt, from 0.
+            error (Exception): Error of the failed attempt, if any.
+
+        Returns:
+            float: A random delay up to the exponential backoff ceiling, and
+                at least the delay requested by the server.
+        """
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        retry_after = get_retry_after(error) if error is not None else None
+        return max(delay, retry_after or 0.0)
+
+    async def _generate(self, flight, messages):
+        """
+        Stream the answer to a prompt into its flight, retrying as needed.
+        """
+        try:
+            attempt = 0
+            while True:
+                try:
+                    queued = time.perf_counter()
+                    async with self._semaphore:
+                        observe("llm_queue", time.perf_counter() - queued)
+                        self.upstream_calls += 1
+                        async for chunk in self.llm.astream(messages):
+                            flight.chunks.append(chunk)
+                            flight.notify()
+                    return
+                except Exception as e:
+                    # A partly streamed answer cannot be taken back
+                    if flight.chunks or attempt >= self.max_retries or not is_retryable(e):
+                        raise
+                    delay = self.get_backoff(attempt, e)
+                    logger.warning("LLM request failed (%s), retrying in %.2fs", e, delay)
+                    self.retries += 1
+                    attempt += 1
+                    await asyncio.sleep(delay)
+        except Exception as e:
+            self.failures += 1
+            flight.error = e
+
+    def _land(self, key, flight, task):
+        """
+        Retire a flight once its task ended, including when it was cancelled
+        before it even started, so no later caller subscribes to it.
+        """
+        if task.cancelled() and flight.error is None:
+            flight.error = asyncio.CancelledError()
+        flight.done = True
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        flight.notify()
+
+    async def _subscribe(self, messages, output):
+        """
+        Forward the chunks of the flight of a prompt to a queue, starting the
+        flight if none is running.
+        """
+        self.requests += 1
+        key = get_prompt_key(messages)
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.create_task(self._generate(flight, messages))
+            flight.task.add_done_callback(lambda task: self._land(key, flight, task))
+        else:
+            self.coalesced += 1
+
+        flight.subscribers += 1
+        sent = 0
+        try:
+            while True:
+                changed = flight.changed
+                chunks = flight.chunks[sent:]
+                for chunk in chunks:
+                    output.put(("chunk", chunk))
+                sent += len(chunks)
+                if flight.done:
+                    break
+                await changed.wait()
+            if flight.error is not None:
+                output.put(("error", flight.error))
+            else:
+                output.put(("done", None))
+        finally:
+            flight.subscribers -= 1
+            # Nobody is listening anymore, stop paying for the generation
+            if not flight.subscribers and not flight.done:
+                flight.task.cancel()
+
+    def stream(self, messages):
+        """
+        Stream the answer to a prompt.
+
+        Can be called from any thread except the client's own event loop.
+
+        Args:
+            messages (list): Chat messages.
+
+        Yields:
+            AIMessageChunk: Chunks of the answer.
+        """
+        output = queue.Queue()
+        loop = self._get_loop()
+        future = asyncio.run_coroutine_threadsafe(self._subscribe(messages, output), loop)
+        try:
+            while True:
+                kind, value = output.get()
+                if kind == "chunk":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    return
+        finally:
+            future.cancel()
+
+    def stats(self):
+        """
+        Get the client statistics.
+
+        Returns:
+            dict: Requests received, upstream calls, requests coalesced into
+                a running call, retries, failed calls and calls in flight.
+        """
+        return {
+            "max_concurrency": self.max_concurrency,
+            "requests": self.requests,
+            "upstream_calls": self.upstream_calls,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "failures": self.failures,
+            "in_flight": len(self._flights),
+        }
+
+    async def _shutdown(self):
+        """
+        Cancel the running generations and close the model's connections.
+        """
+        tasks = [flight.task for flight in self._flights.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Let the streams of the model close their responses first
+        await self._loop.shutdown_asyncgens()
+        http_client = getattr(self.llm, "http_async_client", None)
+        if http_client is not None and hasattr(http_client, "aclose"):
+            await http_client.aclose()
+
+    def close(self):
+        """
+        Stop the event loop of the client and close the HTTP client of the
+        model, which is bound to that loop.
+
+        Streams still running fail with asyncio.CancelledError, and later
+        calls to stream raise RuntimeError.
+        """
+        with self._loop_lock:
+            self._closed = True
+            if self._loop is not None:
+                asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result()
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
@@ -1,47 +1,161 @@
 import os
+import time
+import logging
+import threading
+import httpx
 from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
-from langchain.chat_models import ChatOpenAI
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_openai import ChatOpenAI
+from answer_cache import is_self_contained
+from database import get_embedding_model_id, get_relevant_documents, get_retriever
+from llm_client import PooledLLMClient
+from memory import BoundedSummaryMemory
+from metrics import observe, trace, trace_iter
+from utils import pack_context
 
-def get_openai_llm(temperature=0):
+logger = logging.getLogger(__name__)
+
+# LLM backend used when none is passed explicitly ("openai" or "fake")
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "openai")
+
+# Base URL of an OpenAI-compatible API, e.g. a local mock server; empty for
+# the OpenAI API
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "")
+
+# Maximum number of LLM requests sent upstream at once by this process
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+
+# Retries of rate-limited or failed LLM requests, with jittered backoff
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "4"))
+
+_llm_lock = threading.Lock()
+_llms = {}
+_llm_clients = {}
+
+def get_openai_llm(temperature=0, base_url=None):
     """
     Get the OpenAI language model.
     
+    The model keeps a pool of up to LLM_MAX_CONCURRENCY HTTP connections and
+    does not retry on its own; PooledLLMClient does.
+    
     Args:
         temperature (float): Temperature parameter for controlling randomness.
+        base_url (str): Base URL of an OpenAI-compatible API, defaults to
+            LLM_BASE_URL.
     
     Returns:
         ChatOpenAI: The language model.
     """
     api_key = os.environ.get("OPENAI_API_KEY")
+    limits = httpx.Limits(max_connections=LLM_MAX_CONCURRENCY, max_keepalive_connections=LLM_MAX_CONCURRENCY)
     # The newest OpenAI model is "gpt-4o" which was released May 13, 2024.
     # do not change this unless explicitly requested by the user
     return ChatOpenAI(
         openai_api_key=api_key,
         model="gpt-4o",
-        temperature=temperature
+        temperature=temperature,
+        base_url=base_url or LLM_BASE_URL or None,
+        max_retries=0,
+        http_async_client=httpx.AsyncClient(limits=limits)
     )
 
-def get_qa_chain(vectorstore, llm):
+def get_fake_llm(responses=None, sleep=0.01):
+    """
+    Get a local fake language model that streams canned responses.
+    
+    Used for tests and offline runs, it needs no network access.
+    
+    Args:
+        responses (list): Responses to cycle through.
+        sleep (float): Delay before each streamed character, in seconds.
+    
+    Returns:
+        FakeListChatModel: The fake language model.
+    """
+    return FakeListChatModel(
+        responses=responses or [
+            "This is a local test model. Please refer to the policy details above, "
+            "or contact a human agent for personalized assistance."
+        ],
+        sleep=sleep
+    )
+
+def get_llm(backend=None):
+    """
+    Get the process-wide language model for the configured backend.
+    
+    Args:
+        backend (str): "openai" or "fake". Defaults to the LLM_BACKEND
+            environment variable, or "openai" when it is not set.
+    
+    Returns:
+        BaseChatModel: The language model, created on first use.
+    """
+    backend = backend or LLM_BACKEND
+    llm = _llms.get(backend)
+    if llm is None:
+        with _llm_lock:
+            llm = _llms.get(backend)
+            if llm is None:
+                if backend == "fake":
+                    llm = get_fake_llm()
+                elif backend == "openai":
+                    llm = get_openai_llm()
+                else:
+                    raise ValueError(f"Unknown LLM backend: {backend}")
+                _llms[backend] = llm
+    return llm
+
+def get_llm_client(backend=None):
+    """
+    Get the process-wide pooled client of the language model.
+    
+    Args:
+        backend (str): "openai" or "fake", defaults to LLM_BACKEND.
+    
+    Returns:
+        PooledLLMClient: Client shared by all sessions of the process.
+    """
+    backend = backend or LLM_BACKEND
+    client = _llm_clients.get(backend)
+    if client is None:
+        llm = get_llm(backend)
+        with _llm_lock:
+            client = _llm_clients.get(backend)
+            if client is None:
+                client = PooledLLMClient(llm, LLM_MAX_CONCURRENCY, LLM_MAX_RETRIES)
+                _llm_clients[backend] = client
+    return client
+
+def get_llm_client_stats():
+    """
+    Get the statistics of the pooled LLM clients created so far.
+    
+    Returns:
+        dict: Mapping of backend to PooledLLMClient.stats().
+    """
+    return {backend: client.stats() for backend, client in list(_llm_clients.items())}
+
+def get_qa_chain(vectorstore, llm, memory=None, lexical_index=None):
     """
     Create a conversational QA chain using the vector store and language model.
     
     Args:
         vectorstore: Vector store for retrieving relevant documents.
         llm: Language model for generating responses.
+        memory (BoundedSummaryMemory): Conversation memory, a new token-bounded
+            memory by default.
+        lexical_index (BM25Index): Optional lexical index for hybrid retrieval.
     
     Returns:
         ConversationalRetrievalChain: The QA chain.
     """
-    memory = ConversationBufferMemory(
-        memory_key="chat_history",
-        return_messages=True
-    )
+    if memory is None:
+        memory = BoundedSummaryMemory()
     
-    retriever = vectorstore.as_retriever(
-        search_type="similarity",
-        search_kwargs={"k": 4}
-    )
+    retriever = get_retriever(vectorstore, k=4, lexical_index=lexical_index)
     
     chain = ConversationalRetrievalChain.from_llm(
         llm=llm,
@@ -76,3 +190,120 @@ def get_system_prompt():
     Be professional, empathetic, and focused on helping the customer understand their 
     insurance options.
     """
+
+def build_messages(question, docs, memory=None):
+    """
+    Build the chat messages for a question and its retrieved documents.
+    
+    The documents are packed into the context with pack_context, and the
+    tokens saved by merging overlaps, dropping duplicates and enforcing the
+    budget are logged and stored in memory.last_context_saved_tokens.
+    
+    Args:
+        question (str): User question.
+        docs (list): Retrieved Document objects.
+        memory (BoundedSummaryMemory): Conversation memory, if any.
+    
+    Returns:
+        list: Messages to send to the language model.
+    """
+    with trace("prompt"):
+        context = pack_context(docs, token_counter=memory.token_counter if memory is not None else None)
+        logger.info(
+            "Context tokens: %d of %d (saved %d: %d merged, %d duplicates, %d over budget)",
+            context.tokens, context.raw_tokens, context.saved_tokens,
+            context.merged, context.duplicates, context.over_budget
+        )
+        messages = [
+            SystemMessage(content=get_system_prompt() + "\n\nContext:\n" + context.text)
+        ]
+        if memory is not None:
+            memory.last_context_saved_tokens = context.saved_tokens
+            messages.extend(memory.get_messages())
+        messages.append(HumanMessage(content=question))
+    return messages
+
+def get_llm_id(llm):
+    """
+    Get a stable identifier for a language model.
+    
+    Args:
+        llm: Language model.
+    
+    Returns:
+        str: Identifier made of the class name and the model name, if any.
+    """
+    if isinstance(llm, PooledLLMClient):
+        llm = llm.llm
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None)
+    return f"{type(llm).__name__}:{model}"
+
+def stream_answer(llm, vectorstore, question, memory=None, lexical_index=None, policy_type=None,
+                  answer_cache=None, cache_scope=""):
+    """
+    Answer a question with retrieval and stream the generated tokens.
+    
+    The time to first token, the total generation time and the prompt size
+    are logged. The prompt size is also stored in memory.last_prompt_tokens,
+    and the completed turn is added to the memory.
+    
+    With an answer cache, a self-contained question similar enough to an
+    earlier one is answered from the cache without calling the LLM. Only
+    answers generated without conversation history are cached.
+    
+    Args:
+        llm: Language model or PooledLLMClient supporting .stream().
+        vectorstore: Vector store for retrieving relevant documents.
+        question (str): User question.
+        memory (BoundedSummaryMemory): Conversation memory, if any.
+        lexical_index (BM25Index): Optional lexical index for hybrid retrieval.
+        policy_type (str): Policy type of the question, restricts retrieval
+            to the documents of that type.
+        answer_cache (SemanticAnswerCache): Cache of earlier answers, if any.
+        cache_scope (str): Version of the documents the answer is based on,
+            e.g. KnowledgeBase.version. The models are added to the scope.
+    
+    Yields:
+        str: Generated text chunks as soon as they are available.
+    """
+    start = time.perf_counter()
+    embedding = None
+    if answer_cache is not None and vectorstore is not None and is_self_contained(question):
+        cache_scope = f"{cache_scope}|{get_embedding_model_id(vectorstore.embedding_function)}|{get_llm_id(llm)}"
+        with trace("answer_cache"):
+            embedding = vectorstore.embedding_function.embed_query(question)
+            answer = answer_cache.lookup(cache_scope, embedding)
+        if answer is not None:
+            logger.info("Answer served from the cache in %.3fs", time.perf_counter() - start)
+            if memory is not None:
+                memory.add_turn(question, answer)
+            yield answer
+            return
+
+    docs = get_relevant_documents(vectorstore, question, lexical_index=lexical_index, policy_type=policy_type)
+    messages = build_messages(question, docs, memory)
+    has_history = len(messages) > 2
+
+    if memory is not None:
+        memory.last_prompt_tokens = sum(memory.token_counter(message.content) for message in messages)
+        logger.info("Prompt tokens: %d (memory: %d)", memory.last_prompt_tokens, memory.token_count())
+
+    chunks = []
+    first_token_at = None
+    for chunk in trace_iter(llm.stream(messages), "llm"):
+        if not chunk.content:
+            continue
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+            observe("time_to_first_token", first_token_at - start)
+            logger.info("Time to first token: %.3fs", first_token_at - start)
+        chunks.append(chunk.content)
+        yield chunk.content
+    latency = time.perf_counter() - start
+    logger.info("Answer streamed in %.3fs", latency)
+
+    answer = "".join(chunks)
+    if embedding is not None and not has_history and answer:
+        answer_cache.store(cache_scope, question, embedding, answer, latency)
+    if memory is not None:
+        memory.add_turn(question, answer)
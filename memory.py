@@ -0,0 +1,161 @@
+from typing import Any, Callable, Optional
+from langchain_core.memory import BaseMemory
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+
+def approximate_token_count(text):
+    """
+    Estimate the number of tokens of a text without a tokenizer.
+
+    Args:
+        text (str): Text to measure.
+
+    Returns:
+        int: Estimated token count (about four characters per token).
+    """
+    return (len(text) + 3) // 4
+
+
+def _truncate(text, max_tokens, token_counter):
+    """
+    Shorten a text until it fits a token budget.
+
+    Args:
+        text (str): Text to shorten.
+        max_tokens (int): Token budget.
+        token_counter (callable): Function returning the token count of a text.
+
+    Returns:
+        str: The text, cut at a word boundary when it was too long.
+    """
+    if token_counter(text) <= max_tokens:
+        return text
+    # Start from the character estimate and shrink until the budget is met
+    cut = max_tokens * 4
+    while cut > 0 and token_counter(text[:cut] + "...") > max_tokens:
+        cut = cut * 3 // 4
+    return text[:cut].rsplit(" ", 1)[0] + "..."
+
+
+def summarize_turn(question, answer):
+    """
+    Compact a conversation turn into a one-line extractive summary.
+
+    Args:
+        question (str): User message.
+        answer (str): Assistant response.
+
+    Returns:
+        str: Summary line made of the question and the first sentence of the
+            answer.
+    """
+    first_sentence = " ".join(answer.split()).split(". ")[0].rstrip(".")
+    return f"User asked: {' '.join(question.split())} Assistant: {first_sentence}."
+
+
+class BoundedSummaryMemory(BaseMemory):
+    """
+    Conversation memory with a fixed token budget.
+
+    The most recent turns are kept verbatim in a sliding window. Turns that
+    fall out of the window are compacted into a rolling summary whose oldest
+    lines are dropped once it exceeds its own budget, so the memory never
+    holds more than max_token_limit + summary_token_limit tokens however long
+    the conversation gets.
+    """
+
+    memory_key: str = "chat_history"
+    input_key: str = "question"
+    output_key: str = "answer"
+    max_turns: int = 5
+    """Maximum number of verbatim turns in the window."""
+    max_token_limit: int = 1000
+    """Token budget of the verbatim window."""
+    summary_token_limit: int = 300
+    """Token budget of the rolling summary."""
+    token_counter: Callable[[str], int] = approximate_token_count
+    summarizer: Callable[[str, str], str] = summarize_turn
+    """Function compacting a (question, answer) turn into a summary line."""
+    turns: list = []
+    """Verbatim (question, answer, tokens) turns, oldest first."""
+    summary_lines: list = []
+    """Summary lines with their token counts, oldest first."""
+    last_prompt_tokens: Optional[int] = None
+    """Token count of the last prompt built with this memory, if known."""
+    last_context_saved_tokens: Optional[int] = None
+    """Context tokens saved by pack_context in the last prompt, if known."""
+
+    @property
+    def memory_variables(self):
+        return [self.memory_key]
+
+    @property
+    def summary(self):
+        """
+        str: Rolling summary of the turns that left the window.
+        """
+        return " ".join(line for line, _ in self.summary_lines)
+
+    def token_count(self):
+        """
+        Get the number of tokens the memory adds to each prompt.
+
+        Returns:
+            int: Token count of the summary and the verbatim window.
+        """
+        return sum(tokens for _, tokens in self.summary_lines) + sum(tokens for _, _, tokens in self.turns)
+
+    def get_messages(self):
+        """
+        Get the memory as chat messages.
+
+        Returns:
+            list: A system message with the summary, if any, followed by the
+                verbatim turns as human/AI message pairs.
+        """
+        messages = []
+        if self.summary_lines:
+            messages.append(SystemMessage(content=f"Summary of the earlier conversation: {self.summary}"))
+        for question, answer, _ in self.turns:
+            messages.append(HumanMessage(content=question))
+            messages.append(AIMessage(content=answer))
+        return messages
+
+    def add_turn(self, question, answer):
+        """
+        Record a conversation turn and compact the memory to its budget.
+
+        Args:
+            question (str): User message.
+            answer (str): Assistant response.
+        """
+        # A single turn may not exceed the window budget on its own
+        half = self.max_token_limit // 2
+        question = _truncate(question, half, self.token_counter)
+        answer = _truncate(answer, half, self.token_counter)
+        tokens = self.token_counter(question) + self.token_counter(answer)
+        self.turns.append((question, answer, tokens))
+
+        window_tokens = sum(tokens for _, _, tokens in self.turns)
+        while len(self.turns) > self.max_turns or (len(self.turns) > 1 and window_tokens > self.max_token_limit):
+            old_question, old_answer, old_tokens = self.turns.pop(0)
+            window_tokens -= old_tokens
+            line = _truncate(self.summarizer(old_question, old_answer), self.summary_token_limit, self.token_counter)
+            self.summary_lines.append((line, self.token_counter(line)))
+
+        summary_tokens = sum(tokens for _, tokens in self.summary_lines)
+        while summary_tokens > self.summary_token_limit:
+            _, dropped_tokens = self.summary_lines.pop(0)
+            summary_tokens -= dropped_tokens
+
+    def load_memory_variables(self, inputs: dict[str, Any]) -> dict[str, Any]:
+        return {self.memory_key: self.get_messages()}
+
+    def save_context(self, inputs: dict[str, Any], outputs: dict[str, str]) -> None:
+        self.add_turn(inputs[self.input_key], outputs[self.output_key])
+
+    def clear(self) -> None:
+        self.turns = []
+        self.summary_lines = []
+        self.last_prompt_tokens = None
+        self.last_context_saved_tokens = None
@@ -0,0 +1,309 @@
+"""
+Low-overhead per-stage latency histograms and on-demand profiling.
+
+Stages record their duration with observe(), trace() or trace_iter(). The
+histograms can be exported in the Prometheus text format or appended to a
+JSONL log. request_profile() arms cProfile for the next slow call wrapped in
+profiled().
+"""
+import io
+import os
+import json
+import time
+import pstats
+import cProfile
+import threading
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+# Set METRICS_ENABLED=0 to turn all recording into a no-op
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+
+# Histogram bucket upper bounds in seconds, from 1 microsecond to 1 minute
+BUCKETS = tuple(mantissa * 10.0 ** exponent for exponent in range(-6, 2) for mantissa in (1, 2.5, 5))
+
+# Number of captured profiles kept in memory
+MAX_PROFILES = 10
+
+
+class Histogram:
+    """
+    Thread-safe latency histogram with fixed buckets.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        """
+        Args:
+            buckets (tuple): Sorted bucket upper bounds in seconds. Larger
+                values fall into an implicit +Inf bucket.
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """
+        Record one duration.
+
+        Args:
+            seconds (float): Duration in seconds.
+        """
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def quantile(self, q):
+        """
+        Estimate a quantile from the buckets.
+
+        Args:
+            q (float): Quantile between 0 and 1.
+
+        Returns:
+            float: Upper bound of the bucket holding the quantile, or None if
+                nothing was recorded. Values beyond the last bucket are
+                reported as the last bucket bound.
+        """
+        with self._lock:
+            counts, count = list(self.counts), self.count
+        if not count:
+            return None
+        target = q * count
+        seen = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            seen += bucket_count
+            if seen >= target:
+                return bound
+        return self.buckets[-1]
+
+    def summary(self):
+        """
+        Get the count, sum, mean and estimated percentiles.
+
+        Returns:
+            dict: Summary of the recorded durations, in seconds.
+        """
+        with self._lock:
+            count, total = self.count, self.sum
+        return {
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+        }
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def get_histogram(stage):
+    """
+    Get the histogram of a stage, creating it on first use.
+
+    Args:
+        stage (str): Stage name.
+
+    Returns:
+        Histogram: The histogram.
+    """
+    histogram = _histograms.get(stage)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(stage, Histogram())
+    return histogram
+
+
+def observe(stage, seconds):
+    """
+    Record the duration of a stage.
+
+    Args:
+        stage (str): Stage name, e.g. "retrieval".
+        seconds (float): Duration in seconds.
+    """
+    if METRICS_ENABLED:
+        (_histograms.get(stage) or get_histogram(stage)).observe(seconds)
+
+
+@contextmanager
+def trace(stage):
+    """
+    Time the enclosed block as a stage.
+
+    Args:
+        stage (str): Stage name.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start)
+
+
+def trace_iter(iterable, stage, consumer_stage=None):
+    """
+    Yield from an iterable, timing the producer and the consumer separately.
+
+    Args:
+        iterable (iterable): Items to pass through, e.g. streamed chunks.
+        stage (str): Stage recording the time spent producing the items.
+        consumer_stage (str): Stage recording the time the consumer spent
+            between items, e.g. rendering them, if any.
+
+    Yields:
+        The items of the iterable.
+    """
+    produce = consume = 0.0
+    iterator = iter(iterable)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                produce += time.perf_counter() - start
+                break
+            resumed = time.perf_counter()
+            produce += resumed - start
+            yield item
+            consume += time.perf_counter() - resumed
+    finally:
+        observe(stage, produce)
+        if consumer_stage is not None:
+            observe(consumer_stage, consume)
+
+
+def snapshot():
+    """
+    Get a summary of every stage.
+
+    Returns:
+        dict: Mapping of stage name to its Histogram.summary().
+    """
+    return {stage: histogram.summary() for stage, histogram in sorted(_histograms.items())}
+
+
+def export_prometheus(prefix="insurance_chatbot"):
+    """
+    Render the histograms in the Prometheus text exposition format.
+
+    Args:
+        prefix (str): Metric name prefix.
+
+    Returns:
+        str: One "<prefix>_stage_seconds" histogram labelled by stage.
+    """
+    name = f"{prefix}_stage_seconds"
+    lines = [f"# HELP {name} Duration of each chat pipeline stage.", f"# TYPE {name} histogram"]
+    for stage, histogram in sorted(_histograms.items()):
+        with histogram._lock:
+            counts, count, total = list(histogram.counts), histogram.count, histogram.sum
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+        lines.append(f'{name}_sum{{stage="{stage}"}} {total}')
+        lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+def append_jsonl(path):
+    """
+    Append a timestamped snapshot of every stage to a JSONL file.
+
+    Args:
+        path (str): File to append to.
+    """
+    record = {"timestamp": time.time(), "stages": snapshot()}
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def reset():
+    """
+    Drop all recorded durations.
+    """
+    with _histograms_lock:
+        _histograms.clear()
+
+
+_profile_lock = threading.Lock()
+# active is set while a call is being profiled, the lock only guards the state
+_profile_state = {"remaining": 0, "min_seconds": 0.0, "active": False}
+_profiles = deque(maxlen=MAX_PROFILES)
+
+
+def request_profile(count=1, min_seconds=0.0):
+    """
+    Arm the profiler for the next calls wrapped in profiled().
+
+    Args:
+        count (int): Number of profiles to capture.
+        min_seconds (float): Only keep profiles of calls at least this slow.
+    """
+    with _profile_lock:
+        _profile_state["remaining"] = count
+        _profile_state["min_seconds"] = min_seconds
+
+
+def profiled(function, *args, **kwargs):
+    """
+    Call a function, under cProfile if a profile was requested.
+
+    Only one call is profiled at a time; the others run unprofiled, without
+    waiting for it.
+
+    Args:
+        function (callable): Function to call.
+        *args: Positional arguments of the function.
+        **kwargs: Keyword arguments of the function.
+
+    Returns:
+        The result of the function.
+    """
+    if not _profile_state["remaining"]:
+        return function(*args, **kwargs)
+    with _profile_lock:
+        claimed = _profile_state["remaining"] and not _profile_state["active"]
+        if claimed:
+            _profile_state["active"] = True
+    if not claimed:
+        return function(*args, **kwargs)
+
+    profile = cProfile.Profile()
+    start = time.perf_counter()
+    profile.enable()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        profile.disable()
+        elapsed = time.perf_counter() - start
+        with _profile_lock:
+            _profile_state["active"] = False
+            keep = _profile_state["remaining"] and elapsed >= _profile_state["min_seconds"]
+            if keep:
+                _profile_state["remaining"] -= 1
+        if keep:
+            output = io.StringIO()
+            pstats.Stats(profile, stream=output).sort_stats("cumulative").print_stats(30)
+            _profiles.append({"timestamp": time.time(), "seconds": elapsed, "stats": output.getvalue()})
+
+
+def get_profiles():
+    """
+    Get the captured profiles, oldest first.
+
+    Returns:
+        list: Dicts with the timestamp, duration and pstats report of each
+            profiled call.
+    """
+    return list(_profiles)
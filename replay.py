@@ -0,0 +1,236 @@
+"""
+Replay logged questions against the policy documents in bulk.
+
+Reads a JSONL file of queries, answers them with the rule engine in batches
+spread over a process pool and writes one JSON result per line, in input
+order, as soon as each batch is done. With --retrieve, the top documents of
+every query are also found by embedding and searching a whole batch at once.
+
+Input lines are JSON objects with a "query" (or "message") field and an
+optional "id", or bare JSON strings.
+
+Usage:
+    python replay.py queries.jsonl [--output results.jsonl] [--data-dir insurance_data]
+        [--batch-size 1000] [--workers N] [--retrieve K]
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from cache import normalize_query
+from knowledge_base import get_knowledge_base
+from rule_engine import match_rules
+
+# State of a worker process, set up once by _init_worker
+_worker = {}
+
+
+def read_queries(lines, first_line=1):
+    """
+    Parse JSONL query lines, skipping blank and malformed ones.
+
+    Args:
+        lines (iterable): Lines of the input file.
+        first_line (int): Line number of the first line, for error messages.
+
+    Yields:
+        dict: {"id": ..., "query": str}, "id" being None when absent.
+    """
+    for number, line in enumerate(lines, first_line):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            print(f"Skipping line {number}: not valid JSON", file=sys.stderr)
+            continue
+        if isinstance(item, str):
+            item = {"query": item}
+        query = item.get("query", item.get("message")) if isinstance(item, dict) else None
+        if not isinstance(query, str):
+            print(f"Skipping line {number}: no query", file=sys.stderr)
+            continue
+        yield {"id": item.get("id"), "query": query}
+
+
+def _init_worker(data_dir, retrieve):
+    """
+    Load the knowledge base and, if needed, the persisted vector store once
+    per worker process.
+    """
+    _worker["knowledge_base"] = get_knowledge_base(data_dir)
+    _worker["vectorstore"] = None
+    if retrieve:
+        from database import INDEX_DIR, get_embedding_model, load_manifest_vectorstore
+
+        # Memory-mapped, so the workers share the index pages
+        _worker["vectorstore"], _ = load_manifest_vectorstore(INDEX_DIR, get_embedding_model(), data_dir)
+    _worker["retrieve"] = retrieve
+
+
+def search_batch(vectorstore, queries, k):
+    """
+    Find the top k documents of many queries with one embedding call and one
+    index search.
+
+    Args:
+        vectorstore (FAISS): Vector store to search.
+        queries (list): Query strings.
+        k (int): Number of documents per query.
+
+    Returns:
+        list: One list of Document objects per query.
+    """
+    import faiss
+    import numpy as np
+
+    vectors = np.asarray(vectorstore.embedding_function.embed_documents(queries), dtype=np.float32)
+    if vectorstore._normalize_L2:
+        faiss.normalize_L2(vectors)
+    _, indices = vectorstore.index.search(vectors, k)
+    return [
+        [vectorstore.docstore.search(vectorstore.index_to_docstore_id[i]) for i in row if i >= 0]
+        for row in indices
+    ]
+
+
+def answer_batch(lines, first_line=1):
+    """
+    Answer a batch of query lines in a worker process.
+
+    Parsing and serialization happen in the worker too, so the parent only
+    moves text around. Repeated queries are answered once per batch.
+
+    Args:
+        lines (list): Input lines.
+        first_line (int): Line number of the first line.
+
+    Returns:
+        tuple: (JSONL text with one result per query in input order,
+            number of results)
+    """
+    items = list(read_queries(lines, first_line))
+    responses = _worker["knowledge_base"].responses
+    unique = {}
+    for item in items:
+        key = normalize_query(item["query"])
+        if key not in unique:
+            match = match_rules(item["query"], responses)
+            unique[key] = {
+                "response": match.response,
+                "confidence": round(match.confidence, 3),
+                "escalate": match.escalate,
+                "policy_type": match.policy_type,
+                "topic": match.topic,
+            }
+
+    if _worker["retrieve"] and _worker["vectorstore"] is not None:
+        keys = list(unique)
+        for key, documents in zip(keys, search_batch(_worker["vectorstore"], keys, _worker["retrieve"])):
+            unique[key]["sources"] = [
+                {"source": doc.metadata.get("source"), "section": doc.metadata.get("section")}
+                for doc in documents
+            ]
+
+    results = [{"id": item["id"], "query": item["query"], **unique[normalize_query(item["query"])]} for item in items]
+    return "".join(json.dumps(result) + "\n" for result in results), len(results)
+
+
+def replay(lines, output, data_dir, batch_size=1000, workers=None, retrieve=0):
+    """
+    Answer every query of a JSONL stream and write the results incrementally.
+
+    Args:
+        lines (iterable): Input lines.
+        output: Writable text file receiving one JSON result per line.
+        data_dir (str): Directory containing the policy documents.
+        batch_size (int): Input lines sent to a worker at a time.
+        workers (int): Worker processes, os.cpu_count() by default. With 0,
+            batches are answered in this process.
+        retrieve (int): Number of documents to retrieve per query, 0 to skip
+            retrieval.
+
+    Returns:
+        dict: Number of queries, elapsed seconds and queries per second.
+    """
+    start = time.perf_counter()
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # Build and persist the index once, the workers only load it
+    knowledge_base = get_knowledge_base(data_dir)
+    if retrieve:
+        from database import get_shared_vectorstore
+
+        get_shared_vectorstore(knowledge_base)
+
+    lines = iter(lines)
+    # (line number of the first line, lines) pairs
+    batches = zip(itertools.count(1, batch_size), iter(lambda: list(islice(lines, batch_size)), []))
+    count = 0
+
+    def write(result):
+        nonlocal count
+        text, results = result
+        output.write(text)
+        output.flush()
+        count += results
+        elapsed = time.perf_counter() - start
+        print(f"{count} queries, {count / elapsed:.0f} queries/s", file=sys.stderr)
+
+    if workers == 0:
+        _init_worker(data_dir, retrieve)
+        for first_line, batch in batches:
+            write(answer_batch(batch, first_line))
+    else:
+        # spawn, as the parent may already run threads
+        with ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(data_dir, retrieve)
+        ) as executor:
+            # Keep at most two batches per worker in flight and write the
+            # results in input order
+            pending = deque()
+            for first_line, batch in batches:
+                pending.append(executor.submit(answer_batch, batch, first_line))
+                if len(pending) >= 2 * workers:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+
+    elapsed = time.perf_counter() - start
+    return {"queries": count, "seconds": round(elapsed, 3), "queries_per_second": round(count / elapsed, 1) if elapsed else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="JSONL file of queries, - for stdin")
+    parser.add_argument("--output", help="JSONL file receiving the results, stdout by default")
+    parser.add_argument("--data-dir", default=os.environ.get("INSURANCE_DATA_DIR", "insurance_data"))
+    parser.add_argument("--batch-size", type=int, default=1000, help="input lines per batch")
+    parser.add_argument("--workers", type=int, help="worker processes, 0 to answer in this process")
+    parser.add_argument("--retrieve", type=int, default=0, metavar="K", help="also retrieve the top K documents")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        summary = replay(source, output, args.data_dir, args.batch_size, args.workers, args.retrieve)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
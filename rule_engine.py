@@ -0,0 +1,260 @@
+import re
+from typing import NamedTuple
+from data_loader import parse_policy_text
+
+# Keyword tables in priority order: when a query matches several entries of
+# the same table, the earliest entry wins.
+ESCALATION_KEYWORDS = ["human agent", "speak to a person", "talk to someone"]
+
+POLICY_TYPE_KEYWORDS = [
+    ("health", ["health", "medical", "doctor", "hospital"]),
+    ("life", ["life", "death", "beneficiary", "term"]),
+    ("auto", ["auto", "car", "vehicle", "accident", "collision"]),
+    ("home", ["home", "house", "property", "dwelling"]),
+]
+
+TOPIC_KEYWORDS = [
+    ("premium", ["premium", "cost", "price"]),
+    ("coverage", ["coverage", "cover", "protect"]),
+    ("claim", ["claim", "file", "process"]),
+    ("deductible", ["deductible"]),
+]
+
+# Words of a field key, or of the section heading of other lines, naming
+# the topics answered from document fields; claims are answered with the
+# whole "Claims Process" section
+TOPIC_NAMES = {
+    "premium": frozenset({"premium", "premiums"}),
+    "coverage": frozenset({"coverage", "coverages"}),
+    "deductible": frozenset({"deductible", "deductibles"}),
+}
+_WORD_PATTERN = re.compile(r"[a-z]+")
+
+POLICY_TYPES = [policy_type for policy_type, _ in POLICY_TYPE_KEYWORDS]
+TOPICS = [topic for topic, _ in TOPIC_KEYWORDS]
+
+ESCALATION_RESPONSE = """
+        I understand you'd like to speak with a human agent. Please call our 
+        customer service at 1-800-INS-HELP or email support@insurancecompany.com. 
+        An agent will assist you with your specific concerns.
+        """
+
+GENERAL_RESPONSE = """
+        We offer several types of insurance policies including health, life, auto, and home insurance.
+        Each policy has different coverage options, premiums, and claim processes.
+        
+        Could you please specify which type of insurance you're interested in learning more about?
+        """
+
+# Confidence of a rule answer, by how specific the match was: policy type
+# and topic matched a document section, only the policy type matched (generic
+# description), both matched but no section covers the topic, nothing matched
+CONFIDENCE_SPECIFIC = 1.0
+CONFIDENCE_DESCRIPTION = 0.6
+CONFIDENCE_FALLBACK = 0.3
+CONFIDENCE_NONE = 0.0
+
+# Queries longer than this many words usually ask for more than a canned
+# section can answer, so their confidence is scaled down
+MAX_CONFIDENT_WORDS = 12
+
+INSURANCE_TYPE_DESCRIPTIONS = {
+    "health": "Health insurance covers medical expenses such as doctor visits, hospital stays, and prescription medications.",
+    "life": "Life insurance provides financial protection to your beneficiaries in the event of your death.",
+    "auto": "Auto insurance protects you against financial loss in the event of a vehicle accident or theft.",
+    "home": "Home insurance covers damage to your home and belongings, as well as liability for injuries that occur on your property."
+}
+
+
+def _build_keyword_matcher():
+    """
+    Compile every keyword table into a single case-insensitive pattern.
+
+    Each keyword is wrapped in a zero-width lookahead so that overlapping
+    keywords (e.g. "cover" inside "discover") are all reported, matching the
+    substring semantics of the original ``keyword in query`` checks.
+
+    Returns:
+        tuple: Compiled pattern and a mapping of keyword to
+            (kind, label, rank).
+    """
+    keyword_info = {}
+    for keyword in ESCALATION_KEYWORDS:
+        keyword_info.setdefault(keyword, ("escalation", True, 0))
+    for kind, table in (("policy_type", POLICY_TYPE_KEYWORDS), ("topic", TOPIC_KEYWORDS)):
+        for rank, (label, keywords) in enumerate(table):
+            for keyword in keywords:
+                keyword_info.setdefault(keyword, (kind, label, rank))
+
+    # Longest keywords first so a keyword is never shadowed by its prefix
+    alternation = "|".join(
+        re.escape(keyword) for keyword in sorted(keyword_info, key=len, reverse=True)
+    )
+    return re.compile(f"(?=({alternation}))", re.IGNORECASE), keyword_info
+
+
+_KEYWORD_PATTERN, _KEYWORD_INFO = _build_keyword_matcher()
+
+
+def classify_query(query):
+    """
+    Classify a query in a single pass over its text.
+
+    Args:
+        query (str): User query.
+
+    Returns:
+        tuple: (escalate, policy_type, topic) where escalate is a bool and
+            policy_type/topic fall back to "general" when nothing matched.
+    """
+    escalate = False
+    best = {"policy_type": (len(POLICY_TYPES), "general"), "topic": (len(TOPICS), "general")}
+    for match in _KEYWORD_PATTERN.finditer(query):
+        kind, label, rank = _KEYWORD_INFO[match.group(1).lower()]
+        if kind == "escalation":
+            escalate = True
+        elif rank < best[kind][0]:
+            best[kind] = (rank, label)
+    return escalate, best["policy_type"][1], best["topic"][1]
+
+
+def _select_lines(records, section, topic):
+    """
+    Select the lines of a section that are relevant to a topic.
+
+    A "- Key: value" line is relevant when its key names the topic, e.g.
+    "Monthly Premium" or "Deductible Options", an "A:" line of a FAQ when
+    its "Q:" line does, and any other line when the section heading does,
+    e.g. "Collision Coverage".
+
+    Args:
+        records (list): PolicyRecord objects of the section.
+        section (str): Section heading, for records of a chunk that was
+            split without its heading.
+        topic (str): One of TOPIC_NAMES.
+
+    Returns:
+        list: Relevant lines, in document order.
+    """
+    names = TOPIC_NAMES[topic]
+    lines = []
+    question = ""
+    for record in records:
+        if record.field:
+            key = record.field
+        elif record.text.startswith("Q:"):
+            question = record.text
+            continue
+        elif record.text.startswith("A:"):
+            key = question
+        else:
+            key = record.section or section
+        if names.intersection(_WORD_PATTERN.findall(key.lower())):
+            lines.append(record.text)
+    return lines
+
+
+def build_response_index(chunks):
+    """
+    Precompute the response for every (policy_type, topic) combination.
+
+    Args:
+        chunks (ChunkStore): Section chunks carrying "policy_type" and
+            "section" metadata, as produced by data_loader.split_text. Their
+            lines are parsed back into PolicyRecord objects, so answers are
+            selected by field rather than by substring.
+
+    Returns:
+        dict: Mapping of (policy_type, topic) to the response text.
+    """
+    fragments = {}
+    for row in range(len(chunks)):
+        policy_type = chunks.get(row, "policy_type") or "general"
+        section = chunks.get(row, "section") or ""
+        records = list(parse_policy_text(chunks.text(row).split('\n')))
+        for topic in TOPICS:
+            if topic == "claim":
+                lines = ["\n".join(record.text for record in records)] if section == "Claims Process" else []
+            else:
+                lines = _select_lines(records, section, topic)
+            if lines:
+                fragments.setdefault((policy_type, topic), []).append(
+                    f"**{section}**\n" + "\n".join(lines) if section else "\n".join(lines)
+                )
+
+    responses = {}
+    for policy_type in POLICY_TYPES + ["general"]:
+        if policy_type in INSURANCE_TYPE_DESCRIPTIONS:
+            fallback = f"{INSURANCE_TYPE_DESCRIPTIONS[policy_type]}\n\nWhat specific information would you like about {policy_type} insurance?"
+        else:
+            fallback = GENERAL_RESPONSE
+
+        for topic in TOPICS + ["general"]:
+            relevant_info = ""
+            if policy_type != "general":
+                relevant_info = "\n\n".join(fragments.get((policy_type, topic), []))
+            if relevant_info:
+                responses[(policy_type, topic)] = f"Based on our information about {policy_type} insurance:\n\n{relevant_info}\n\nIs there anything specific about this you'd like to know more about?"
+            else:
+                responses[(policy_type, topic)] = fallback
+    return responses
+
+
+class RuleMatch(NamedTuple):
+    """
+    A rule-engine answer together with how much it can be trusted.
+    """
+    response: str
+    confidence: float
+    escalate: bool
+    policy_type: str
+    topic: str
+
+
+def match_rules(query, responses):
+    """
+    Answer a query from a precomputed response index and score the answer.
+
+    Args:
+        query (str): User query.
+        responses (dict): Index built by build_response_index.
+
+    Returns:
+        RuleMatch: The response, its confidence between 0 and 1 and the
+            classification it was looked up with.
+    """
+    escalate, policy_type, topic = classify_query(query)
+    if escalate:
+        return RuleMatch(ESCALATION_RESPONSE, CONFIDENCE_SPECIFIC, True, policy_type, topic)
+
+    response = responses[(policy_type, topic)]
+    if policy_type == "general":
+        confidence = CONFIDENCE_NONE
+    elif topic == "general":
+        confidence = CONFIDENCE_DESCRIPTION
+    elif response == responses[(policy_type, "general")]:
+        confidence = CONFIDENCE_FALLBACK
+    else:
+        confidence = CONFIDENCE_SPECIFIC
+
+    words = len(query.split())
+    if words > MAX_CONFIDENT_WORDS:
+        confidence *= MAX_CONFIDENT_WORDS / words
+    return RuleMatch(response, confidence, False, policy_type, topic)
+
+
+def get_rule_response(query, responses):
+    """
+    Answer a query from a precomputed response index.
+
+    Args:
+        query (str): User query.
+        responses (dict): Index built by build_response_index.
+
+    Returns:
+        str: Response text.
+    """
+    escalate, policy_type, topic = classify_query(query)
+    if escalate:
+        return ESCALATION_RESPONSE
+    return responses[(policy_type, topic)]
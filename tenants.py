@@ -0,0 +1,270 @@
+import os
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from knowledge_base import get_knowledge_base, release_knowledge_base
+from metrics import observe
+
+logger = logging.getLogger(__name__)
+
+# Memory, in megabytes, of the knowledge bases and vector indexes kept loaded
+# across tenants; the least recently used tenants are evicted beyond it
+TENANT_MEMORY_BUDGET_MB = float(os.environ.get("TENANT_MEMORY_BUDGET_MB", "1024"))
+
+
+class _TenantState:
+    """
+    What is loaded of one tenant.
+    """
+
+    def __init__(self):
+        self.knowledge_base = None
+        self.knowledge_base_nbytes = 0
+        # Knowledge base the vector store was synced with, None until ready
+        self.vectorstore_for = None
+        self.vectorstore = None
+        self.vectorstore_nbytes = 0
+        self.warming = None
+
+    @property
+    def nbytes(self):
+        return self.knowledge_base_nbytes + self.vectorstore_nbytes
+
+
+def load_tenant_directories(path):
+    """
+    Read the document directory of each tenant.
+
+    Args:
+        path (str): JSON file mapping tenant names to directories, relative
+            to the file, or a directory holding one document directory per
+            tenant, named after it.
+
+    Returns:
+        dict: Mapping of tenant name to document directory.
+    """
+    if os.path.isdir(path):
+        with os.scandir(path) as it:
+            return {entry.name: entry.path for entry in it if entry.is_dir() and not entry.name.startswith(".")}
+    with open(path) as f:
+        directories = json.load(f)
+    if not isinstance(directories, dict):
+        raise ValueError(f"{path} must map tenant names to directories")
+    base = os.path.dirname(os.path.abspath(path))
+    return {tenant: os.path.join(base, directory) for tenant, directory in directories.items()}
+
+
+class TenantRegistry:
+    """
+    Knowledge bases and vector indexes of many tenants, loaded on demand.
+
+    A tenant's knowledge base is loaded on its first request, which is
+    cheap with knowledge base snapshots, so the rule engine can answer right
+    away. Its vector index is synced in a background thread; until it is
+    ready, get_vectorstore reports the tenant as warming up and callers
+    fall back to the rule engine.
+
+    When the loaded tenants hold more than memory_budget bytes, the least
+    recently used ones are released, snapshots and persisted indexes stay on
+    disk for their next request.
+    """
+
+    def __init__(self, directories, memory_budget=None, index_root=None):
+        """
+        Args:
+            directories (dict): Mapping of tenant name to document directory.
+            memory_budget (int): Bytes of knowledge bases and indexes kept
+                loaded, TENANT_MEMORY_BUDGET_MB by default.
+            index_root (str): Directory holding one persisted index
+                directory per tenant, FAISS_INDEX_DIR/tenants by default.
+        """
+        self.directories = dict(directories)
+        if memory_budget is None:
+            memory_budget = int(TENANT_MEMORY_BUDGET_MB * 1024 * 1024)
+        self.memory_budget = memory_budget
+        self.index_root = index_root
+        self.loads = 0
+        self.evictions = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+        # Loaded tenants, least recently used first
+        self._loaded = OrderedDict()
+
+    @classmethod
+    def from_path(cls, path, **kwargs):
+        """
+        Create a registry from a tenant configuration, see
+        load_tenant_directories.
+
+        Args:
+            path (str): JSON file or directory of tenant directories.
+            **kwargs: Other TenantRegistry arguments.
+
+        Returns:
+            TenantRegistry: The registry.
+        """
+        return cls(load_tenant_directories(path), **kwargs)
+
+    def __contains__(self, tenant):
+        return tenant in self.directories
+
+    def get_index_dir(self, tenant):
+        """
+        Get the persisted index directory of a tenant.
+
+        Args:
+            tenant (str): Tenant name.
+
+        Returns:
+            str: Index directory, each tenant has its own manifest.
+        """
+        index_root = self.index_root
+        if index_root is None:
+            from database import INDEX_DIR
+
+            index_root = os.path.join(INDEX_DIR, "tenants")
+        return os.path.join(index_root, tenant)
+
+    def get_knowledge_base(self, tenant):
+        """
+        Get the knowledge base of a tenant, loading it on first use.
+
+        Args:
+            tenant (str): Tenant name.
+
+        Returns:
+            KnowledgeBase: The current knowledge base of the tenant.
+
+        Raises:
+            KeyError: If the tenant is unknown.
+        """
+        directory_path = self.directories[tenant]
+        knowledge_base = get_knowledge_base(directory_path)
+        with self._lock:
+            state = self._loaded.get(tenant)
+            if state is None:
+                state = self._loaded[tenant] = _TenantState()
+                self.loads += 1
+            self._loaded.move_to_end(tenant)
+            if state.knowledge_base is not knowledge_base:
+                state.knowledge_base = knowledge_base
+                state.knowledge_base_nbytes = int(knowledge_base.chunks.nbytes + knowledge_base.lexical_index.nbytes)
+        self._evict(tenant)
+        return knowledge_base
+
+    def get_vectorstore(self, tenant, knowledge_base):
+        """
+        Get the vector store of a tenant without waiting for it.
+
+        If the vector store is not synced with the knowledge base yet, it
+        starts warming up in a background thread.
+
+        Args:
+            tenant (str): Tenant name.
+            knowledge_base (KnowledgeBase): Current knowledge base of the
+                tenant, see get_knowledge_base.
+
+        Returns:
+            tuple: (ready, vectorstore). ready is False while the index is
+                warming up; the vector store is None then, or when the
+                knowledge base is empty.
+        """
+        with self._lock:
+            state = self._loaded.get(tenant)
+            if state is None:
+                state = self._loaded[tenant] = _TenantState()
+                self.loads += 1
+            self._loaded.move_to_end(tenant)
+            if state.vectorstore_for is knowledge_base:
+                return True, state.vectorstore
+            self.fallbacks += 1
+            if state.warming is None:
+                state.warming = threading.Thread(
+                    target=self._warm, args=(tenant, state, knowledge_base), name=f"warm-{tenant}", daemon=True
+                )
+                state.warming.start()
+        return False, None
+
+    def _warm(self, tenant, state, knowledge_base):
+        """
+        Sync the vector store of a tenant with its knowledge base.
+        """
+        from database import get_shared_vectorstore, get_vectorstore_nbytes, release_shared_vectorstore
+
+        start = time.perf_counter()
+        try:
+            vectorstore = get_shared_vectorstore(knowledge_base, self.get_index_dir(tenant))
+            nbytes = get_vectorstore_nbytes(vectorstore) if vectorstore is not None else 0
+        except Exception:
+            # Left not ready, the next request tries again
+            logger.exception("Error loading the index of tenant %s", tenant)
+            with self._lock:
+                state.warming = None
+            return
+        observe("tenant_warm_up", time.perf_counter() - start)
+        logger.info("Index of tenant %s ready in %.3fs", tenant, time.perf_counter() - start)
+
+        with self._lock:
+            state.warming = None
+            evicted = self._loaded.get(tenant) is not state
+            if not evicted:
+                state.vectorstore_for = knowledge_base
+                state.vectorstore = vectorstore
+                state.vectorstore_nbytes = nbytes
+        if evicted:
+            release_shared_vectorstore(self.directories[tenant])
+        else:
+            self._evict(tenant)
+
+    def _evict(self, keep):
+        """
+        Release least recently used tenants until the loaded ones fit the
+        memory budget.
+
+        Args:
+            keep (str): Tenant being served, never evicted.
+        """
+        released = []
+        with self._lock:
+            total = sum(state.nbytes for state in self._loaded.values())
+            for tenant in list(self._loaded):
+                if total <= self.memory_budget:
+                    break
+                state = self._loaded[tenant]
+                if tenant == keep or state.warming is not None:
+                    continue
+                del self._loaded[tenant]
+                total -= state.nbytes
+                released.append((tenant, state))
+                self.evictions += 1
+
+        for tenant, state in released:
+            release_knowledge_base(self.directories[tenant])
+            if state.vectorstore_for is not None:
+                from database import release_shared_vectorstore
+
+                release_shared_vectorstore(self.directories[tenant])
+            logger.info("Evicted tenant %s (%d bytes)", tenant, state.nbytes)
+
+    def stats(self):
+        """
+        Get the registry statistics.
+
+        Returns:
+            dict: Tenants configured, loaded and warming up, memory held and
+                budget in bytes, loads, evictions and rule-engine fallbacks
+                while warming up.
+        """
+        with self._lock:
+            return {
+                "tenants": len(self.directories),
+                "loaded": len(self._loaded),
+                "warming": sum(state.warming is not None for state in self._loaded.values()),
+                "nbytes": sum(state.nbytes for state in self._loaded.values()),
+                "memory_budget": self.memory_budget,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "fallbacks": self.fallbacks,
+            }
@@ -0,0 +1,36 @@
+import numpy as np
+
+from answer_cache import SemanticAnswerCache
+
+
+def embedding(seed):
+    return np.random.default_rng(seed).standard_normal(16).tolist()
+
+
+def test_lookup_similar_question():
+    cache = SemanticAnswerCache(":memory:")
+    cache.store("v1", "What is my deductible?", embedding(0), "$500", 1.5)
+    assert cache.lookup("v1", embedding(0)) == "$500"
+    assert cache.lookup("v1", embedding(1)) is None
+    assert cache.lookup("v2", embedding(0)) is None
+    assert cache.stats()["saved_seconds"] == 1.5
+
+
+def test_stale_scopes_are_unloaded():
+    cache = SemanticAnswerCache(":memory:", max_scopes=2)
+    for version in range(5):
+        cache.store(f"v{version}", "What is my deductible?", embedding(version), f"${version}", 1.0)
+        assert cache.lookup(f"v{version}", embedding(version)) == f"${version}"
+    assert list(cache._scopes) == ["v3", "v4"]
+    # Unloaded scopes are loaded again from SQLite
+    assert cache.lookup("v0", embedding(0)) == "$0"
+    assert list(cache._scopes) == ["v4", "v0"]
+
+
+def test_evict_least_recently_used_in_batches():
+    cache = SemanticAnswerCache(":memory:", maxsize=10)
+    for i in range(11):
+        cache.store("v1", f"question {i}", embedding(i), f"answer {i}", 1.0)
+    assert cache.stats()["size"] == 9
+    assert cache.lookup("v1", embedding(0)) is None
+    assert cache.lookup("v1", embedding(10)) == "answer 10"
@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from cold_start import DEFERRED_MODULES, STARTUP_SCRIPT  # noqa: E402
+
+# Seconds until the first rule-engine answer in a fresh interpreter
+COLD_START_BUDGET = float(os.environ.get("COLD_START_BUDGET", "1.0"))
+
+# Startup script of the benchmark, also reporting the deferred modules loaded
+SCRIPT = STARTUP_SCRIPT + """
+import json, sys
+print(json.dumps(sorted(module for module in %r if module in sys.modules)))
+""" % (DEFERRED_MODULES,)
+
+
+@pytest.fixture(scope="module")
+def env(tmp_path_factory):
+    env = dict(os.environ, ANSWER_MODE="rules", KB_SNAPSHOT_DIR=str(tmp_path_factory.mktemp("snapshot")))
+    # Writes the bytecode caches and the knowledge base snapshot
+    run_startup(env)
+    return env
+
+
+def run_startup(env):
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    lines = result.stdout.strip().splitlines()
+    return float(lines[-2]), json.loads(lines[-1])
+
+
+def test_cold_start_within_budget(env):
+    seconds = min(run_startup(env)[0] for _ in range(3))
+    assert seconds < COLD_START_BUDGET
+
+
+def test_cold_start_defers_llm_modules(env):
+    _, deferred = run_startup(env)
+    assert deferred == []
@@ -0,0 +1,38 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from database import create_vectorstore, get_relevant_documents
+from embeddings import HashingEmbeddings
+
+
+def test_embed_texts_without_ngrams():
+    embeddings = HashingEmbeddings(n_features=64)
+    vectors = embeddings.embed_batch(["", ""])
+    assert vectors.shape == (2, 64)
+    assert not vectors.any()
+    assert embeddings.embed_query("") == [0.0] * 64
+
+
+def test_embed_whitespace():
+    vectors = HashingEmbeddings(n_features=64).embed_batch([" ", "\t"])
+    assert np.isfinite(vectors).all()
+
+
+def test_embed_empty_text_among_others():
+    embeddings = HashingEmbeddings(n_features=64)
+    vectors = embeddings.embed_batch(["", "health insurance premium", " "])
+    assert not vectors[0].any()
+    assert np.isclose(np.linalg.norm(vectors[1]), 1.0)
+    assert np.allclose(vectors[1], embeddings.embed_batch(["health insurance premium"])[0])
+
+
+def test_embed_batch_in_slices():
+    texts = [f"policy {i} covers hospital stays" for i in range(10)]
+    sliced = HashingEmbeddings(n_features=64, batch_size=3).embed_batch(texts)
+    assert np.allclose(sliced, HashingEmbeddings(n_features=64).embed_batch(texts))
+
+
+def test_retrieve_empty_query():
+    documents = [Document(page_content=text) for text in ("premium is $100", "deductible is $500")]
+    vectorstore = create_vectorstore(documents, HashingEmbeddings(n_features=64), index_type="flat")
+    assert len(get_relevant_documents(vectorstore, "", k=2)) == 2
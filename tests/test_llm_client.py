@@ -0,0 +1,134 @@
+import asyncio
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.messages import HumanMessage, SystemMessage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from llm_client import PooledLLMClient  # noqa: E402
+from llm_handler import get_openai_llm  # noqa: E402
+from mock_llm_server import MockLLMServer  # noqa: E402
+
+
+def start_server(**kwargs):
+    """
+    Run a mock LLM server on a free port in a background thread.
+
+    Returns:
+        tuple: (server, base URL)
+    """
+    server = MockLLMServer(**dict({"latency": 0.05, "token_delay": 0.001, "retry_after": 0.01}, **kwargs))
+    started = threading.Event()
+    ports = []
+
+    def on_start(port):
+        ports.append(port)
+        started.set()
+
+    threading.Thread(target=asyncio.run, args=(server.serve("127.0.0.1", 0, on_start),), daemon=True).start()
+    started.wait()
+    return server, f"http://127.0.0.1:{ports[0]}/v1"
+
+
+@pytest.fixture
+def make_client(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "mock")
+    clients = []
+
+    def make_client(base_url, **kwargs):
+        client = PooledLLMClient(get_openai_llm(base_url=base_url), **dict({"backoff": 0.01}, **kwargs))
+        clients.append(client)
+        return client
+
+    yield make_client
+    for client in clients:
+        client.close()
+
+
+def prompt(question="What is my deductible?"):
+    return [SystemMessage(content="Context:\nDeductible Options: $250, $500"), HumanMessage(content=question)]
+
+
+def answer(client, messages):
+    return "".join(chunk.content for chunk in client.stream(messages))
+
+
+def test_identical_requests_share_one_upstream_call(make_client):
+    server, base_url = start_server(latency=0.3)
+    client = make_client(base_url)
+    sessions = 16
+    barrier = threading.Barrier(sessions)
+
+    def session(_):
+        barrier.wait()
+        return answer(client, prompt())
+
+    with ThreadPoolExecutor(sessions) as executor:
+        answers = list(executor.map(session, range(sessions)))
+
+    assert len(set(answers)) == 1 and "deductible" in answers[0]
+    assert server.stats()["requests"] == 1
+    assert client.stats()["upstream_calls"] == 1
+    assert client.stats()["coalesced"] == sessions - 1
+    assert client.stats()["in_flight"] == 0
+
+
+def test_rate_limited_request_is_retried(make_client):
+    server, base_url = start_server(rate_limit_first=2)
+    client = make_client(base_url, max_retries=2)
+
+    assert "deductible" in answer(client, prompt())
+    assert server.stats()["rate_limited"] == 2
+    assert server.stats()["completed"] == 1
+    assert client.stats()["retries"] == 2
+    assert client.stats()["failures"] == 0
+
+
+def test_persistent_rate_limit_fails_after_last_retry(make_client):
+    server, base_url = start_server(max_concurrent=0)
+    client = make_client(base_url, max_retries=2)
+
+    with pytest.raises(Exception) as error:
+        answer(client, prompt())
+    assert getattr(error.value, "status_code", None) == 429
+    assert server.stats()["requests"] == 3
+    assert client.stats()["retries"] == 2
+    assert client.stats()["failures"] == 1
+    assert client.stats()["in_flight"] == 0
+
+
+def test_flight_cancelled_before_start_is_retired(make_client):
+    _, base_url = start_server()
+    client = make_client(base_url)
+    messages = prompt()
+
+    async def cancel_flight():
+        output = queue.Queue()
+        subscriber = asyncio.create_task(client._subscribe(messages, output))
+        await asyncio.sleep(0)
+        flight = next(iter(client._flights.values()))
+        flight.task.cancel()
+        await subscriber
+        return output.get_nowait()
+
+    kind, value = asyncio.run_coroutine_threadsafe(cancel_flight(), client._get_loop()).result()
+    assert kind == "error" and isinstance(value, asyncio.CancelledError)
+    assert client.stats()["in_flight"] == 0
+    assert "deductible" in answer(client, messages)
+
+
+def test_closed_client_cannot_stream(make_client):
+    _, base_url = start_server()
+    client = make_client(base_url)
+    assert answer(client, prompt())
+    client.close()
+
+    assert client.llm.http_async_client.is_closed
+    with pytest.raises(RuntimeError):
+        answer(client, prompt())
@@ -0,0 +1,37 @@
+from langchain_core.documents import Document
+
+from database import create_vectorstore
+from embeddings import HashingEmbeddings
+from llm_handler import get_fake_llm, stream_answer
+from memory import BoundedSummaryMemory
+from metrics import get_histogram
+
+ANSWER = "Your deductible is $500."
+
+
+def make_vectorstore():
+    documents = [
+        Document(page_content="Deductible Options: $250, $500, $1,000", metadata={"policy_type": "auto"}),
+        Document(page_content="Premium: $120 per month", metadata={"policy_type": "auto"}),
+    ]
+    return create_vectorstore(documents, HashingEmbeddings(n_features=64), index_type="flat")
+
+
+def test_stream_answer_yields_chunks_incrementally():
+    llm = get_fake_llm([ANSWER], sleep=0)
+    memory = BoundedSummaryMemory()
+    first_tokens = get_histogram("time_to_first_token").count
+
+    stream = stream_answer(llm, make_vectorstore(), "What is my deductible?", memory)
+    first = next(stream)
+    # Nothing is recorded in the memory before the answer is complete
+    assert first and first != ANSWER
+    assert memory.turns == []
+    assert get_histogram("time_to_first_token").count == first_tokens + 1
+    assert memory.last_prompt_tokens > 0
+
+    chunks = [first] + list(stream)
+    assert len(chunks) > 1
+    assert "".join(chunks) == ANSWER
+    assert len(memory.turns) == 1
+    assert get_histogram("time_to_first_token").count == first_tokens + 1
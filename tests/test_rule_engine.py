@@ -0,0 +1,37 @@
+from chunk_store import ChunkStore
+from data_loader import split_text
+from rule_engine import build_response_index
+
+POLICY = """# Health Insurance Policies
+
+## Premium Health Insurance
+- Monthly Premium: $500-$800
+- Annual Deductible: $500-$1,000
+- Exclusions: Similar to Basic Health Insurance
+
+## Dental Coverage
+- Includes two cleanings a year
+- Premium: $30 per month
+
+## Frequently Asked Questions
+
+Q: What is a deductible?
+A: The amount you pay before your insurance begins to pay.
+"""
+
+
+def test_responses_are_selected_by_field():
+    responses = build_response_index(ChunkStore.from_documents(split_text(POLICY)))
+    premium = responses[("health", "premium")]
+    assert "- Monthly Premium: $500-$800" in premium
+    assert "- Premium: $30 per month" in premium
+    # A plan named "Premium ..." does not make all its lines about premiums
+    assert "Exclusions" not in premium
+
+    coverage = responses[("health", "coverage")]
+    assert "- Includes two cleanings a year" in coverage
+    assert "Premium: $30" not in coverage
+
+    deductible = responses[("health", "deductible")]
+    assert "- Annual Deductible: $500-$1,000" in deductible
+    assert "A: The amount you pay before your insurance begins to pay." in deductible
@@ -1,41 +1,204 @@
-import streamlit as st
+import os
+import re
+import uuid
+from typing import NamedTuple
 
-def initialize_session_state():
+# Maximum number of tokens of retrieved context sent to the LLM, 0 for no
+# limit
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1200"))
+
+# Share of a passage's shingles found in a more relevant passage of the same
+# policy type above which it is dropped as a near-duplicate
+CONTEXT_DUPLICATE_THRESHOLD = float(os.environ.get("CONTEXT_DUPLICATE_THRESHOLD", "0.9"))
+
+# Words per shingle when comparing passages
+SHINGLE_SIZE = 5
+
+# Shortest text shared by the end of a chunk and the start of another for
+# them to be merged, shorter matches are treated as coincidences
+MIN_OVERLAP_CHARS = 20
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+def initialize_session_state(with_memory=True):
     """
     Initialize session state variables if they don't exist.
+    
+    Args:
+        with_memory (bool): Also create the LLM conversation memory. The
+            rule engine does not use it, and leaving it out spares the
+            langchain import on startup.
     """
-    if "messages" not in st.session_state:
-        st.session_state.messages = [
-            {
-                "role": "assistant", 
-                "content": "Hello! I'm your insurance policy assistant. How can I help you today?"
-            }
-        ]
+    # Imported here so the rest of the module can be used without Streamlit
+    import streamlit as st
     
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
+    if "session_id" not in st.session_state:
+        # The messages themselves live in chat_history, keyed by this id
+        st.session_state.session_id = uuid.uuid4().hex
+    
+    if with_memory and "memory" not in st.session_state:
+        from memory import BoundedSummaryMemory
+
+        st.session_state.memory = BoundedSummaryMemory()
 
-def get_chat_history(chat_history, k=5):
+class PackedContext(NamedTuple):
     """
-    Get the most recent k chat history entries for context.
+    Retrieved context assembled for a prompt, see pack_context.
+    """
+    text: str
+    tokens: int
+    raw_tokens: int
+    passages: int
+    merged: int
+    duplicates: int
+    over_budget: int
+
+    @property
+    def saved_tokens(self):
+        return self.raw_tokens - self.tokens
+
+def get_overlap(first, second, min_overlap=MIN_OVERLAP_CHARS):
+    """
+    Get the length of the longest end of a text that starts another.
     
     Args:
-        chat_history (list): Full chat history.
-        k (int): Number of most recent entries to return.
+        first (str): Text whose end is compared.
+        second (str): Text whose start is compared.
+        min_overlap (int): Shortest overlap to look for.
     
     Returns:
-        list: Most recent chat history entries.
+        int: Number of overlapping characters, 0 if shorter than min_overlap.
     """
-    return chat_history[-k:] if len(chat_history) > k else chat_history
+    if min(len(first), len(second)) < min_overlap:
+        return 0
+    anchor = second[:min_overlap]
+    position = first.find(anchor, max(0, len(first) - len(second)))
+    while position != -1:
+        if second.startswith(first[position:]):
+            return len(first) - position
+        position = first.find(anchor, position + 1)
+    return 0
 
-def format_docs(docs):
+def merge_text(first, second):
     """
-    Format a list of documents into a string.
+    Merge two texts if one contains the other or they overlap.
     
     Args:
-        docs (list): List of Document objects.
+        first (str): Text.
+        second (str): Text.
     
     Returns:
-        str: Formatted string of document contents.
+        str: The merged text, or None if the texts are unrelated.
     """
-    return "\n\n".join([doc.page_content for doc in docs])
+    if second in first:
+        return first
+    if first in second:
+        return second
+    overlap = get_overlap(first, second)
+    if overlap:
+        return first + second[overlap:]
+    overlap = get_overlap(second, first)
+    if overlap:
+        return second + first[overlap:]
+    return None
+
+def get_shingles(text, size=SHINGLE_SIZE):
+    """
+    Hash the word n-grams of a text.
+    
+    Args:
+        text (str): Text to hash.
+        size (int): Words per shingle.
+    
+    Returns:
+        set: Shingle hashes, a single one for texts shorter than size words.
+    """
+    words = _WORD_PATTERN.findall(text.lower())
+    return {hash(tuple(words[i:i + size])) for i in range(max(1, len(words) - size + 1))}
+
+def pack_context(docs, token_budget=None, token_counter=None):
+    """
+    Assemble retrieved documents into a prompt context.
+    
+    Chunks of the same source and section that overlap (split_text repeats
+    the end of an oversized section's chunk at the start of the next) or
+    contain each other are merged into one passage at the rank of the more
+    relevant one. Passages mostly made of shingles of a more relevant
+    passage of the same policy type are dropped. The rest is packed by
+    relevance up to the token budget; the most relevant passage is always
+    kept.
+    
+    Args:
+        docs (list): Document objects, most relevant first.
+        token_budget (int): Maximum number of context tokens,
+            CONTEXT_TOKEN_BUDGET by default, 0 for no limit.
+        token_counter (callable): Function returning the token count of a
+            text, the four characters per token estimate by default.
+    
+    Returns:
+        PackedContext: The context and the tokens saved.
+    """
+    if token_budget is None:
+        token_budget = CONTEXT_TOKEN_BUDGET
+    if token_counter is None:
+        from memory import approximate_token_count
+
+        token_counter = approximate_token_count
+
+    passages = []
+    merged = 0
+    for doc in docs:
+        metadata = doc.metadata or {}
+        group = (metadata.get("source"), metadata.get("policy_type"), metadata.get("section"))
+        text = doc.page_content
+        # A merged passage may now overlap another one of its group
+        target = None
+        for passage in list(passages):
+            if passage[0] != group:
+                continue
+            combined = merge_text(passage[1], text)
+            if combined is None:
+                continue
+            merged += 1
+            if target is None:
+                target = passage
+            else:
+                passages.remove(passage)
+            target[1] = text = combined
+        if target is None:
+            passages.append([group, text])
+
+    kept = []
+    duplicates = 0
+    for group, text in passages:
+        shingles = get_shingles(text)
+        if any(
+            group[1] == kept_group[1]
+            and len(shingles & kept_shingles) >= CONTEXT_DUPLICATE_THRESHOLD * len(shingles)
+            for kept_group, _, kept_shingles in kept
+        ):
+            duplicates += 1
+            continue
+        kept.append((group, text, shingles))
+
+    texts = []
+    used = 0
+    over_budget = 0
+    for _, text, _ in kept:
+        tokens = token_counter(text)
+        if token_budget and texts and used + tokens > token_budget:
+            over_budget += 1
+            continue
+        texts.append(text)
+        used += tokens
+
+    text = "\n\n".join(texts)
+    return PackedContext(
+        text=text,
+        tokens=token_counter(text),
+        raw_tokens=token_counter("\n\n".join(doc.page_content for doc in docs)),
+        passages=len(texts),
+        merged=merged,
+        duplicates=duplicates,
+        over_budget=over_budget
+    )